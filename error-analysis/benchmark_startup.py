@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the time from process start to finished output of main.py for '--help' of the entry point and of every
+analyzer, and for the analyzers that only need wer_details files on a small generated input. Each command is run
+several times in a fresh interpreter, the median wall clock time is compared to a target (default 100 ms).
+
+Usage: python benchmark_startup.py <-n runs per command (default=10)> <-t target in ms (default=100)>
+
+Example output:
+
+    COMMAND                    MEDIAN-MS  MIN-MS  TARGET
+    --help                     31.2       29.8    ok
+    categories --help          33.0       31.7    ok
+    ...
+    context per_utt            36.4       35.1    ok
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+
+PER_UTT = '''is_is-althingi1_04-2011-11-30T16:55:30.601205 ref  símaskráin  ***  komin  út
+is_is-althingi1_04-2011-11-30T16:55:30.601205 hyp  símaskráin   er  komin  út
+is_is-althingi1_04-2011-11-30T16:55:30.601205 op        C       I     C     C
+is_is-althingi1_04-2011-11-30T16:55:30.601205 #csid 3 0 1 0
+is_is-althingi1_04-2011-11-30T16:58:12.101202 ref  hann telur að framið hafi verið verkfallsbrot
+is_is-althingi1_04-2011-11-30T16:58:12.101202 hyp  hann telur að framið hafi verið verkfallsbrot
+is_is-althingi1_04-2011-11-30T16:58:12.101202 op   C    C     C  C      C    C     C
+is_is-althingi1_04-2011-11-30T16:58:12.101202 #csid 7 0 0 0
+'''
+
+OPS = '''correct    símaskráin    símaskráin    1
+correct    komin    komin    1
+correct    út    út    1
+insertion    ***    er    1
+substitution    kemur    kæmi    1
+'''
+
+PER_SPK = '''\
+SPEAKER                 id       #SENT      #WORD       Corr        Sub        Ins        Del        Err      S.Err
+is_is-althingi1_04      raw          2         10         10          0          1          0          1          1
+is_is-althingi1_04      sys          2         10     100.00       0.00      10.00       0.00      10.00      50.00
+SUM                     raw          2         10         10          0          1          0          1          1
+SUM                     sys          2         10     100.00       0.00      10.00       0.00      10.00      50.00
+'''
+
+SPEAKERS = 'is_is-althingi1_04\tfemale\n'
+
+FREQUENCIES = 'símaskráin 12\nkomin 3400\nút 80211\ner 278596\nkemur 8000\nkæmi 900\n'
+
+
+def write_test_files(test_dir):
+    files = {'per_utt': PER_UTT, 'ops': OPS, 'per_spk': PER_SPK, 'speakers.txt': SPEAKERS, 'freq.txt': FREQUENCIES}
+    for name in files:
+        with open(os.path.join(test_dir, name), 'w') as f:
+            f.write(files[name])
+
+
+def benchmark_commands(test_dir):
+    # (label, arguments to main.py)
+    commands = [('--help', ['--help'])]
+    for name in main.ANALYZERS:
+        commands.append((name + ' --help', [name, '--help']))
+
+    # a new output directory for each run, errors_by_context.py refuses to write into an existing one
+    def out(name):
+        return os.path.join(test_dir, name + '_{run}')
+
+    commands.append(('context per_utt', ['context', os.path.join(test_dir, 'per_utt'), '-o', out('context')]))
+    commands.append(('length ops', ['length', os.path.join(test_dir, 'ops'), '-o', out('length')]))
+    commands.append(('frequency ops', ['frequency', os.path.join(test_dir, 'ops'),
+                                       os.path.join(test_dir, 'freq.txt'), '-o', out('frequency')]))
+    commands.append(('speaker per_spk', ['speaker', os.path.join(test_dir, 'per_spk'),
+                                         os.path.join(test_dir, 'speakers.txt'), '-o', out('speaker')]))
+    return commands
+
+
+def time_command(args, runs, test_dir):
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    timings = []
+    for run in range(runs):
+        run_args = [arg.format(run=run) for arg in args]
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, main_script] + run_args, cwd=test_dir, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            # e.g. a missing dependency of the analyzer
+            return None
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def write_report(results, target):
+    rows = [['COMMAND', 'MEDIAN-MS', 'MIN-MS', 'TARGET']]
+    for label, timings in results:
+        if timings is None:
+            rows.append([label, '-', '-', 'FAILED'])
+            continue
+        median = statistics.median(timings)
+        rows.append([label, '%.1f' % median, '%.1f' % min(timings), 'ok' if median <= target else 'SLOW'])
+
+    widths = [max(map(len, col)) for col in zip(*rows)]
+    for row in rows:
+        print("  ".join((val.ljust(width) for val, width in zip(row, widths))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Startup time benchmark for the error analysis entry point',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', type=int, default=10, help='Number of runs per command')
+    parser.add_argument('-t', type=float, default=100.0, help='Target time to first output in ms')
+
+    return parser.parse_args()
+
+
+def main_benchmark():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as test_dir:
+        write_test_files(test_dir)
+        results = []
+        for label, command in benchmark_commands(test_dir):
+            results.append((label, time_command(command, args.n, test_dir)))
+
+    write_report(results, args.t)
+    slow = [label for label, timings in results if timings is None or statistics.median(timings) > args.t]
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark())
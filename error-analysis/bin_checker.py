@@ -27,7 +27,7 @@ import errno
 import time
 
 import verification
-from categories import Categories
+from error_categories import Categories
 
 # categories for bin_checker:
 SAME_LEMMA = 'same_lemma'
@@ -23,85 +23,19 @@ import time
 import errno
 import argparse
 
-import Levenshtein
-
 import utterance
 import verification
+from error_categories import Categories
+from error_categories import Category, write_file   # noqa: F401, re-exported, they were defined here before
+from error_categories import CORRECT, COMPOUNDS   # correct utterances, utterances with compound errors
 
 # Error categories (add new categories when needed):
-CORRECT = 'correct'
-COMPOUNDS = 'compounds'     # utterances with compound errors
 ONE_INS_DEL = 'one_inserted_or_deleted'     # utterances with only one insertion or deletion
 LS_ONE = 'levenshtein_one'                  # utterances with one substitution and edit distance == 1
 LS_GT_ONE = 'levenshtein_gt_one'            # utterances with one substitution and edit distance > 1
 OTHER = 'other_errors'                    # non defined errors
 
 
-# Extract Categories and Category to own module
-
-class Categories:
-
-    def __init__(self):
-        self.categories_dict = {}
-
-    def create_category(self, name):
-        if name in self.categories_dict:
-            return
-        else:
-            self.categories_dict[name] = Category(name)
-
-    def check_for_category(self, category):
-        if category not in self.categories_dict:
-            print(category + ' is not in error dictionary, creating new entry')
-            self.create_category(category)
-
-    def add_to_dict(self, category, element):
-        if len(element) == 0:
-            return
-
-        self.check_for_category(category)
-        self.categories_dict[category].add_element(element)
-
-    def update_counter(self, category, counter):
-        self.check_for_category(category)
-        self.categories_dict[category].update_counter(counter)
-
-    def print_to_stdout(self):
-        errors = 0
-        print()
-        print("========== Analyzing per_utt file from Kaldi decoding ==============\n")
-        print("Correct decoded utterances: " + str(len(self.categories_dict[CORRECT].element_list)))
-        print()
-        for cat in sorted(self.categories_dict):
-            if cat != CORRECT:
-                print('Utterances with ' + cat + ': ' + str(len(self.categories_dict[cat].element_list)))
-                print('Total occurrences of ' + cat + ' : ' + str(self.categories_dict[cat].occurrence_counter))
-            if cat != CORRECT and cat != COMPOUNDS:
-                errors += self.categories_dict[cat].occurrence_counter
-
-        print("")
-        print("Total errors: " + str(errors))
-        print()
-
-    def print_to_files(self, out_dir=''):
-        for cat in self.categories_dict.keys():
-            write_file(out_dir + cat + '.txt', self.categories_dict[cat].element_list)
-
-
-class Category:
-
-    def __init__(self, name):
-        self.name = name
-        self.element_list = []
-        self.occurrence_counter = 0
-
-    def add_element(self, element):
-        self.element_list.append(element)
-
-    def update_counter(self, counter):
-        self.occurrence_counter += counter
-
-
 def _check_for_compounds(utterance, error_cats):
     """
     Sometimes decoding errors are caused by inconsistencies in compound writing: either the reference uses a
@@ -141,12 +75,6 @@ def _check_for_compounds(utterance, error_cats):
         return [], 0
 
 
-def write_file(filename, list_of_lists):
-    with open(filename, 'w') as f:
-        for elem in list_of_lists:
-            f.write('\t'.join(elem) + '\n')
-
-
 # update if error categories change
 def _create_error_categories():
     error_cats = Categories()
@@ -160,6 +88,56 @@ def _create_error_categories():
     return error_cats
 
 
+def categorize_utterance(utterance, error_cats):
+    """
+    Sorts one utterance into the error categories of 'error_cats' and updates the occurrence counters.
+    Each utterance is handled independently of all others, so categories can also be updated incrementally.
+
+    :param utterance: an Utterance object
+    :param error_cats: a Categories object, see _create_error_categories()
+    """
+    sum_errors = utterance.sum_errors()
+
+    if sum_errors == 0:
+        error_cats.add_to_dict(CORRECT, [utterance.utt_id, utterance.ref, '0'])
+        return
+
+    id_ref_hyp = [utterance.utt_id, utterance.ref, utterance.hyp]
+
+    # check for compounds:
+    comp_elem, comp_errors = _check_for_compounds(utterance, error_cats)
+    if len(comp_elem) > 0:
+        error_cats.add_to_dict(COMPOUNDS, comp_elem)
+        error_cats.update_counter(COMPOUNDS, comp_errors)
+
+    ref_arr = utterance.ref.split()
+
+    # utterance is more than two words and has only one Ins or Del operation
+    if len(ref_arr) >= 2 and sum_errors == 1 and utterance.sub == 0:
+        error_cats.add_to_dict(ONE_INS_DEL, id_ref_hyp)
+        error_cats.update_counter(ONE_INS_DEL, 1)
+
+    # utterance has only one substitution error - check if Levenshtein dist is only 1
+    elif sum_errors == 1 and utterance.sub == 1:
+        # only needed here, so the other analyses and --help do not need python-Levenshtein
+        import Levenshtein
+        hyp_arr = utterance.hyp.split()
+        for ind in range(0, len(hyp_arr)):
+            if ref_arr[ind] != hyp_arr[ind]:
+                dist = Levenshtein.distance(ref_arr[ind], hyp_arr[ind])
+                if dist == 1:
+                    error_cats.add_to_dict(LS_ONE, id_ref_hyp + [ref_arr[ind], hyp_arr[ind]])
+                    error_cats.update_counter(LS_ONE, 1)
+                else:
+                    error_cats.add_to_dict(LS_GT_ONE,
+                                           id_ref_hyp + [str(utterance.op), ref_arr[ind], hyp_arr[ind], str(dist)])
+                    error_cats.update_counter(LS_GT_ONE, 1)
+
+    else:
+        error_cats.add_to_dict(OTHER, id_ref_hyp + [str(utterance.op), str(sum_errors)])
+        error_cats.update_counter(OTHER, sum_errors)
+
+
 def analyse_input(utterance_dict, out_dir):
     """
     Analyses the per_utt file from Kaldi decoding and scoring. Collects all correct utterances and sorts and counts
@@ -169,53 +147,10 @@ def analyse_input(utterance_dict, out_dir):
     :param utterance_file:
     :return:
     """
-    # when adding error categories consider splitting up this method!
-
     error_cats = _create_error_categories()
 
-    # non defined error counts
-    other_errors_sum = 0
-
     for key in utterance_dict.keys():
-        utterance = utterance_dict[key]
-        sum_errors = utterance.sum_errors()
-
-        if sum_errors == 0:
-            error_cats.add_to_dict(CORRECT, [utterance.utt_id, utterance.ref, '0'])
-            continue
-
-        id_ref_hyp = [utterance.utt_id, utterance.ref, utterance.hyp]
-
-        # check for compounds:
-        comp_elem, comp_errors = _check_for_compounds(utterance, error_cats)
-        if len(comp_elem) > 0:
-            error_cats.add_to_dict(COMPOUNDS, comp_elem)
-            error_cats.update_counter(COMPOUNDS, comp_errors)
-
-        ref_arr = utterance.ref.split()
-
-        # utterance is more than two words and has only one Ins or Del operation
-        if len(ref_arr) >= 2 and sum_errors == 1 and utterance.sub == 0:
-            error_cats.add_to_dict(ONE_INS_DEL, id_ref_hyp)
-            error_cats.update_counter(ONE_INS_DEL, 1)
-
-        # utterance has only one substitution error - check if Levenshtein dist is only 1
-        elif sum_errors == 1 and utterance.sub == 1:
-            hyp_arr = utterance.hyp.split()
-            for ind in range(0, len(hyp_arr)):
-                if ref_arr[ind] != hyp_arr[ind]:
-                    dist = Levenshtein.distance(ref_arr[ind], hyp_arr[ind])
-                    if dist == 1:
-                        error_cats.add_to_dict(LS_ONE, id_ref_hyp + [ref_arr[ind], hyp_arr[ind]])
-                        error_cats.update_counter(LS_ONE, 1)
-                    else:
-                        error_cats.add_to_dict(LS_GT_ONE,
-                                               id_ref_hyp + [str(utterance.op), ref_arr[ind], hyp_arr[ind], str(dist)])
-                        error_cats.update_counter(LS_GT_ONE, 1)
-
-        else:
-            error_cats.add_to_dict(OTHER, id_ref_hyp + [str(utterance.op), str(sum_errors)])
-            error_cats.update_counter(OTHER, sum_errors)
+        categorize_utterance(utterance_dict[key], error_cats)
 
     error_cats.print_to_stdout()
     error_cats.print_to_files(out_dir)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Collections of analysis results by category, e.g. the error categories from categories.py or the lemma categories
+from bin_checker.py. Each category holds a list of elements (lists of strings, written tab separated to
+<out_dir>/<category>.txt) and an occurrence counter.
+
+"""
+
+# Category names used in the summary printout
+CORRECT = 'correct'
+COMPOUNDS = 'compounds'
+
+
+class Categories:
+
+    def __init__(self):
+        self.categories_dict = {}
+
+    def create_category(self, name):
+        if name in self.categories_dict:
+            return
+        else:
+            self.categories_dict[name] = Category(name)
+
+    def check_for_category(self, category):
+        if category not in self.categories_dict:
+            print(category + ' is not in error dictionary, creating new entry')
+            self.create_category(category)
+
+    def add_to_dict(self, category, element):
+        if len(element) == 0:
+            return
+
+        self.check_for_category(category)
+        self.categories_dict[category].add_element(element)
+
+    def update_counter(self, category, counter):
+        self.check_for_category(category)
+        self.categories_dict[category].update_counter(counter)
+
+    def print_to_stdout(self):
+        errors = 0
+        print()
+        print("========== Analyzing per_utt file from Kaldi decoding ==============\n")
+        print("Correct decoded utterances: " + str(len(self.categories_dict[CORRECT].element_list)))
+        print()
+        for cat in sorted(self.categories_dict):
+            if cat != CORRECT:
+                print('Utterances with ' + cat + ': ' + str(len(self.categories_dict[cat].element_list)))
+                print('Total occurrences of ' + cat + ' : ' + str(self.categories_dict[cat].occurrence_counter))
+            if cat != CORRECT and cat != COMPOUNDS:
+                errors += self.categories_dict[cat].occurrence_counter
+
+        print("")
+        print("Total errors: " + str(errors))
+        print()
+
+    def print_to_files(self, out_dir=''):
+        for cat in self.categories_dict.keys():
+            write_file(out_dir + cat + '.txt', self.categories_dict[cat].element_list)
+
+
+class Category:
+
+    def __init__(self, name):
+        self.name = name
+        self.element_list = []
+        self.occurrence_counter = 0
+
+    def add_element(self, element):
+        self.element_list.append(element)
+
+    def update_counter(self, counter):
+        self.occurrence_counter += counter
+
+
+def write_file(filename, list_of_lists):
+    with open(filename, 'w') as f:
+        for elem in list_of_lists:
+            f.write('\t'.join(elem) + '\n')
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Clusters erroneous utterances from Kaldi's per_utt file that contain the same systematic error, e.g. the same
+name, compound or numeral misrecognized in different sentences, to reduce the number of lines to read by hand
+(e.g. in other_errors.txt from categories.py).
+
+Each utterance is described by the set of its error spans (consecutive S, I, D operations) with and without one word
+of context, e.g. for
+
+    is_is-ok21-2011-09-21T16:55:49.456796 ref  ók ölvaður  ***  útaf       í skutulsfirði
+    is_is-ok21-2011-09-21T16:55:49.456796 hyp  ók ölvaður  út   af         í skutulsfirði
+    is_is-ok21-2011-09-21T16:55:49.456796 op   C  C        I    S          C C
+
+the span 'útaf > út af' and the context n-grams 'ölvaður útaf > ölvaður út af' and 'útaf í > út af í'. The span is
+added SPAN_WEIGHT times, so two utterances with the same single error in different contexts are similar (6 of 10
+shingles), while utterances sharing only one of several errors are not.
+A MinHash signature of this set estimates the similarity (Jaccard) of the errors of two utterances. The signatures
+are split into bands, utterances sharing the hash of a band fall into the same bucket (locality sensitive hashing).
+A candidate from the same bucket is only merged into the cluster of an utterance if their signatures agree in at
+least -min_similarity of the rows, so a single shared band does not chain unrelated utterances. Each utterance is
+hashed once and compared to at most MAX_CANDIDATES members per bucket, so the running time is linear in the number
+of utterances. Utterances without errors have no error spans and are not clustered.
+
+Clusters are ranked by their error mass, the sum of errors of their utterances.
+
+Usage: python error_clusters.py path/to/wer_details/per_utt <-o output_dir (default=kaldi_error_clusters)>
+       <-bands number of LSH bands (default=10)> <-rows rows per band (default=4)> <-min_size (default=2)>
+       <-min_similarity (default=0.5)>
+
+With b bands of r rows, utterances with error similarity s share a bucket with probability 1 - (1 - s^r)^b, the
+threshold is approximately (1/b)^(1/r), about 0.56 for the defaults.
+
+"""
+
+import argparse
+import os
+import time
+import errno
+
+import kaldi_local
+import utterance
+import verification
+
+# the MinHash signatures of the near-duplicate search in ice-norm
+minhash = kaldi_local.import_ice_norm('minhash')
+
+MAX_CANDIDATES = 50     # most recent members of a bucket an utterance is compared to
+SPAN_WEIGHT = 6         # copies of an error span among the shingles, each context n-gram counts once
+
+
+class DisjointSets:
+    # Union-find over utterance indices, with path halving
+
+    def __init__(self):
+        self.parent = []
+
+    def add(self):
+        self.parent.append(len(self.parent))
+        return len(self.parent) - 1
+
+    def find(self, ind):
+        parent = self.parent
+        while parent[ind] != ind:
+            parent[ind] = parent[parent[ind]]
+            ind = parent[ind]
+        return ind
+
+    def union(self, first, second):
+        root_first, root_second = self.find(first), self.find(second)
+        if root_first != root_second:
+            self.parent[max(root_first, root_second)] = min(root_first, root_second)
+
+
+class ErrorCluster:
+
+    def __init__(self):
+        self.members = []
+        self.error_mass = 0
+        self.spans = {}
+
+    def add(self, element, errors, spans):
+        self.members.append(element)
+        self.error_mass += errors
+        for span in spans:
+            self.spans[span] = self.spans.get(span, 0) + 1
+
+    def top_spans(self, n=3):
+        spans = sorted(self.spans.items(), key=lambda x: x[1], reverse=True)[:n]
+        return ', '.join(span + ' (' + str(count) + ')' for span, count in spans)
+
+
+def error_spans(utt):
+    """
+    Extracts the error spans of an utterance and the shingles describing them.
+
+    :return: a tuple (spans, shingles), spans as 'ref words > hyp words' strings
+    """
+    ref_arr = utt.ref.split()
+    hyp_arr = utt.hyp.split()
+    spans = []
+    shingles = set()
+
+    ind = 0
+    while ind < len(utt.op):
+        if utt.op[ind] == 'C':
+            ind += 1
+            continue
+        start = ind
+        while ind < len(utt.op) and utt.op[ind] != 'C':
+            ind += 1
+        ref_span = ' '.join(w for w in ref_arr[start:ind] if w != '***')
+        hyp_span = ' '.join(w for w in hyp_arr[start:ind] if w != '***')
+        span = ref_span + ' > ' + hyp_span
+        spans.append(span)
+        shingles.update(span + '#' + str(copy) for copy in range(SPAN_WEIGHT))
+        if start > 0:
+            shingles.add(ref_arr[start - 1] + ' ' + ref_span + ' > ' + hyp_arr[start - 1] + ' ' + hyp_span)
+        if ind < len(utt.op):
+            shingles.add(ref_span + ' ' + ref_arr[ind] + ' > ' + hyp_span + ' ' + hyp_arr[ind])
+
+    return spans, shingles
+
+
+def cluster_errors(utterances, bands, rows, min_errors=1, min_similarity=0.5):
+    """
+    Assigns each erroneous utterance to a cluster by LSH over MinHash signatures of its error shingles.
+
+    :param utterances: an iterable of Utterance objects, e.g. Utterance.iter_utterances(per_utt_file)
+    :param min_similarity: minimum share of equal signature rows for merging two utterances of a bucket
+    :return: list of ErrorCluster, sorted by error mass
+    """
+    hasher = minhash.MinHash(bands * rows)
+    sets = DisjointSets()
+    buckets = {}
+    elements = []
+    signatures = []
+
+    for utt in utterances:
+        errors = utt.sum_errors()
+        if errors < min_errors:
+            continue
+        spans, shingles = error_spans(utt)
+        if not shingles:
+            # an empty signature would put all of these utterances in the same buckets
+            continue
+        ind = sets.add()
+        elements.append(([utt.utt_id, utt.ref, utt.hyp, str(errors)], errors, spans))
+        signature = hasher.signature(shingles)
+        signatures.append(signature)
+
+        checked = set()
+        for band in range(bands):
+            key = hash((band,) + tuple(signature[band * rows:(band + 1) * rows]))
+            members = buckets.setdefault(key, [])
+            for candidate in members[-MAX_CANDIDATES:]:
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if minhash.similarity(signature, signatures[candidate]) >= min_similarity:
+                    sets.union(ind, candidate)
+            members.append(ind)
+
+    clusters = {}
+    for ind, (element, errors, spans) in enumerate(elements):
+        root = sets.find(ind)
+        if root not in clusters:
+            clusters[root] = ErrorCluster()
+        clusters[root].add(element, errors, spans)
+
+    return sorted(clusters.values(), key=lambda x: (x.error_mass, len(x.members)), reverse=True)
+
+
+def write_clusters(clusters, min_size, out_dir):
+    with open(out_dir + 'error_clusters.txt', 'w') as f:
+        rank = 0
+        for cluster in clusters:
+            if len(cluster.members) < min_size:
+                continue
+            rank += 1
+            f.write('CLUSTER ' + str(rank) + '\terrors: ' + str(cluster.error_mass) + '\tutterances: ' +
+                    str(len(cluster.members)) + '\t' + cluster.top_spans() + '\n')
+            for element in cluster.members:
+                f.write('\t' + '\t'.join(element) + '\n')
+            f.write('\n')
+
+
+def print_summary(clusters, min_size, top=10):
+    multi = [cluster for cluster in clusters if len(cluster.members) >= min_size]
+    total_mass = sum(cluster.error_mass for cluster in clusters)
+    multi_mass = sum(cluster.error_mass for cluster in multi)
+
+    print()
+    print('========== Clustering erroneous utterances from per_utt file ==============\n')
+    print('Erroneous utterances: ' + str(sum(len(cluster.members) for cluster in clusters)))
+    print('Clusters with at least ' + str(min_size) + ' utterances: ' + str(len(multi)))
+    if total_mass > 0:
+        print('Errors in these clusters: ' + str(multi_mass) + ' (' + '%.2f' % (multi_mass / total_mass * 100) + '%)')
+    print()
+    for rank, cluster in enumerate(multi[:top], 1):
+        print(str(rank) + '\t' + str(cluster.error_mass) + '\t' + str(len(cluster.members)) + '\t' +
+              cluster.top_spans())
+    print()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Clusters utterances with similar errors by MinHash/LSH',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('i', type=str, help='per_utt file')
+    parser.add_argument('-o', type=str, default='kaldi_error_clusters', help='Output directory')
+    parser.add_argument('-bands', type=int, default=10, help='Number of LSH bands')
+    parser.add_argument('-rows', type=int, default=4, help='Number of signature rows per band')
+    parser.add_argument('-min_similarity', type=float, default=0.5,
+                        help='Minimum share of equal signature rows to merge two utterances of a bucket')
+    parser.add_argument('-min_errors', type=int, default=1,
+                        help='Only cluster utterances with at least this many errors')
+    parser.add_argument('-min_size', type=int, default=2, help='Only write clusters with at least this many utterances')
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+
+    utt_file = verification.verify_input(args.i, 'per_utt')
+    if not utt_file:
+        print('Input directory / input file "{0}" not found. '
+              'Please provide a path to wer_details/per_utt'.format(args.i))
+        raise Exception()
+
+    if args.o == 'kaldi_error_clusters':
+        out_dir = args.o + '_' + time.strftime("%Y%m%d-%H%M%S") + '/'
+    else:
+        out_dir = args.o
+        if not out_dir.endswith('/'):
+            out_dir += '/'
+
+    # allow to overwrite existing directory
+    try:
+        os.mkdir(out_dir)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+        pass
+
+    with open(utt_file) as f:
+        clusters = cluster_errors(utterance.Utterance.iter_utterances(f), args.bands, args.rows, args.min_errors,
+                                  args.min_similarity)
+
+    print_summary(clusters, args.min_size)
+    write_clusters(clusters, args.min_size, out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -211,11 +211,28 @@ def compute_statistics(op_map, utt_count, err_count, out_dir):
     write_errors(out_dir, op_map)
 
 
+def create_operations_map():
+    return {CORRECT: Operation(CORRECT), DELETION: Operation(DELETION),
+            INSERTION: Operation(INSERTION), SUBSTITUTION: Operation(SUBSTITUTION)}
+
+
+def add_utterance(utterance, ops_map):
+    # Updates the operation counts and contexts in 'ops_map' with the operations of one utterance
+    for op in ops_map.keys():
+        ops_map[op].increment_occ(get_operation_count(utterance.op, op))
+
+    result_string = (utterance.ref + '\t' + utterance.hyp + '\t' + str(utterance.op) + '\t' +
+                     str(utterance.sum_errors()) + '\n')
+    last_op = START
+    for op in utterance.op:
+        ops_map[op].increment_context(last_op, result_string)
+        last_op = op
+
+
 def analyse_errors_by_context(utt_file, out_dir):
     # A dictionary of utterances with hypothesis and error/operation information
     utterance_dict = init_utterance_dict(utt_file)
-    ops_map = {CORRECT: Operation(CORRECT), DELETION: Operation(DELETION),
-               INSERTION: Operation(INSERTION), SUBSTITUTION: Operation(SUBSTITUTION)}
+    ops_map = create_operations_map()
 
     utterance_count = 0
     error_count = 0
@@ -223,15 +240,7 @@ def analyse_errors_by_context(utt_file, out_dir):
         utterance = utterance_dict[key]
         utterance_count += 1
         error_count += utterance.sum_errors()
-
-        for op in ops_map.keys():
-            ops_map[op].increment_occ(get_operation_count(utterance.op, op))
-
-        result_string = utterance.ref + '\t' + utterance.hyp + '\t' + str(utterance.op) + '\t' + str(utterance.sum_errors()) + '\n'
-        last_op = 'start'
-        for op in utterance.op:
-            ops_map[op].increment_context(last_op, result_string)
-            last_op = op
+        add_utterance(utterance, ops_map)
 
     operations_map = OperationsMap(ops_map)
     compute_statistics(operations_map, utterance_count, error_count, out_dir)
@@ -22,6 +22,8 @@ Mapping file should look like this:
 <speaker-id-as-in-per_spk>\t<speaker-feature>
 ...
 
+Instead of a mapping file a Kaldi data directory can be given, the features are then looked up in its spk2gender file
+through the data directory index (ice-kaldi/s5/local/data_dir_index.py).
 
 """
 
@@ -30,6 +32,8 @@ import os
 import time
 import errno
 
+import kaldi_local
+
 
 class SpeakerInfo:
 
@@ -121,9 +125,33 @@ def init_speaker_map(speaker_file):
     return speaker_map
 
 
-def analyse_by_speaker_feature(per_spk_file, speaker_mapping_file, out_dir):
+class IndexedSpeakerMap:
+    # Speaker - feature lookups in a file of a Kaldi data directory, without reading the whole file
+
+    def __init__(self, data_dir, feature_file='spk2gender'):
+        self.index = kaldi_local.open_data_dir(data_dir)[feature_file]
+
+    def __contains__(self, speaker_id):
+        return speaker_id == 'SUM' or speaker_id in self.index
+
+    def __getitem__(self, speaker_id):
+        if speaker_id == 'SUM':
+            return 'SUM'
+        return self.index[speaker_id].split()[0]
+
+
+def load_speaker_map(speaker_path):
+    """
+    :param speaker_path: a speaker - feature mapping file or a Kaldi data directory containing spk2gender
+    """
+    if os.path.isdir(speaker_path):
+        return IndexedSpeakerMap(speaker_path)
+    with open(speaker_path) as f:
+        return init_speaker_map(f)
+
+
+def analyse_by_speaker_feature(per_spk_file, speaker_map, out_dir):
 
-    speaker_map = init_speaker_map(speaker_mapping_file)
     speaker_statistics = {}
     speaker_features = {}
     per_spk_file.readline() # get rid of header
@@ -161,7 +189,7 @@ def parse_args():
     parser = argparse.ArgumentParser(description='Error analysis by speaker class, e.g. gender',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('i', type=argparse.FileType('r'), help='per_spk file')
-    parser.add_argument('b', type=argparse.FileType('r'), help='speaker-id - speaker-class file')
+    parser.add_argument('b', type=str, help='speaker-id - speaker-class file or Kaldi data dir with spk2gender')
     parser.add_argument('-o', type=str, default='kaldi_per_spk_by_feature', help='Output directory')
 
     return parser.parse_args()
@@ -172,7 +200,7 @@ def main():
     # TODO: verfiy input files
     args = parse_args()
     per_spk_file = args.i
-    speaker_mapping_file = args.b
+    speaker_map = load_speaker_map(args.b)
 
     if args.o == 'kaldi_per_spk_by_feature':
         out_dir = args.o + '_' + time.strftime("%Y%m%d-%H%M%S") + '/'
@@ -189,7 +217,7 @@ def main():
             raise
         pass
 
-    analyse_by_speaker_feature(per_spk_file, speaker_mapping_file, out_dir)
+    analyse_by_speaker_feature(per_spk_file, speaker_map, out_dir)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Are errors concentrated at the edges of utterances, after pauses, or in very short or long words?
+Time-aligned error analysis, joining the hypothesis words from Kaldi's per_utt with their timing from a CTM file.
+
+Input files:
+
+Kaldi's per_utt:
+
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 ref  símaskráin  ***  komin  út
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 hyp  símaskráin   er  komin  út
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 op        C       I     C     C
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 #csid 3 0 1 0
+
+CTM of the best path (e.g. from steps/get_ctm.sh), <utt-id> <channel> <start> <duration> <word> [<confidence>]:
+
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 1 0.42 0.71 símaskráin
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 1 1.13 0.15 er
+    ...
+
+If the CTM uses recording ids and times (as get_ctm.sh writes it when the data dir has a segments file), the segments
+file of the data dir is needed to map the words back to utterances. Utterance durations are taken from utt2dur or
+the segments file if given, otherwise from the end of the last word.
+
+Hypothesis words are matched to CTM words by their order within the utterance, utterances where the words do not
+agree are skipped. Deletions have no timing of their own, they are placed at the end of the preceding word and
+only count in the analysis by position.
+
+"""
+
+import argparse
+import bisect
+import os
+import time
+import errno
+import math
+
+import utterance
+
+# operation codes in the joined arrays
+CORRECT, SUBSTITUTION, INSERTION, DELETION = 0, 1, 2, 3
+OP_CODES = {'C': CORRECT, 'S': SUBSTITUTION, 'I': INSERTION, 'D': DELETION}
+
+POSITION_BINS = 10
+DURATION_EDGES = [0.0, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, math.inf]    # word duration in seconds
+GAP_EDGES = [0.0, 0.01, 0.1, 0.25, 0.5, 1.0, math.inf]              # pause before the word in seconds
+
+
+class JoinedWords:
+    # Column arrays of all aligned positions, collected as lists and converted to numpy arrays when finished,
+    # numpy is only imported then, so --help and argument errors do not load it
+
+    def __init__(self):
+        self.op = []
+        self.start = []
+        self.duration = []
+        self.gap = []
+        self.utt_duration = []
+        self.first = []
+        self.last = []
+        self.utterances = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+
+    def add_utterance(self, utt, ctm_words, utt_duration):
+        hyp_words = [w for w in utt.hyp.split() if w != '***']
+        if [w for w, _, _ in ctm_words] != hyp_words:
+            self.skipped += 1
+            return
+
+        if utt_duration is None:
+            utt_duration = ctm_words[-1][1] + ctm_words[-1][2] if ctm_words else 0.0
+        self.utterances += 1
+        self.audio_seconds += utt_duration
+
+        ctm_ind = 0
+        prev_end = 0.0
+        positions = len(utt.op)
+        for ind, op in enumerate(utt.op):
+            if op == 'D':
+                start, duration, gap = prev_end, math.nan, math.nan
+            else:
+                _, start, duration = ctm_words[ctm_ind]
+                ctm_ind += 1
+                gap = start - prev_end
+                prev_end = start + duration
+            self.op.append(OP_CODES[op])
+            self.start.append(start)
+            self.duration.append(duration)
+            self.gap.append(gap)
+            self.utt_duration.append(utt_duration)
+            self.first.append(ind == 0)
+            self.last.append(ind == positions - 1)
+
+    def to_arrays(self):
+        import numpy as np
+        return {'op': np.array(self.op, dtype=np.int8),
+                'start': np.array(self.start, dtype=np.float64),
+                'duration': np.array(self.duration, dtype=np.float64),
+                'gap': np.array(self.gap, dtype=np.float64),
+                'utt_duration': np.array(self.utt_duration, dtype=np.float64),
+                'first': np.array(self.first, dtype=bool),
+                'last': np.array(self.last, dtype=bool)}
+
+
+def read_ctm(ctm_file):
+    # utt-id (or recording-id) -> list of (word, start, duration), in file order
+    ctm = {}
+    for line in ctm_file:
+        line_arr = line.split()
+        if len(line_arr) < 5:
+            continue
+        ctm.setdefault(line_arr[0], []).append((line_arr[4], float(line_arr[2]), float(line_arr[3])))
+    return ctm
+
+
+def read_segments(segments_file):
+    # utt-id -> (recording-id, start, end)
+    segments = {}
+    for line in segments_file:
+        utt_id, reco_id, start, end = line.split()[:4]
+        segments[utt_id] = (reco_id, float(start), float(end))
+    return segments
+
+
+def read_utt2dur(utt2dur_file):
+    utt2dur = {}
+    for line in utt2dur_file:
+        utt_id, dur = line.split()[:2]
+        utt2dur[utt_id] = float(dur)
+    return utt2dur
+
+
+def ctm_by_utterance(reco_ctm, segments):
+    """
+    Splits a CTM with recording ids and times into utterances by the segments, with times relative to the
+    start of the utterance. A word belongs to the segment in which its midpoint lies.
+    """
+    by_reco = {}
+    for utt_id, (reco_id, start, end) in segments.items():
+        by_reco.setdefault(reco_id, []).append((start, end, utt_id))
+
+    utt_ctm = {}
+    for reco_id, words in reco_ctm.items():
+        reco_segments = sorted(by_reco.get(reco_id, []))
+        seg_starts = [seg[0] for seg in reco_segments]
+        for word, start, duration in words:
+            ind = bisect.bisect_right(seg_starts, start + duration / 2) - 1
+            if ind < 0 or start + duration / 2 > reco_segments[ind][1]:
+                continue
+            seg_start, _, utt_id = reco_segments[ind]
+            utt_ctm.setdefault(utt_id, []).append((word, start - seg_start, duration))
+    return utt_ctm
+
+
+def binned_rates(values, is_error, edges):
+    """
+    Counts tokens and errors per bin of 'values' (NaN values are ignored).
+
+    :return: a tuple (tokens, errors) of arrays of length len(edges) - 1
+    """
+    import numpy as np
+    valid = ~np.isnan(values)
+    bins = np.digitize(values[valid], edges[1:-1])
+    tokens = np.bincount(bins, minlength=len(edges) - 1)
+    errors = np.bincount(bins, weights=is_error[valid], minlength=len(edges) - 1).astype(np.int64)
+    return tokens, errors
+
+
+def _table(labels, tokens, errors):
+    rows = [['BIN', 'TOKENS', 'ERRORS', '%Errors']]
+    for label, tok, err in zip(labels, tokens, errors):
+        rows.append([label, str(tok), str(err), '%.2f' % (err / tok * 100) + '%' if tok else '-'])
+    return rows
+
+
+def _edge_labels(edges, unit='s'):
+    labels = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        labels.append('>= ' + str(low) + unit if math.isinf(high) else str(low) + '-' + str(high) + unit)
+    return labels
+
+
+def compute_statistics(arrays):
+    import numpy as np
+    op = arrays['op']
+    is_error = (op != CORRECT).astype(np.float64)
+
+    # relative position of the word midpoint (deletions: end of preceding word) in the utterance
+    midpoint = arrays['start'] + np.nan_to_num(arrays['duration']) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_pos = np.clip(midpoint / arrays['utt_duration'], 0.0, 1.0 - 1e-9)
+    position_edges = np.linspace(0.0, 1.0, POSITION_BINS + 1)
+    position_edges[-1] = np.inf
+    pos_tokens, pos_errors = binned_rates(rel_pos, is_error, position_edges)
+    pos_labels = ['%d-%d%%' % (i * 100 / POSITION_BINS, (i + 1) * 100 / POSITION_BINS) for i in range(POSITION_BINS)]
+
+    dur_tokens, dur_errors = binned_rates(arrays['duration'], is_error, np.array(DURATION_EDGES))
+    gap_tokens, gap_errors = binned_rates(arrays['gap'], is_error, np.array(GAP_EDGES))
+
+    middle = ~(arrays['first'] | arrays['last'])
+    edge_rows = _table(['first word', 'last word', 'middle'],
+                       [int(arrays['first'].sum()), int(arrays['last'].sum()), int(middle.sum())],
+                       [int(is_error[arrays['first']].sum()), int(is_error[arrays['last']].sum()),
+                        int(is_error[middle].sum())])
+
+    return {'position': _table(pos_labels, pos_tokens, pos_errors),
+            'duration': _table(_edge_labels(DURATION_EDGES), dur_tokens, dur_errors),
+            'gap': _table(_edge_labels(GAP_EDGES), gap_tokens, gap_errors),
+            'edges': edge_rows,
+            'op_counts': np.bincount(op, minlength=4)}
+
+
+def write_tables(filename, *tables):
+    with open(filename, 'w') as out_file:
+        for ind, rows in enumerate(tables):
+            if ind > 0:
+                out_file.write('\n')
+            widths = [max(map(len, col)) for col in zip(*rows)]
+            for row in rows:
+                out_file.write("  ".join((val.ljust(width) for val, width in zip(row, widths))) + '\n')
+
+
+def print_table(title, rows):
+    print(title)
+    widths = [max(map(len, col)) for col in zip(*rows)]
+    for row in rows:
+        print("  ".join((val.ljust(width) for val, width in zip(row, widths))))
+    print('')
+
+
+def write_results(results, joined, out_dir):
+    op_counts = results['op_counts']
+    errors = int(op_counts[SUBSTITUTION] + op_counts[INSERTION] + op_counts[DELETION])
+
+    print('')
+    print("========== Analyzing errors by time from per_utt and CTM ==============")
+    print('Utterances: ' + str(joined.utterances) + ' (skipped, hypothesis and CTM do not match: ' +
+          str(joined.skipped) + ')')
+    print('Audio: ' + '%.1f' % joined.audio_seconds + ' seconds')
+    print('Errors: ' + str(errors) + ' (S: ' + str(op_counts[SUBSTITUTION]) + ', I: ' + str(op_counts[INSERTION]) +
+          ', D: ' + str(op_counts[DELETION]) + ')')
+    if joined.audio_seconds > 0:
+        print('Errors per second: ' + '%.3f' % (errors / joined.audio_seconds))
+    print('')
+
+    print_table('By relative position in utterance:', results['position'])
+    print_table('First and last word vs. middle:', results['edges'])
+    print_table('By word duration (no deletions):', results['duration'])
+    print_table('By pause before word (no deletions):', results['gap'])
+
+    write_tables(out_dir + 'errors_by_position.txt', results['position'], results['edges'])
+    write_tables(out_dir + 'errors_by_duration.txt', results['duration'])
+    write_tables(out_dir + 'errors_by_gap.txt', results['gap'])
+
+
+def analyse_errors_by_time(utt_file, ctm_file, out_dir, segments_file=None, utt2dur_file=None):
+
+    ctm = read_ctm(ctm_file)
+    durations = {}
+    if segments_file:
+        segments = read_segments(segments_file)
+        ctm = ctm_by_utterance(ctm, segments)
+        durations = {utt_id: end - start for utt_id, (_, start, end) in segments.items()}
+    if utt2dur_file:
+        durations = read_utt2dur(utt2dur_file)
+
+    joined = JoinedWords()
+    for utt in utterance.Utterance.iter_utterances(utt_file):
+        joined.add_utterance(utt, ctm.get(utt.utt_id, []), durations.get(utt.utt_id))
+
+    results = compute_statistics(joined.to_arrays())
+    write_results(results, joined, out_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Error analysis of Kaldi per_utt file by time alignment (CTM)',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('i', type=argparse.FileType('r'), help='Kaldi per_utt file')
+    parser.add_argument('c', type=argparse.FileType('r'), help='CTM file of the best path')
+    parser.add_argument('-s', type=argparse.FileType('r'), help='segments file, if the CTM uses recording ids')
+    parser.add_argument('-d', type=argparse.FileType('r'), help='utt2dur file')
+    parser.add_argument('-o', type=str, default='kaldi_per_utt_by_time', help='Output directory')
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+
+    if args.o == 'kaldi_per_utt_by_time':
+        out_dir = args.o + '_' + time.strftime("%Y%m%d-%H%M%S") + '/'
+    else:
+        out_dir = args.o
+        if not out_dir.endswith('/'):
+            out_dir += '/'
+
+    # allow to overwrite existing directory
+    try:
+        os.mkdir(out_dir)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+        pass
+
+    analyse_errors_by_time(args.i, args.c, out_dir, args.s, args.d)
+
+
+if __name__ == '__main__':
+    main()
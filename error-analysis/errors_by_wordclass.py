@@ -49,6 +49,9 @@ fórust sfm3fþ
 flugslysinu nheþg <UNKNOWN>
 . .
 
+With -d path/to/data/test the tagged sentences are matched against the references from the 'text' file of the Kaldi
+data directory (looked up through the data directory index) instead of the references in per_utt.
+
 """
 
 import argparse
@@ -59,6 +62,7 @@ import json
 import re
 
 import utterance
+import kaldi_local
 
 DEL_SYMBOL = '***'
 
@@ -203,17 +207,27 @@ def match_pairs(utterance, word_pos_pairs, pos_tag_statistics):
                 pos_tag_statistics[wc] = wc_statistics
 
 
-def analyse_errors_by_pos_tag(utt_dict, pos_dict, out_dir):
+def analyse_errors_by_pos_tag(utt_dict, pos_dict, out_dir, references=None):
+    # references: optional index of the data dir 'text' file to match the pos tagged sentences against
 
     pos_tag_statistics = {}
 
     for utt_id in utt_dict.keys():
         utterance = utt_dict[utt_id]
-        clean_utt = clean_utterance(utterance.ref)
+        if references is None:
+            clean_utt = clean_utterance(utterance.ref)
+        else:
+            ref = references.get(utt_id)
+            if ref is None:
+                continue
+            clean_utt = clean_utterance(ref)
         if not pos_tagged(clean_utt, pos_dict):
             continue
 
         word_pos_pairs = pos_dict[clean_utt]
+        if references is not None and len(word_pos_pairs) != len(utterance.ref.split()) - utterance.ins:
+            # text and scored reference differ (e.g. filtered before scoring), can't align the tags
+            continue
         match_pairs(utterance, word_pos_pairs, pos_tag_statistics)
 
     print_statistics(pos_tag_statistics, out_dir)
@@ -224,6 +238,7 @@ def parse_args():
     parser.add_argument('i', type=argparse.FileType('r'), help='Kaldi per_utt file')
     parser.add_argument('p', type=argparse.FileType('r'), help='POS-tagged reference texts')
     parser.add_argument('-f', type=str, help='Format of the POS-tagged input file, default=IceTagger format')
+    parser.add_argument('-d', type=str, help='Kaldi data directory, take the references from its text file')
     parser.add_argument('-o', type=str, default='kaldi_per_wordclass', help='Output directory')
 
     return parser.parse_args()
@@ -257,7 +272,9 @@ def main():
 
     utterance_dict = utterance.Utterance.init_utterance_dict(args.i)
 
-    analyse_errors_by_pos_tag(utterance_dict, pos_tagged_dict, out_dir)
+    references = kaldi_local.open_data_dir(args.d)['text'] if args.d else None
+
+    analyse_errors_by_pos_tag(utterance_dict, pos_tagged_dict, out_dir, references)
 
 
 if __name__ == '__main__':
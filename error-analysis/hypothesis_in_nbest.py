@@ -11,6 +11,11 @@
 #   utt-id ref reference (with '***' for insertions in best-path hypothesis)
 # e.g.: is_is-althingi1_01-2011-11-30T16:18:39.715490 ref  ***  telur  að  framið  hafi  verið  verkfallsbrot
 #
+# or a Kaldi data directory, the references are then looked up in its 'text' file through the data directory index
+#
+# With a symbol table (-w words.txt) the integer n-best archives ('words', as written by nbest-to-linear) are read
+# instead of their int2sym conversion, and hypotheses and references are compared as sequences of word ids
+#
 # Comparison results:
 #   1) If hypothesis no 1 matches reference: increment counter, ignore utterance
 #   2) If some hypothesis from the n-best list matches the reference, collect the ref-correct hyp pair
@@ -24,8 +29,10 @@ import time
 
 from pathlib import Path
 
+import kaldi_local
 
 NBEST_HYPOTHESIS_FILENAME = '/words_text.txt'
+NBEST_IDS_FILENAME = '/words'
 
 
 class NBestStatistics:
@@ -52,20 +59,21 @@ class NBestStatistics:
         self.not_in_nbest_count += 1
 
 
-def init_hyp_list(nbest_input):
+def init_hyp_list(nbest_input, filename=NBEST_HYPOTHESIS_FILENAME):
     print(nbest_input)
     p = Path(nbest_input)
     hyp_list = []
     if p.is_dir():
         for arch in p.iterdir():
             if arch.is_dir():
-                q = str(arch) + NBEST_HYPOTHESIS_FILENAME
+                q = str(arch) + filename
                 print(q)
                 with open(q) as f:
                     hyp_list = hyp_list + f.readlines()
 
     else:
-        hyp_list = nbest_input.readlines()
+        with open(nbest_input) as f:
+            hyp_list = f.readlines()
 
     return hyp_list
 
@@ -85,16 +93,42 @@ def init_references(referencefile):
     return references
 
 
-def init_nbest(hypothesisfile):
+class IndexedReferences:
+    # Reference lookups in the 'text' file of a Kaldi data directory, without reading the whole file
+
+    def __init__(self, data_dir):
+        self.index = kaldi_local.open_data_dir(data_dir)['text']
+
+    def __contains__(self, utt_id):
+        return utt_id in self.index
+
+    def __getitem__(self, utt_id):
+        return ' '.join(self.index[utt_id].split())
+
+
+def load_references(reference_path):
+    """
+    :param reference_path: a per_utt file or a Kaldi data directory
+    """
+    if os.path.isdir(reference_path):
+        return IndexedReferences(reference_path)
+    with open(reference_path) as f:
+        return init_references(f)
+
+
+def init_nbest(hypothesisfile, symbols=None):
+    # with a symbol table the hypotheses are tuples of word ids, otherwise strings
     nbest_hypothesis = {}
-    hyp_list = init_hyp_list(hypothesisfile)
+    hyp_list = init_hyp_list(hypothesisfile, NBEST_HYPOTHESIS_FILENAME if symbols is None else NBEST_IDS_FILENAME)
 
     for line in hyp_list:
         line_arr = line.split()
         full_id = line_arr[0]
         last_dash = full_id.rindex('-')
         id = full_id[0:last_dash]
-        if len(line_arr) >= 2:
+        if symbols is not None:
+            utt = tuple(int(word_id) for word_id in line_arr[1:])
+        elif len(line_arr) >= 2:
             utt = ' '.join(line_arr[1:]).strip()
         else:
             utt = ''
@@ -139,25 +173,30 @@ def write_stats(out_dir, stats):
                 out_all_wrong.write(key + '\t' + hyp + '\n')
 
 
-def find_in_nbest_path(referencefile, hypothesisfile, out_dir):
+def find_in_nbest_path(references, hypothesisfile, out_dir, symbols=None):
     # search for reference utterances in nbest-lists,
     # collect number of correct (nbest index == 0), utterances contained in nbest with rank,
     # and utterances not contained in the nbest list.
+    # references: a mapping of utt-id to reference, see load_references()
+    # symbols: a SymbolTable to compare word ids instead of strings, see kaldi_local.open_symbol_table()
+
+    nbest = init_nbest(hypothesisfile, symbols)
 
-    references = init_references(referencefile)
-    nbest = init_nbest(hypothesisfile)
+    def as_text(hyp):
+        return hyp if symbols is None else ' '.join(symbols.words(hyp))
 
     stats = NBestStatistics()
 
     for utt_id in nbest.keys():
         ref_utt = references[utt_id]
+        ref_hyp = ref_utt if symbols is None else symbols.ids(ref_utt.split())
 
-        if ref_utt in nbest[utt_id]:
-            nbest_ind = nbest[utt_id].index(ref_utt)
-            nbest_info_arr = [utt_id + '-' + str(nbest_ind + 1), ref_utt, nbest[utt_id][0]]
+        if ref_hyp in nbest[utt_id]:
+            nbest_ind = nbest[utt_id].index(ref_hyp)
+            nbest_info_arr = [utt_id + '-' + str(nbest_ind + 1), ref_utt, as_text(nbest[utt_id][0])]
             stats.increment_nbest(nbest_ind, nbest_info_arr)
         else:
-            all_wrong_list = nbest[utt_id]
+            all_wrong_list = [as_text(hyp) for hyp in nbest[utt_id]]
             all_wrong_list.append('REF='+ref_utt)
             stats.increment_all_wrong(utt_id, all_wrong_list)
 
@@ -167,9 +206,10 @@ def find_in_nbest_path(referencefile, hypothesisfile, out_dir):
 def parse_args():
     parser = argparse.ArgumentParser(description='Comparison of Kaldi nbest hypothesis file to reference utterances',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('r', type=argparse.FileType('r'), help='Reference file')
+    parser.add_argument('r', type=str, help='Reference file (per_utt) OR a Kaldi data directory')
     parser.add_argument('h', type=str, help='Kaldi nbest file OR a directory of archives with nbest files')
     parser.add_argument('-o', type=str, default='kaldi_per_utt_nbest', help='Output directory')
+    parser.add_argument('-w', type=str, help='Symbol table (words.txt) to read the integer nbest archives with')
 
     return parser.parse_args()
 
@@ -177,7 +217,7 @@ def parse_args():
 def main():
 
     args = parse_args()
-    referencefile = args.r
+    references = load_references(args.r)
     hypothesisfile = args.h
 
     if args.o == 'kaldi_per_utt_nbest':
@@ -195,7 +235,8 @@ def main():
             raise
         pass
 
-    find_in_nbest_path(referencefile, hypothesisfile, out_dir)
+    symbols = kaldi_local.open_symbol_table(args.w) if args.w else None
+    find_in_nbest_path(references, hypothesisfile, out_dir, symbols)
 
 
 if __name__ == '__main__':
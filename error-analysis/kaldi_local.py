@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Access to the Python helpers of the Kaldi recipe in ice-kaldi/s5/local, e.g. the data directory index:
+
+    data_dir_index = kaldi_local.import_module('data_dir_index')
+    references = data_dir_index.DataDirIndex('path/to/data/test')['text']
+
+or the symbol table of a lang directory, giving the analyses the word ids of the recipe:
+
+    symbols = kaldi_local.open_symbol_table('path/to/lang/words.txt')
+
+and of the text normalization in ice-norm/text-cleaning, e.g. the MinHash signatures of its near-duplicate search:
+
+    minhash = kaldi_local.import_ice_norm('minhash')
+
+"""
+
+import importlib
+import os
+import sys
+
+LOCAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ice-kaldi', 's5', 'local')
+ICE_NORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ice-norm', 'text-cleaning')
+
+
+def _import_from(directory, name):
+    directory = os.path.normpath(directory)
+    if directory not in sys.path:
+        sys.path.append(directory)
+    return importlib.import_module(name)
+
+
+def import_module(name):
+    return _import_from(LOCAL_DIR, name)
+
+
+def import_ice_norm(name):
+    return _import_from(ICE_NORM_DIR, name)
+
+
+def open_data_dir(data_dir):
+    # DataDirIndex of a Kaldi data directory, index files are built on first access
+    return import_module('data_dir_index').DataDirIndex(data_dir)
+
+
+def open_symbol_table(symtab_file):
+    # memory-mapped SymbolTable of a words.txt file, compiled on first access
+    return import_module('symtab').SymbolTable(symtab_file)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Live error analysis of an ongoing decode. Follows a growing per_utt file (or a hypothesis file in Kaldi text format
+plus the reference text) and updates the category, context and word statistics with each new utterance, so the
+cost of an update only depends on the number of new lines. The current summary is served as JSON on a local
+HTTP endpoint:
+
+    python main.py path/to/wer_details -watch -port 8080
+    python main.py path/to/wer_details -watch -hyp path/to/hypothesis.txt -ref path/to/data/text
+
+    curl http://localhost:8080/
+
+Hypothesis format (as written by lattice-best-path | int2sym.pl):
+
+    is_is-althingi1_04-2011-11-30T16:55:30.601205 símaskráin er komin út
+
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import utterance
+import categories
+import errors_by_context
+import operationstats
+
+TOP_WORDS = 20     # number of most erroneous reference words in the summary
+
+
+class FileTail:
+    """
+    Reads lines appended to a file since the last call. An incomplete last line is kept until it is finished.
+    If the file is truncated or replaced (e.g. when scoring is restarted), reading starts again from the beginning.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+        self.inode = None
+        self.rest = b''
+
+    def read_new_lines(self):
+        """
+        :return: a tuple (lines, restarted), where restarted is True if the file was truncated or replaced
+        """
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return [], False
+
+        restarted = False
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            restarted = self.inode is not None
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.rest = b''
+
+        if stat.st_size == self.offset:
+            return [], restarted
+
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        self.offset += len(data)
+
+        lines = (self.rest + data).split(b'\n')
+        self.rest = lines.pop()
+        return [line.decode('utf-8') for line in lines], restarted
+
+
+class PerUttParser:
+    # Collects the four lines (ref, hyp, op, #csid) of each utterance, an utterance is complete with its #csid line
+
+    def __init__(self):
+        self.current = None
+
+    def reset(self):
+        self.current = None
+
+    def parse_line(self, line):
+        """
+        :return: the completed Utterance if 'line' was its last line, otherwise None
+        """
+        if not line.strip():
+            return None
+        utt_id, info, *content = line.split()
+        if self.current is None or self.current.utt_id != utt_id:
+            self.current = utterance.Utterance(utt_id)
+        self.current.add_line(info, content)
+        if info == '#csid':
+            finished = self.current
+            self.current = None
+            return finished
+        return None
+
+
+class HypothesisParser:
+    # Aligns each hypothesis line against its reference from a Kaldi text file
+
+    def __init__(self, ref_file):
+        self.references = {}
+        for line in ref_file:
+            utt_id, *words = line.split()
+            self.references[utt_id] = words
+
+    def reset(self):
+        pass
+
+    def parse_line(self, line):
+        if not line.strip():
+            return None
+        utt_id, *hyp_words = line.split()
+        if utt_id not in self.references:
+            print('Utterance ' + utt_id + ' not found in reference file, skipping')
+            return None
+        return utterance.Utterance.from_alignment(utt_id, self.references[utt_id], hyp_words)
+
+
+class CategoryCounts:
+    """
+    Counting sink for categories.categorize_utterance: keeps the number of utterances and occurrences per error
+    category instead of collecting the utterances themselves, so its size does not grow with the decode.
+    """
+
+    def __init__(self):
+        names = categories._create_error_categories().categories_dict.keys()
+        self.utterances = dict.fromkeys(names, 0)
+        self.occurrences = dict.fromkeys(names, 0)
+
+    def add_to_dict(self, category, element):
+        if len(element) > 0:
+            self.utterances[category] = self.utterances.get(category, 0) + 1
+
+    def update_counter(self, category, counter):
+        self.occurrences[category] = self.occurrences.get(category, 0) + counter
+
+
+class LiveStatistics:
+    # Holds the aggregates of all utterances seen so far, each utterance is added in O(utterance length)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.utterance_count = 0
+        self.error_count = 0
+        self.word_count = 0
+        self.error_cats = CategoryCounts()
+        self.ops_map = errors_by_context.create_operations_map()
+        self.reference_map = {}
+        self.last_update = None
+
+    def add_utterance(self, utt):
+        with self.lock:
+            self.utterance_count += 1
+            self.error_count += utt.sum_errors()
+            self.word_count += len(utt.ref.split()) - utt.ins
+            categories.categorize_utterance(utt, self.error_cats)
+            errors_by_context.add_utterance(utt, self.ops_map)
+            for operation, ref, hyp in utt.word_operations():
+                if ref == '***':
+                    continue
+                ref_stat = self.reference_map.get(ref)
+                if ref_stat is None:
+                    ref_stat = operationstats.OperationStatistics(ref)
+                    self.reference_map[ref] = ref_stat
+                ref_stat.increment(operation, 1)
+            self.last_update = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _categories_summary(self):
+        summary = {}
+        for name, count in self.error_cats.utterances.items():
+            summary[name] = {'utterances': count, 'occurrences': self.error_cats.occurrences.get(name, 0)}
+        return summary
+
+    def _context_summary(self):
+        op_map = errors_by_context.OperationsMap(self.ops_map)
+        contexts = [errors_by_context.START, errors_by_context.CORRECT, errors_by_context.DELETION,
+                    errors_by_context.INSERTION, errors_by_context.SUBSTITUTION]
+        errors_after = {ctx: op_map.get_error_count_succeeding(ctx) for ctx in contexts}
+        correct_after = {ctx: op_map.get_count_succeeding(errors_by_context.CORRECT, ctx) for ctx in contexts}
+
+        error_after_error = sum(errors_after[ctx] for ctx in contexts[2:])
+        correct_after_error = sum(correct_after[ctx] for ctx in contexts[2:])
+        sum_correct = op_map.get_count(errors_by_context.CORRECT)
+
+        return {'errors_after': errors_after,
+                'correct_after': correct_after,
+                'P(E)': _ratio(self.error_count, sum_correct + self.error_count),
+                'P(E|E)': _ratio(error_after_error, error_after_error + correct_after_error),
+                'P(E|C)': _ratio(errors_after[errors_by_context.CORRECT],
+                                 errors_after[errors_by_context.CORRECT] + correct_after[errors_by_context.CORRECT])}
+
+    def _words_summary(self):
+        # the words are selected on a snapshot outside the lock, only the selected ones are read under it again
+        with self.lock:
+            stats = list(self.reference_map.values())
+        top = heapq.nlargest(TOP_WORDS, stats, key=lambda x: (x.occurrences - x.correct, x.occurrences))
+        with self.lock:
+            return [{'word': stat.word, 'occurrences': stat.occurrences, 'correct': stat.correct,
+                     'substitutions': stat.substitutions, 'deletions': stat.deletions}
+                    for stat in top if stat.correct < stat.occurrences]
+
+    def summary(self):
+        with self.lock:
+            summary = {'last_update': self.last_update,
+                       'utterances': self.utterance_count,
+                       'reference_words': self.word_count,
+                       'errors': self.error_count,
+                       'wer': _ratio(self.error_count * 100, self.word_count),
+                       'categories': self._categories_summary(),
+                       'context': self._context_summary()}
+        summary['most_erroneous_words'] = self._words_summary()
+        return summary
+
+
+def _ratio(numerator, denominator):
+    if denominator == 0:
+        return None
+    return round(numerator / denominator, 2)
+
+
+def _create_handler(stats):
+
+    class SummaryHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            body = json.dumps(stats.summary(), ensure_ascii=False, indent=2).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # keep stdout for the analysis progress
+            pass
+
+    return SummaryHandler
+
+
+def watch(input_file, parser, port, interval=1.0):
+    """
+    Follows 'input_file' and serves the statistics on http://localhost:<port>/ until interrupted.
+
+    :param input_file: the growing per_utt or hypothesis file
+    :param parser: a PerUttParser or HypothesisParser matching the format of input_file
+    """
+    stats = LiveStatistics()
+    server = ThreadingHTTPServer(('localhost', port), _create_handler(stats))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print('Watching ' + input_file + ', serving summary on http://localhost:' + str(server.server_port) + '/')
+
+    tail = FileTail(input_file)
+    try:
+        while True:
+            lines, restarted = tail.read_new_lines()
+            if restarted:
+                print(input_file + ' was truncated or replaced, starting over')
+                stats.reset()
+                parser.reset()
+            for line in lines:
+                utt = parser.parse_line(line)
+                if utt is not None:
+                    stats.add_utterance(utt)
+            if not lines:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
@@ -5,6 +5,16 @@
 
 About kaldi error analysis
 
+Single entry point for the error analysis scripts. Without a subcommand all analyses available for a wer_details
+directory are performed, with a subcommand only the selected analyzer is run, taking the same arguments as the
+script itself:
+
+    python main.py path/to/wer_details -o results/ -data_dir path/to/data
+    python main.py categories path/to/wer_details/per_utt -o kaldi_error_cats
+    python main.py context --help
+
+Analyzer modules and their dependencies (e.g. Levenshtein) are only imported when they are needed, see ANALYZERS.
+
 """
 
 import sys
@@ -12,15 +22,34 @@ import os
 import os.path
 import errno
 import argparse
+import importlib
+
+
+# Registry of analyzers, subcommand: (module, description). Register new analysis scripts here, a module needs a
+# main() function parsing its arguments from sys.argv.
+ANALYZERS = {
+    'categories': ('categories', 'Categorize errors by edit distance, extract compounds (per_utt)'),
+    'bin': ('bin_checker', 'Substitutions in same inflection paradigm or not (ops, BÍN csv)'),
+    'context': ('errors_by_context', 'Errors by context of preceding operations (per_utt)'),
+    'frequency': ('errors_by_frequency', 'Errors by corpus frequency (ops, frequency file)'),
+    'speaker': ('errors_by_speaker_class', 'Errors by speaker feature, e.g. gender (per_spk, speaker mapping)'),
+    'length': ('errors_by_word_length', 'Errors by word length (ops)'),
+    'wordclass': ('errors_by_wordclass', 'Errors by word class (per_utt, POS-tagged references)'),
+    'nbest': ('hypothesis_in_nbest', 'Search for correct hypothesis in n-best lists (per_utt, nbest dir)'),
+    'time': ('errors_by_time', 'Errors by position in utterance, word duration and pauses (per_utt, CTM)'),
+    'clusters': ('error_clusters', 'Cluster utterances with similar errors by MinHash/LSH (per_utt)'),
+}
 
-import utterance
-import categories
-import bin_checker
-import errors_by_context
-import errors_by_frequency
-import errors_by_speaker_class
-import errors_by_word_length
-import hypothesis_in_nbest
+
+def load_analyzer(name):
+    return importlib.import_module(ANALYZERS[name][0])
+
+
+def run_analyzer(name, analyzer_args):
+    # the analyzer parses its own arguments, show 'main.py <name>' as program name in its usage messages
+    analyzer = load_analyzer(name)
+    sys.argv = [os.path.basename(sys.argv[0]) + ' ' + name] + analyzer_args
+    return analyzer.main()
 
 
 class ErrorAnalysis:
@@ -36,6 +65,8 @@ class ErrorAnalysis:
         print('Starting error analysis ...')
         print('categories (per-utt) analyzis ...')
         # print(self.wer_details_files[1])
+        import utterance
+        categories = load_analyzer('categories')
         utterance_dict = utterance.Utterance.init_utterance_dict(open(self.wer_details_files[1]))
         categories.analyse_input(utterance_dict, out_dir)
 
@@ -48,10 +79,10 @@ class ErrorAnalysis:
         else:
             ops_list = open(self.wer_details_files[2]).read().splitlines()
             bin_list = open(self.bin).read().splitlines()
-            bin_checker.find_same_lemma(ops_list, bin_list, out_dir)
+            load_analyzer('bin').find_same_lemma(ops_list, bin_list, out_dir)
 
         print('by context ...')
-        errors_by_context.analyse_errors_by_context(open(self.wer_details_files[1]), out_dir)
+        load_analyzer('context').analyse_errors_by_context(open(self.wer_details_files[1]), out_dir)
 
         if not self.freq_file:
             print('no frequency data, skipping frequency analysis ...')
@@ -61,27 +92,32 @@ class ErrorAnalysis:
             if top_freq == 0:
                 top_freq = len(input_file_list)
 
-            errors_by_frequency.analyse_by_corpus_frequency(input_file_list, open(self.freq_file), out_dir, top_freq)
+            load_analyzer('frequency').analyse_by_corpus_frequency(input_file_list, open(self.freq_file), out_dir,
+                                                                   top_freq)
 
         if not self.speakers:
             print('no speaker data, skipping per speaker feature analysis ...')
             print()
         else:
             print('by speaker feature ...')
-            errors_by_speaker_class.analyse_by_speaker_feature(open(self.wer_details_files[0]), open(self.speakers), out_dir)
+            speaker = load_analyzer('speaker')
+            speaker_map = speaker.load_speaker_map(self.speakers)
+            speaker.analyse_by_speaker_feature(open(self.wer_details_files[0]), speaker_map, out_dir)
 
         print('by word length ...')
         input_file_list = open(self.wer_details_files[2]).readlines()
         if top_occ == 0:
             top_occ = len(input_file_list)
 
-        errors_by_word_length.analyse_by_word_length(input_file_list, top_occ, out_dir)
+        load_analyzer('length').analyse_by_word_length(input_file_list, top_occ, out_dir)
 
         if len(self.wer_details_files) < 4:
             print('no nbest data available, skipping nbest analysis ...')
         else:
             print('nbest analysis ...')
-            hypothesis_in_nbest.find_in_nbest_path(open(self.wer_details_files[1]), self.wer_details_files[3], out_dir)
+            nbest = load_analyzer('nbest')
+            references = nbest.load_references(self.wer_details_files[1])
+            nbest.find_in_nbest_path(references, self.wer_details_files[3], out_dir)
 
 
 
@@ -95,6 +131,7 @@ class ErrorAnalysis:
 BIN = 'SHsnid_lower.csv'                          # The whole BÍN db as csv file
 FREQ_FILE = 'leipzig_freq.txt'              # Word - frequency table, ideally from the language model corpus
 SPEAKER_FEATURES = 'speakers.txt'   # Mapping of speaker-ids to some features, typically gender
+KALDI_SPEAKER_FEATURES = 'spk2gender'   # Used instead if data_dir is a Kaldi data directory
 
 
 def verify_wer_details(inp_dir):
@@ -125,6 +162,8 @@ def verify_data_dir(data_dir, error_analysis):
         error_analysis.freq_file = data_dir + sep + FREQ_FILE
     if os.path.isfile(data_dir + sep + SPEAKER_FEATURES):
         error_analysis.speakers = data_dir + sep + SPEAKER_FEATURES
+    elif os.path.isfile(data_dir + sep + KALDI_SPEAKER_FEATURES):
+        error_analysis.speakers = data_dir
 
     return error_analysis
 
@@ -152,19 +191,58 @@ def writeable_dir(out_dir):
     return out_dir
 
 
+class HelpFormatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter):
+    pass
+
+
+def analyzers_help():
+    lines = ['analyzers (run "main.py <analyzer> --help" for their arguments):']
+    for name in ANALYZERS:
+        lines.append('  {0:<12}{1}'.format(name, ANALYZERS[name][1]))
+    return '\n'.join(lines)
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Error analysis of Kaldi wer_details directory',
-                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+                                     usage='%(prog)s [-h] <analyzer> ... | %(prog)s i [options]',
+                                     epilog=analyzers_help(), formatter_class=HelpFormatter)
     parser.add_argument('i', type=readable_dir, help='Path to wer_details')
     parser.add_argument('-o', type=writeable_dir, help='Output directory', default='kaldi_error_analysis_results/')
     parser.add_argument('-data_dir', type=readable_dir,
                         help='Path to BIN, frequency file and speaker-id feature mapping file')
+    parser.add_argument('-watch', action='store_true',
+                        help='Follow a growing per_utt file (or -hyp) and serve the current statistics as JSON')
+    parser.add_argument('-port', type=int, default=8080, help='Port of the JSON endpoint in watch mode')
+    parser.add_argument('-interval', type=float, default=1.0, help='Seconds between checks for new lines in watch mode')
+    parser.add_argument('-hyp', type=str, help='Watch this hypothesis file (Kaldi text format) instead of per_utt')
+    parser.add_argument('-ref', type=argparse.FileType('r'), help='Reference text (Kaldi text format), needed for -hyp')
 
     return parser.parse_args()
 
 
+def watch(args):
+    import live_analysis
+    if args.hyp:
+        if not args.ref:
+            print('Watching a hypothesis file needs a reference file (-ref)')
+            return 1
+        parser = live_analysis.HypothesisParser(args.ref)
+        input_file = args.hyp
+    else:
+        parser = live_analysis.PerUttParser()
+        input_file = os.path.join(args.i, 'per_utt')
+
+    live_analysis.watch(input_file, parser, args.port, args.interval)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ANALYZERS:
+        return run_analyzer(sys.argv[1], sys.argv[2:])
+
     args = parse_args()
+    if args.watch:
+        return watch(args)
+
     error_analysis = verify_wer_details(args.i)
 
     if not args.data_dir:
@@ -50,6 +50,73 @@ class Utterance:
     def sum_ins_delete(self):
         return self.ins + self.delete
 
+    # info: one of 'ref', 'hyp', 'op', '#csid' as in the per_utt file, content: the rest of the line split
+    def add_line(self, info, content):
+        if info == 'ref':
+            self.set_ref(' '.join(content))
+        elif info == 'hyp':
+            self.set_hyp(' '.join(content))
+        elif info == 'op':
+            self.set_operations(content)
+        elif info == '#csid':
+            self.set_operations_count(content)
+
+    def word_operations(self):
+        """
+        Yields (operation, ref-word, hyp-word) for each aligned position, with operation names as in the Kaldi
+        ops file: correct, substitution, insertion, deletion
+        """
+        op_names = {'C': 'correct', 'S': 'substitution', 'I': 'insertion', 'D': 'deletion'}
+        ref_arr = self.ref.split()
+        hyp_arr = self.hyp.split()
+        for ind, op in enumerate(self.op):
+            yield op_names[op], ref_arr[ind], hyp_arr[ind]
+
+    @staticmethod
+    def from_alignment(utt_id, ref_words, hyp_words):
+        """
+        Creates an utterance from an unaligned reference and hypothesis by a Levenshtein alignment of the words,
+        like Kaldi's align-text does before scoring. Insertions and deletions are marked with '***'.
+        """
+        rows = len(ref_words) + 1
+        cols = len(hyp_words) + 1
+        dist = [[0] * cols for _ in range(rows)]
+        for i in range(rows):
+            dist[i][0] = i
+        for j in range(cols):
+            dist[0][j] = j
+        for i in range(1, rows):
+            for j in range(1, cols):
+                cost = 0 if ref_words[i - 1] == hyp_words[j - 1] else 1
+                dist[i][j] = min(dist[i - 1][j - 1] + cost, dist[i - 1][j] + 1, dist[i][j - 1] + 1)
+
+        ref_arr, hyp_arr, ops = [], [], []
+        i, j = rows - 1, cols - 1
+        while i > 0 or j > 0:
+            if i > 0 and j > 0 and dist[i][j] == dist[i - 1][j - 1] + (ref_words[i - 1] != hyp_words[j - 1]):
+                ref_arr.append(ref_words[i - 1])
+                hyp_arr.append(hyp_words[j - 1])
+                ops.append('C' if ref_words[i - 1] == hyp_words[j - 1] else 'S')
+                i, j = i - 1, j - 1
+            elif i > 0 and dist[i][j] == dist[i - 1][j] + 1:
+                ref_arr.append(ref_words[i - 1])
+                hyp_arr.append('***')
+                ops.append('D')
+                i -= 1
+            else:
+                ref_arr.append('***')
+                hyp_arr.append(hyp_words[j - 1])
+                ops.append('I')
+                j -= 1
+
+        ops.reverse()
+        utt = Utterance(utt_id)
+        utt.set_ref(' '.join(reversed(ref_arr)))
+        utt.set_hyp(' '.join(reversed(hyp_arr)))
+        utt.set_operations(ops)
+        utt.set_operations_count([ops.count('C'), ops.count('S'), ops.count('I'), ops.count('D')])
+        return utt
+
 
     @staticmethod
     def init_utterance_dict(utt_file):
@@ -60,12 +127,7 @@ class Utterance:
 
             if utt_id == current_id:
                 decoded_utt = utt_dict[utt_id]
-                if info == 'hyp':
-                    decoded_utt.set_hyp(' '.join(content))
-                elif info == 'op':
-                    decoded_utt.set_operations(content)
-                elif info == '#csid':
-                    decoded_utt.set_operations_count(content)
+                decoded_utt.add_line(info, content)
             else:
                 decoded_utt = Utterance(utt_id)
                 decoded_utt.set_ref(' '.join(content))
@@ -74,3 +136,22 @@ class Utterance:
             utt_dict[utt_id] = decoded_utt
 
         return utt_dict
+
+    @staticmethod
+    def iter_utterances(utt_file):
+        # Like init_utterance_dict, but yields one utterance at a time instead of holding all of them in memory
+        decoded_utt = None
+        for line in utt_file:
+            if not line.strip():
+                continue
+            utt_id, info, *content = line.split()
+            if decoded_utt is None or decoded_utt.utt_id != utt_id:
+                if decoded_utt is not None:
+                    yield decoded_utt
+                decoded_utt = Utterance(utt_id)
+                decoded_utt.set_ref(' '.join(content))
+            else:
+                decoded_utt.add_line(info, content)
+
+        if decoded_utt is not None:
+            yield decoded_utt
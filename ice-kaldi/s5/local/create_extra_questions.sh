@@ -6,10 +6,5 @@ fi
 
 dictdir=$1
 
-#grep -v ː $dictdir/nonsilence_phones.txt | awk '{print $1 "ː"}' | sort
-
-join -t '' \
-     <(grep ː $dictdir/nonsilence_phones.txt) \
-     <(grep -v ː $dictdir/nonsilence_phones.txt | awk '{print $1 "ː"}' | LC_ALL=C sort) \
-    | awk '{s=$1; sub(/ː/, ""); print $1 " " s }' \
-     > $dictdir/extra_questions.txt
+# a question '<phone> <phone>ː' for each phone in nonsilence_phones.txt whose long variant is a phone too
+python3 local/prep_dict.py questions $dictdir
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Random access by key (utterance, speaker or recording id) to the files of a Kaldi data directory: text, utt2spk,
+spk2utt, wav.scp, utt2dur, segments, spk2gender, ...
+
+For each file an index of line offsets sorted by key is built once and stored in <data-dir>/.index/<file>.idx.
+Both the data file and the index are memory-mapped, a lookup is a binary search over the index (O(log n)) and
+returns a slice of the mapped data file without copying or parsing the rest of the file. An index is rebuilt
+automatically when its data file has changed (size or modification time).
+
+Usage from the command line:
+
+    local/data_dir_index.py build data/test_data
+    local/data_dir_index.py lookup data/test_data utt2spk <utt-id> [<utt-id> ...]
+
+and from Python:
+
+    index = DataDirIndex('data/test_data')
+    speaker = index['utt2spk'].get(utt_id)
+    words = index['text'][utt_id].split()
+
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+DATA_FILES = ['text', 'utt2spk', 'spk2utt', 'wav.scp', 'utt2dur', 'segments', 'spk2gender', 'feats.scp', 'cmvn.scp']
+INDEX_DIR = '.index'
+
+MAGIC = b'KDIDX001'
+HEADER = struct.Struct('<8sQQQ')    # magic, size of data file, mtime of data file (ns), number of entries
+ENTRY = struct.Struct('<QII')       # line offset, key length, line length (without newline)
+
+
+def _split_key(line):
+    # key is everything up to the first space or tab
+    for ind, char in enumerate(line):
+        if char in b' \t':
+            return ind
+    return len(line)
+
+
+def build_index(data_file, index_file):
+    """
+    Writes the index for 'data_file' to 'index_file'. Lines are sorted by the bytes of their key, like
+    'LC_ALL=C sort', on duplicate keys the first line wins.
+    """
+    stat = os.stat(data_file)
+    entries = []
+    with open(data_file, 'rb') as f:
+        offset = 0
+        for line in f:
+            length = len(line)
+            content = line.rstrip(b'\r\n')
+            if content.strip():
+                key_len = _split_key(content)
+                entries.append((content[:key_len], offset, key_len, len(content)))
+            offset += length
+
+    entries.sort(key=lambda x: x[0])
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'wb') as out:
+        unique = []
+        for entry in entries:
+            if unique and unique[-1][0] == entry[0]:
+                continue
+            unique.append(entry)
+        out.write(HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns, len(unique)))
+        for _, offset, key_len, line_len in unique:
+            out.write(ENTRY.pack(offset, key_len, line_len))
+    os.replace(tmp_file, index_file)
+
+
+class DataFileIndex:
+    """
+    Sorted key index of one data file. Supports 'key in index', index[key], index.get(key) for the value (the line
+    without the key, as str) and index.line(key) for the whole line as a memoryview into the mapped file.
+    """
+
+    def __init__(self, data_file, index_file):
+        self.data_file = data_file
+        self.index_file = index_file
+        if not self._is_current():
+            build_index(data_file, index_file)
+
+        self._data_fd = open(data_file, 'rb')
+        self._index_fd = open(index_file, 'rb')
+        self._data_map = self._map(self._data_fd)
+        self.data = memoryview(self._data_map)
+        self.index = self._map(self._index_fd)
+        self.count = HEADER.unpack_from(self.index, 0)[3]
+
+    @staticmethod
+    def _map(f):
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _is_current(self):
+        if not os.path.isfile(self.index_file):
+            return False
+        stat = os.stat(self.data_file)
+        with open(self.index_file, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, size, mtime, _ = HEADER.unpack(header)
+        return magic == MAGIC and size == stat.st_size and mtime == stat.st_mtime_ns
+
+    def _entry(self, ind):
+        return ENTRY.unpack_from(self.index, HEADER.size + ind * ENTRY.size)
+
+    def _key(self, ind):
+        # slicing the mmap copies, but only the (short) key
+        offset, key_len, _ = self._entry(ind)
+        return self._data_map[offset:offset + key_len]
+
+    def _find(self, key):
+        key = key.encode('utf-8') if isinstance(key, str) else key
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count and self._key(low) == key:
+            return low
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def line(self, key):
+        """
+        :return: the whole line of 'key' as a memoryview of the mapped data file, or None
+        """
+        ind = self._find(key)
+        if ind is None:
+            return None
+        offset, _, line_len = self._entry(ind)
+        return self.data[offset:offset + line_len]
+
+    def get(self, key, default=None):
+        ind = self._find(key)
+        if ind is None:
+            return default
+        offset, key_len, line_len = self._entry(ind)
+        return bytes(self.data[offset + key_len:offset + line_len]).decode('utf-8').strip()
+
+    def keys(self):
+        # all keys in sorted (C locale) order
+        for ind in range(self.count):
+            yield self._key(ind).decode('utf-8')
+
+    def items(self):
+        for key in self.keys():
+            yield key, self.get(key)
+
+    def close(self):
+        # views returned by line() must be released before
+        self.data.release()
+        for mapped in (self._data_map, self.index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self._data_fd.close()
+        self._index_fd.close()
+
+
+class DataDirIndex:
+    # Opens the index of a data file on first access, e.g. DataDirIndex('data/test_data')['utt2spk']
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.index_dir = os.path.join(data_dir, INDEX_DIR)
+        self.files = {}
+
+    def __contains__(self, name):
+        return os.path.isfile(os.path.join(self.data_dir, name))
+
+    def __getitem__(self, name):
+        if name not in self.files:
+            data_file = os.path.join(self.data_dir, name)
+            if not os.path.isfile(data_file):
+                raise KeyError(name + ' not found in ' + self.data_dir)
+            os.makedirs(self.index_dir, exist_ok=True)
+            self.files[name] = DataFileIndex(data_file, os.path.join(self.index_dir, name + '.idx'))
+        return self.files[name]
+
+    def build(self, names=DATA_FILES):
+        # (re)builds the indices of all existing files in 'names' that are not up to date
+        built = []
+        for name in names:
+            if name in self:
+                self[name]
+                built.append(name)
+        return built
+
+    def close(self):
+        for index in self.files.values():
+            index.close()
+        self.files = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Builds and queries sorted key indices of Kaldi data directories',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    build = subparsers.add_parser('build', help='Build indices for all data files in a data directory')
+    build.add_argument('data_dir', type=str, help='Kaldi data directory')
+    lookup = subparsers.add_parser('lookup', help='Print the lines of the given keys')
+    lookup.add_argument('data_dir', type=str, help='Kaldi data directory')
+    lookup.add_argument('file', type=str, help='Data file, e.g. utt2spk')
+    lookup.add_argument('keys', type=str, nargs='+', help='Keys to look up')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command is None:
+        print('Usage: ' + sys.argv[0] + ' build|lookup ...', file=sys.stderr)
+        return 1
+
+    index = DataDirIndex(args.data_dir)
+    if args.command == 'build':
+        built = index.build()
+        print(sys.argv[0] + ': indexed ' + ' '.join(built) + ' in ' + index.index_dir, file=sys.stderr)
+        return 0
+
+    status = 0
+    for key in args.keys:
+        line = index[args.file].line(key)
+        if line is None:
+            print(key + ' not found in ' + args.file, file=sys.stderr)
+            status = 1
+        else:
+            sys.stdout.buffer.write(bytes(line) + b'\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
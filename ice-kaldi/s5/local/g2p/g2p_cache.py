@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Transcribes a word list with a Sequitur G2P model (called by local/g2p/transcribe_g2p.sh), keeping the
+pronunciations in a cache so words already transcribed with the same model are not transcribed again:
+
+    local/g2p/g2p_cache.py --jobs 8 data/local/g2p/g2p.mdl words_to_transcribe.txt > transcribed_words.txt
+
+The cache is a file per model in --cache_dir (default: <model-dir>/g2p_cache), named by the SHA-256 of the
+model file, with a line '<word><TAB><pronunciation>' per word. Only words not in the cache are transcribed: they are
+split into --jobs shards, each transcribed by its own 'g2p.py --apply <shard> --model <model> --encoding=UTF-8'
+process. The new pronunciations are added to the cache and the pronunciations of all words of the word list are
+written, sorted like 'LC_ALL=C sort', in the format of g2p.py ('<word><TAB><pronunciation>'). Words g2p.py could
+not transcribe are listed on stderr and not cached.
+
+--g2p-cmd replaces g2p.py, e.g. by a stub taking the same arguments for testing.
+
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+ENCODING = 'utf-8'
+BLOCK_SIZE = 1024 * 1024
+
+
+def model_fingerprint(model):
+    digest = hashlib.sha256()
+    with open(model, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_words(filename):
+    # the words of a word list (first column), without repetitions, in their order
+    words = {}
+    with open(filename, encoding=ENCODING) as f:
+        for line in f:
+            fields = line.split(None, 1)
+            if fields:
+                words[fields[0]] = None
+    return list(words)
+
+
+def read_pronunciations(filename, pronunciations=None):
+    # '<word><TAB><pronunciation>' lines into a dict word -> list of pronunciations (g2p.py may give several)
+    pronunciations = {} if pronunciations is None else pronunciations
+    if not os.path.isfile(filename):
+        return pronunciations
+    with open(filename, encoding=ENCODING) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2 and fields[0]:
+                # with --variants g2p.py writes '<word> <variant> <posterior> <pronunciation>'
+                pronunciations.setdefault(fields[0], []).append(fields[-1].strip())
+    return pronunciations
+
+
+def write_pronunciations(out, pronunciations, words=None):
+    # '<word><TAB><pronunciation>' lines to the text file object 'out'
+    words = sorted(pronunciations) if words is None else sorted(word for word in words if word in pronunciations)
+    for word in words:
+        for pronunciation in pronunciations[word]:
+            out.write(word + '\t' + pronunciation + '\n')
+
+
+def open_output(filename):
+    # stdout is not reopened by name, that would truncate a file it is appended to
+    if filename == '-':
+        return open(sys.stdout.fileno(), 'w', encoding=ENCODING, closefd=False)
+    return open(filename, 'w', encoding=ENCODING)
+
+
+class PronunciationCache:
+
+    def __init__(self, cache_dir, fingerprint):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.filename = os.path.join(cache_dir, fingerprint + '.tsv')
+        self.pronunciations = read_pronunciations(self.filename)
+        self.added = 0
+
+    def __contains__(self, word):
+        return word in self.pronunciations
+
+    def update(self, pronunciations):
+        for word, prons in pronunciations.items():
+            if word not in self.pronunciations:
+                self.added += 1
+            self.pronunciations[word] = prons
+
+    def save(self):
+        # written to a temporary file first, so an interrupted run leaves the old cache
+        tmp_file = self.filename + '.tmp.' + str(os.getpid())
+        with open(tmp_file, 'w', encoding=ENCODING) as out:
+            write_pronunciations(out, self.pronunciations)
+        os.replace(tmp_file, self.filename)
+
+
+def transcribe_shard(g2p_cmd, model, shard, out_file):
+    """
+    Runs the G2P command on a shard of words.
+
+    :return: the pronunciations of the shard, a dict word -> list of pronunciations
+    """
+    cmd = shlex.split(g2p_cmd) + ['--apply', shard, '--model', model, '--encoding=UTF-8']
+    with open(out_file, 'w', encoding=ENCODING) as out:
+        subprocess.check_call(cmd, stdout=out)
+    return read_pronunciations(out_file)
+
+
+def transcribe(words, model, g2p_cmd='g2p.py', jobs=1, tmp_dir=None):
+    """
+    Transcribes 'words' in up to 'jobs' shards in parallel.
+
+    :return: a dict word -> list of pronunciations
+    """
+    pronunciations = {}
+    if not words:
+        return pronunciations
+    work_dir = tempfile.mkdtemp(prefix='g2p-', dir=tmp_dir)
+    try:
+        jobs = min(jobs, len(words))
+        shards = []
+        for ind in range(jobs):
+            shard = os.path.join(work_dir, 'words.' + str(ind))
+            with open(shard, 'w', encoding=ENCODING) as f:
+                f.write(''.join(word + '\n' for word in words[ind::jobs]))
+            shards.append(shard)
+        # the work is done by the G2P processes, threads only wait for them
+        with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+            futures = [pool.submit(transcribe_shard, g2p_cmd, model, shard, shard + '.out') for shard in shards]
+            for future in futures:
+                pronunciations.update(future.result())
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    return pronunciations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Transcribes a word list with a G2P model and a pronunciation cache',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('model', type=str, help='Sequitur G2P model')
+    parser.add_argument('words', type=str, help='Word list, one word per line')
+    parser.add_argument('-o', type=str, default='-', help='Output file, - for stdout')
+    parser.add_argument('--jobs', type=int, default=4, help='Number of G2P processes')
+    parser.add_argument('--cache_dir', type=str, help='Directory of the pronunciation caches. Default: model directory')
+    parser.add_argument('--g2p-cmd', dest='g2p_cmd', type=str, default='g2p.py', help='G2P command')
+    parser.add_argument('--tmp_dir', type=str, help='Directory for the word shards, default: system tmp')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.model)), 'g2p_cache')
+    cache = PronunciationCache(cache_dir, model_fingerprint(args.model))
+    words = read_words(args.words)
+    misses = [word for word in words if word not in cache]
+    print('{0}: {1} words, {2} in the cache, transcribing {3} with {4} jobs'.format(
+        sys.argv[0], len(words), len(words) - len(misses), len(misses), min(args.jobs, len(misses))), file=sys.stderr)
+
+    try:
+        cache.update(transcribe(misses, args.model, args.g2p_cmd, max(1, args.jobs), args.tmp_dir))
+    except subprocess.CalledProcessError as e:
+        print(sys.argv[0] + ': ' + str(e), file=sys.stderr)
+        return 1
+    if cache.added:
+        cache.save()
+    failed = [word for word in misses if word not in cache]
+    if failed:
+        print('{0}: {1} words not transcribed: {2}'.format(sys.argv[0], len(failed), ' '.join(failed[:20])),
+              file=sys.stderr)
+
+    with open_output(args.o) as out:
+        write_pronunciations(out, cache.pronunciations, words)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,9 +20,18 @@
 # [1] M. Bisani and H. Ney, “Joint-sequence models for
 #     grapheme-to-phoneme conversion,” Speech Commun., vol. 50, no. 5,
 #     pp. 434–451, May 2008.
+#
+# Pronunciations are cached per model (see local/g2p/g2p_cache.py), only words not transcribed before with the same
+# model are given to g2p.py, split into --jobs parallel g2p.py processes.
+
+jobs=4
+cache_dir=
+g2p_cmd=g2p.py
+
+. utils/parse_options.sh
 
 if [ $# -ne 2 ]; then
-	echo "Usage: $0 <model-dir> <input-word-list>" >&2
+	echo "Usage: $0 [--jobs 4] [--cache-dir <model-dir>/g2p_cache] [--g2p-cmd g2p.py] <model-dir> <input-word-list>" >&2
 	echo "Eg. $0 data/local/g2p words_to_transcribe.txt" >&2
 	exit 1
 fi
@@ -31,5 +40,5 @@ model_dir=$1
 wordlist=$2
 model=$model_dir/g2p.mdl
 
-# g2p.py writes the transcriptions to stdout
-g2p.py --apply $wordlist --model $model --encoding="UTF-8"
\ No newline at end of file
+# the transcriptions are written to stdout, sorted by word
+python3 local/g2p/g2p_cache.py --jobs $jobs --g2p-cmd "$g2p_cmd" ${cache_dir:+--cache_dir $cache_dir} $model $wordlist
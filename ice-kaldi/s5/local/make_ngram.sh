@@ -2,10 +2,18 @@
 # 
 # Uses the MIT Language Modeling Toolkit (MITLM) to compile an ngram ARPA from a text corpus and a dictionary
 #
-# Adjust the path to mitlm. To change the n-gram size (default: 3) change the value of -o
+# Adjust the path to mitlm. To change the n-gram size (default: 3) use --order
+#
+# With --count-workers N the n-grams are counted first by local/ngram_counts.py (N processes, at most
+# --count-memory MB, the rest in temporary files) and estimate-ngram reads the counts instead of the corpus,
+# for corpora whose counts don't fit into memory at once.
 
+order=3
+count_workers=0
+count_memory=4000
 
 . local/utils.sh
+. ./utils/parse_options.sh
 
 if [ $# -ne 3 ]; then
 	error "Usage: $0 <vocabulary-file> <corpus-file> <arpa-file>"
@@ -15,7 +23,14 @@ corpus=$1; shift
 arpa=$1; shift
 
 
-/opt/mitlm-0.4.1/bin/estimate-ngram -o 3 -v "$vocab" -t "$corpus" -wl "$arpa"
+if [ $count_workers -gt 0 ]; then
+	counts=$(dirname "$arpa")/counts.${order}gram.gz
+	local/ngram_counts.py --order $order --vocab "$vocab" --workers $count_workers --memory $count_memory \
+		--count_of_counts $(dirname "$arpa")/count_of_counts.${order}gram.txt "$corpus" "$counts"
+	/opt/mitlm-0.4.1/bin/estimate-ngram -o $order -v "$vocab" -counts "$counts" -wl "$arpa"
+else
+	/opt/mitlm-0.4.1/bin/estimate-ngram -o $order -v "$vocab" -t "$corpus" -wl "$arpa"
+fi
 
 
 exit 0 
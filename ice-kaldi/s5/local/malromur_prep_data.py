@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prepares speech data in the format of the Málrómur corpus for Kaldi (called by local/malromur_prep_data.sh):
+
+    local/malromur_prep_data.py /data/corpora/malromur/wav/ wav_info_train.txt data/training_data
+
+The info file is read line by line (tab-separated columns):
+
+    <wav-filename> <recording-info> <recording-info> <gender> <age> <prompt> <utterance-length> <codec>
+        <sample-rate> <channels> <codec-name>
+
+and the header of each audio file (RIFF/WAVE, Ogg Vorbis or FLAC) is read by a pool of threads, only the first
+bytes of the file and, for Ogg, the last page, for the sample rate, the number of channels and the duration.
+Utterances whose audio is missing, unreadable or empty, and repeated utterance ids, are left out; a sample rate or
+number of channels different from --samplerate and --channels, or from the info file, is reported (the audio is
+converted by sox in wav.scp) and with --strict the utterance is left out too.
+
+Output, sorted like 'LC_ALL=C sort': text, wav.scp, utt2spk, spk2utt, spk2gender, utt2dur in the data directory and
+a report of all problems, one per line '<utt-id> <problem>', in <data-dir>/prep_report.txt.
+
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import struct
+import sys
+
+ENCODING = 'utf-8'
+REPORT_FILE = 'prep_report.txt'
+HEADER_BYTES = 4096
+OGG_TAIL_BYTES = 65536              # the last Ogg page (with the final granule position) is within the tail
+PENDING_PER_THREAD = 64
+
+AudioInfo = collections.namedtuple('AudioInfo', 'format sample_rate channels duration')
+
+
+class AudioError(Exception):
+    pass
+
+
+def _wav_info(f, header, size):
+    # RIFF/WAVE: fmt chunk for the format, the size of the data chunk for the duration
+    pos = 12
+    sample_rate = channels = byte_rate = None
+    while pos + 8 <= len(header):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', header, pos)
+        if chunk_id == b'fmt ' and pos + 24 <= len(header):
+            _, channels, sample_rate, byte_rate = struct.unpack_from('<HHII', header, pos + 8)
+        elif chunk_id == b'data':
+            if sample_rate is None:
+                raise AudioError('data chunk before fmt chunk')
+            if not byte_rate:
+                raise AudioError('byte rate 0')
+            # streamed files may have a wrong (e.g. 0xFFFFFFFF) data size
+            data_size = min(chunk_size, size - pos - 8)
+            return AudioInfo('wav', sample_rate, channels, data_size / byte_rate)
+        pos += 8 + chunk_size + (chunk_size & 1)
+    raise AudioError('no data chunk in the first {0} bytes'.format(len(header)))
+
+
+def _ogg_info(f, header, size):
+    # Ogg Vorbis: identification header in the first page, duration from the granule position of the last page
+    start = header.find(b'\x01vorbis')
+    if start < 0 or start + 16 > len(header):
+        raise AudioError('Ogg without a Vorbis identification header')
+    channels, sample_rate = struct.unpack_from('<BI', header, start + 11)
+    if not sample_rate:
+        raise AudioError('sample rate 0')
+    f.seek(max(0, size - OGG_TAIL_BYTES))
+    granule = _ogg_last_granule(f.read())
+    if granule is None:
+        raise AudioError('no last Ogg page')
+    return AudioInfo('vorbis', sample_rate, channels, granule / sample_rate)
+
+
+def _ogg_page_end(data, pos):
+    """
+    :return: the end of the Ogg page starting at 'pos' in 'data', None if there is no valid page header there or the
+        page is not followed by another page or the end of the data
+    """
+    if pos + 27 > len(data) or data[pos + 4] != 0 or data[pos + 5] & ~0x07:
+        # version 0, header type flags: continued packet, first page, last page (EOS)
+        return None
+    segments = data[pos + 26]
+    if pos + 27 + segments > len(data):
+        return None
+    end = pos + 27 + segments + sum(data[pos + 27:pos + 27 + segments])
+    if end > len(data) or end < len(data) and data[end:end + 4] != b'OggS':
+        return None
+    return end
+
+
+def _ogg_last_granule(tail):
+    # granule position of the last page that ends a packet, 'OggS' may also occur in compressed packet data
+    pos = tail.rfind(b'OggS')
+    while pos >= 0:
+        if _ogg_page_end(tail, pos) is not None:
+            granule = struct.unpack_from('<q', tail, pos + 6)[0]
+            if granule >= 0:
+                return granule
+        pos = tail.rfind(b'OggS', 0, pos)
+    return None
+
+
+def _flac_info(f, header, size):
+    # FLAC: STREAMINFO is the first metadata block
+    if len(header) < 26:
+        raise AudioError('truncated FLAC header')
+    packed = int.from_bytes(header[18:26], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    samples = packed & 0xFFFFFFFFF
+    if not sample_rate:
+        raise AudioError('sample rate 0')
+    return AudioInfo('flac', sample_rate, channels, samples / sample_rate)
+
+
+def audio_info(filename):
+    """
+    Reads the sample rate, number of channels and duration (in seconds) from the header of an audio file.
+
+    :raise AudioError: for an unknown or broken format
+    :raise OSError: if the file can't be read
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER_BYTES)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            return _wav_info(f, header, size)
+        if header[:4] == b'OggS':
+            return _ogg_info(f, header, size)
+        if header[:4] == b'fLaC':
+            return _flac_info(f, header, size)
+    raise AudioError('unknown audio format')
+
+
+Utterance = collections.namedtuple('Utterance', 'utt_id speaker gender text filename info_rate info_channels')
+
+
+def read_info(info_file, keep_case=False):
+    """
+    :return: a generator of (Utterance, None) or (None, problem) for the lines of the info file
+    """
+    with open(info_file, encoding=ENCODING) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            fields = [field.strip() for field in line.split('\t')]
+            if len(fields) < 6:
+                yield None, 'line {0}: {1} columns instead of 11'.format(line_no, len(fields))
+                continue
+            filename = fields[0]
+            utt_id = os.path.splitext(filename)[0]
+            speaker = '-'.join(filename.split('-')[0:2])
+            gender = fields[3][:1] if fields[3][:1] not in ('', 'u') else 'm'
+            text = fields[5] if keep_case else fields[5].lower()
+            rate = int(fields[8]) if len(fields) > 8 and fields[8].isdigit() else None
+            channels = int(fields[9]) if len(fields) > 9 and fields[9].isdigit() else None
+            yield Utterance(utt_id, speaker, gender, text, filename, rate, channels), None
+
+
+def check_utterance(utterance, audio_dir, samplerate, channels):
+    """
+    :return: a tuple (AudioInfo or None, list of problems); no AudioInfo if the audio can't be used at all
+    """
+    path = os.path.join(audio_dir, utterance.filename)
+    try:
+        info = audio_info(path)
+    except (OSError, AudioError) as e:
+        return None, ['unreadable audio ' + path + ': ' + str(e)]
+    if info.duration <= 0:
+        return None, ['empty audio ' + path]
+    problems = []
+    if info.sample_rate != samplerate:
+        problems.append('sample rate {0}, expected {1}'.format(info.sample_rate, samplerate))
+    if info.channels != channels:
+        problems.append('{0} channels, expected {1}'.format(info.channels, channels))
+    if utterance.info_rate is not None and utterance.info_rate != info.sample_rate:
+        problems.append('sample rate {0} in the info file, {1} in the audio'.format(
+            utterance.info_rate, info.sample_rate))
+    if utterance.info_channels is not None and utterance.info_channels != info.channels:
+        problems.append('{0} channels in the info file, {1} in the audio'.format(
+            utterance.info_channels, info.channels))
+    return info, problems
+
+
+def checked(utterances, audio_dir, samplerate, channels, threads):
+    """
+    Checks the audio of 'utterances' in a thread pool, with a bounded number of pending files, so the info file
+    is streamed.
+
+    :return: a generator of (Utterance, AudioInfo or None, problems), in the order of 'utterances'
+    """
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        pending = collections.deque()
+        for utterance in utterances:
+            pending.append((utterance, pool.submit(check_utterance, utterance, audio_dir, samplerate, channels)))
+            if len(pending) >= threads * PENDING_PER_THREAD:
+                utterance, future = pending.popleft()
+                yield (utterance,) + future.result()
+        while pending:
+            utterance, future = pending.popleft()
+            yield (utterance,) + future.result()
+
+
+def write_sorted(filename, lines):
+    # Python sorts str by code point, the same order as 'LC_ALL=C sort' of the UTF-8 bytes
+    with open(filename, 'w', encoding=ENCODING) as f:
+        for line in sorted(lines):
+            f.write(line + '\n')
+
+
+def prepare(audio_dir, info_file, data_dir, samplerate=16000, channels=1, threads=16, strict=False,
+            keep_case=False):
+    """
+    Writes the Kaldi data files of the utterances in 'info_file' to 'data_dir'.
+
+    :return: a tuple (number of utterances written, number of problems reported)
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    wav_cmd = 'sox - -c1 -esigned -r{0} -twav - '.format(samplerate)
+    text, wav_scp, utt2spk, utt2dur = [], [], [], []
+    spk2utt = collections.defaultdict(list)
+    spk2gender = {}
+    seen = set()
+    problems = 0
+
+    def utterances():
+        nonlocal problems
+        for utterance, problem in read_info(info_file, keep_case):
+            if problem is not None:
+                report.write('- ' + problem + '\n')
+                problems += 1
+            elif utterance.utt_id in seen:
+                report.write(utterance.utt_id + ' repeated in the info file, only the first one is used\n')
+                problems += 1
+            else:
+                seen.add(utterance.utt_id)
+                yield utterance
+
+    with open(os.path.join(data_dir, REPORT_FILE), 'w', encoding=ENCODING) as report:
+        for utterance, info, utt_problems in checked(utterances(), audio_dir, samplerate, channels, threads):
+            for problem in utt_problems:
+                report.write(utterance.utt_id + ' ' + problem + '\n')
+            problems += len(utt_problems)
+            if info is None or (strict and utt_problems):
+                continue
+            if spk2gender.setdefault(utterance.speaker, utterance.gender) != utterance.gender:
+                report.write(utterance.utt_id + ' gender ' + utterance.gender + ', speaker ' + utterance.speaker +
+                             ' has ' + spk2gender[utterance.speaker] + '\n')
+                problems += 1
+            text.append(utterance.utt_id + ' ' + utterance.text)
+            wav_scp.append('{0} {1}< {2}/{3} | '.format(utterance.utt_id, wav_cmd, audio_dir.rstrip('/'),
+                                                        utterance.filename))
+            utt2spk.append(utterance.utt_id + ' ' + utterance.speaker)
+            utt2dur.append('{0} {1:.3f}'.format(utterance.utt_id, info.duration))
+            spk2utt[utterance.speaker].append(utterance.utt_id)
+
+    write_sorted(os.path.join(data_dir, 'text'), text)
+    write_sorted(os.path.join(data_dir, 'wav.scp'), wav_scp)
+    write_sorted(os.path.join(data_dir, 'utt2spk'), utt2spk)
+    write_sorted(os.path.join(data_dir, 'utt2dur'), utt2dur)
+    write_sorted(os.path.join(data_dir, 'spk2utt'),
+                 (speaker + ' ' + ' '.join(sorted(utts)) for speaker, utts in spk2utt.items()))
+    write_sorted(os.path.join(data_dir, 'spk2gender'),
+                 (speaker + ' ' + gender for speaker, gender in spk2gender.items() if speaker in spk2utt))
+    return len(text), problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Prepares Málrómur speech data for Kaldi',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('audio_dir', type=str, help='Directory of the audio files')
+    parser.add_argument('info_file', type=str, help='Info file (e.g. wav_info.txt)')
+    parser.add_argument('data_dir', type=str, help='Output Kaldi data directory')
+    parser.add_argument('--samplerate', type=int, default=16000, help='Expected sample rate')
+    parser.add_argument('--channels', type=int, default=1, help='Expected number of channels')
+    parser.add_argument('--threads', type=int, default=16, help='Number of threads reading audio headers')
+    parser.add_argument('--strict', action='store_true',
+                        help='Leave out utterances with a wrong sample rate or number of channels')
+    parser.add_argument('--keep_case', action='store_true', help="Don't lower case the prompts")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    written, problems = prepare(args.audio_dir, args.info_file, args.data_dir, args.samplerate, args.channels,
+                                args.threads, args.strict, args.keep_case)
+    print('{0}: {1} utterances written to {2}, {3} problems reported in {4}'.format(
+        sys.argv[0], written, args.data_dir, problems, os.path.join(args.data_dir, REPORT_FILE)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,18 +9,27 @@
 #
 # <wav-filename>	<recording-info>	<recording-info>	<gender>	<age>	<prompt (spoken text)>	<utterance-length>	vorbis	16000	1	Vorbis
 #
-# Note that the script converts all prompts to lowercase, change 'fields[5].lower()' if case should be kept.
+# Note that the script converts all prompts to lowercase, use --keep-case true if case should be kept.
+#
+# The data files are written by local/malromur_prep_data.py, which also reads the header of each audio file to check
+# the sample rate and number of channels and to write utt2dur. Utterances with missing or broken audio are left out
+# and all problems are listed in <out-data-dir>/prep_report.txt (with --strict true, utterances with a wrong sample
+# rate or number of channels are left out too).
 #
 # Input: a directory of audio files, an info file describing the audio files
-# Output: a directory containing all necessary files to start processing by Kaldi
+# Output: a directory containing all necessary files to start processing by Kaldi, with an index of the data files
+# for lookups by utterance or speaker id (see local/data_dir_index.py)
 #
 
 samplerate=16000
-tmp=$(mktemp -d)
-trap "rm -rf $tmp" EXIT
+threads=16
+strict=false
+keep_case=false
+
+. ./utils/parse_options.sh
 
 if [ $# -ne 3 ]; then
-    echo "Usage: $0 <path-to-malromur-audio> <info-file-training> <out-data-dir>" >&2
+    echo "Usage: $0 [--samplerate 16000] [--threads 16] [--strict true] [--keep-case true] <path-to-malromur-audio> <info-file-training> <out-data-dir>" >&2
     echo "Eg. $0 /data/corpora/malromur/wav/ wav_info_train.txt data/training_data" >&2
     exit 1;
 fi
@@ -29,29 +38,12 @@ malromur=$(readlink -f $1); shift
 info=$1; shift
 datadir=$1
 
-mkdir -p $datadir
-
-wav_cmd="sox - -c1 -esigned -r$samplerate -twav - "
-
-python -c "import sys
-text = open('$datadir/text', 'w')
-wavscp = open('$datadir/wav.scp', 'w')
-utt2spk = open('$datadir/utt2spk', 'w')
-spk2utt = open('$datadir/spk2utt', 'w')
-spk2gender = open('$datadir/spk2gender', 'w')
-
-for line in sys.stdin:
-    fields = [x.strip() for x in line.split('\t')]
-    utt_id = fields[0][:-4]
-    spkr = '-'.join(fields[0].split('-')[0:2])
-    gender = fields[3][0] if fields[3][0] != 'u' else 'm'
-    print >> text, utt_id, fields[5].lower()
-    print >> wavscp, '{} $wav_cmd < {}/{} | '.format(utt_id, '$malromur', fields[0])
-    print >> utt2spk, utt_id, spkr
-    print >> spk2gender, spkr, gender
-" < $info
+opts="--samplerate $samplerate --threads $threads"
+$strict && opts="$opts --strict"
+$keep_case && opts="$opts --keep_case"
+python3 local/malromur_prep_data.py $opts $malromur $info $datadir
 
-utils/utt2spk_to_spk2utt.pl < $datadir/utt2spk > $datadir/spk2utt
-utils/validate_data_dir.sh --no-feats $datadir || utils/fix_data_dir.sh $datadir
+python3 local/validate_data_dir.py --fix --no-feats $datadir
+python3 local/data_dir_index.py build $datadir
 
 exit 0
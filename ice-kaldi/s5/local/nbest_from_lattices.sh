@@ -1,5 +1,7 @@
 #!/bin/bash
 
+symtab=data/local/lang_wp2/words.txt
+
 . ./path.sh
 . ./utils/parse_options.sh
 
@@ -20,9 +22,10 @@ do
 	nbest-to-linear "ark:gunzip -c $out_dir/nbest.$i.gz|" "ark,t:$out_dir/archives.$i/ali" "ark,t:$out_dir/archives.$i/words"
 done
 
+local/symtab.py compile $symtab || exit 1
 for i in `seq 1 $num_lattices`;
 do
-	utils/int2sym.pl -f 2- data/local/lang_wp2/words.txt < $out_dir/archives.$i/words > $out_dir/archives.$i/words_text.txt
+	local/symtab.py int2sym -f 2- $symtab < $out_dir/archives.$i/words > $out_dir/archives.$i/words_text.txt
 done
 
 echo "$0: Finished creating n-best lists for lattices in $decode_dir"
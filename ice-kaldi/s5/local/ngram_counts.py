@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Counts the n-grams of a text corpus (one sentence per line, e.g. the ice-norm output) in bounded memory, for
+estimating a language model from counts instead of holding them all in the estimator:
+
+    local/ngram_counts.py --order 3 --vocab lm_vocab.txt --workers 8 --memory 4000 corpus.txt counts.gz
+    estimate-ngram -o 3 -v lm_vocab.txt -counts counts.gz -wl trigram.arpa.gz
+
+Each sentence is enclosed in <s> and </s>, with --vocab words not in the vocabulary are counted as <unk>. Words are
+mapped to integer ids and an n-gram is packed into one integer key (as many bits per word as the largest id needs),
+so the counts of a chunk are a dict of ints. Each worker counts a part of the corpus and writes its counts, sorted
+by key, to a temporary run file per order whenever they exceed its share of --memory. The runs of each order are
+then merged (k-way, in passes of at most MAX_OPEN_RUNS files), adding up the counts of equal keys.
+
+Output:
+
+    counts file: 'w1 w2 w3<TAB>count' per line, all orders, the count file format of MITLM (-counts) and SRILM
+        (ngram-count -read). Compressed if the name ends in '.gz'.
+    --count_of_counts file: '<order> <r> <n_r>' per line, the number of n-grams occurring exactly r times, for
+        r = 1 .. --max_r. The modified Kneser-Ney discounts computed from them are printed to stderr.
+
+"""
+
+import argparse
+import gzip
+import heapq
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+ENCODING = 'utf-8'
+BUFFER_SIZE = 1024 * 1024
+UNK, BOS, EOS = '<unk>', '<s>', '</s>'
+SPECIAL_SYMBOLS = {'<eps>', UNK, BOS, EOS, '!SIL'}
+BYTES_PER_ENTRY = 100               # approximate size of a dict entry with an int key and an int count
+COUNT_BYTES = 8
+MAX_OPEN_RUNS = 64
+RANGES_PER_WORKER = 4
+LINE_BATCH_SIZE = 200000            # lines per task if the input can't be split into byte ranges
+CHECK_EVERY = 1000                  # lines between checks of the memory budget
+
+
+def open_text(filename, mode='r'):
+    if filename == '-':
+        if mode == 'r':
+            return open(sys.stdin.fileno(), encoding=ENCODING, closefd=False)
+        return open(sys.stdout.fileno(), 'w', encoding=ENCODING, closefd=False)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', encoding=ENCODING)
+    return open(filename, mode, encoding=ENCODING, buffering=BUFFER_SIZE)
+
+
+def read_vocabulary(filename):
+    # words of a vocabulary file (first column, so also words.txt or a lexicon), without the special symbols
+    words = set()
+    with open_text(filename) as f:
+        for line in f:
+            fields = line.split(None, 1)
+            if fields and fields[0] not in SPECIAL_SYMBOLS and not fields[0].startswith('#'):
+                words.add(fields[0])
+    return words
+
+
+def corpus_vocabulary(filename):
+    # all words of the corpus, an extra pass over it if no vocabulary is given
+    words = set()
+    with open_text(filename) as f:
+        for line in f:
+            words.update(line.split())
+    return words - SPECIAL_SYMBOLS
+
+
+class Vocabulary:
+    """
+    Word <-> id mapping: <unk>, <s> and </s> first, then the words in sorted order, so sorting packed keys sorts
+    n-grams of the same order by their word ids.
+    """
+
+    def __init__(self, words):
+        self.words = [UNK, BOS, EOS] + sorted(words)
+        self.ids = {word: ind for ind, word in enumerate(self.words)}
+        self.bits = max(1, (len(self.words) - 1).bit_length())
+
+    def __len__(self):
+        return len(self.words)
+
+
+def key_bytes(order, bits):
+    # bytes of a packed key of 'order' words in a run file
+    return (order * bits + 7) // 8
+
+
+def key_words(key, order, bits, words):
+    # the words of a packed key, separated by spaces
+    mask = (1 << bits) - 1
+    ids = []
+    for _ in range(order):
+        ids.append(key & mask)
+        key >>= bits
+    return ' '.join(words[ind] for ind in reversed(ids))
+
+
+def count_line(line, ids, order, bits, counts):
+    """
+    Adds the n-grams (1 .. order) of a sentence to 'counts', a list of one dict key -> count per order.
+    """
+    # ids 0, 1, 2: <unk>, <s>, </s>
+    sentence = [1] + [ids.get(word, 0) for word in line.split()] + [2]
+    length = len(sentence)
+    for start in range(length):
+        key = 0
+        for n in range(min(order, length - start)):
+            key = (key << bits) | sentence[start + n]
+            table = counts[n]
+            table[key] = table.get(key, 0) + 1
+
+
+def write_run(filename, items, key_size):
+    # (key, count) as fixed size records, the key big-endian so the runs sort like the keys
+    with open(filename, 'wb', buffering=BUFFER_SIZE) as f:
+        for key, count in items:
+            f.write(key.to_bytes(key_size, 'big') + count.to_bytes(COUNT_BYTES, 'little'))
+
+
+def read_run(filename, key_size):
+    size = key_size + COUNT_BYTES
+    with open(filename, 'rb', buffering=BUFFER_SIZE) as f:
+        while True:
+            block = f.read(size * 4096)
+            if not block:
+                break
+            for pos in range(0, len(block), size):
+                yield (int.from_bytes(block[pos:pos + key_size], 'big'),
+                       int.from_bytes(block[pos + key_size:pos + size], 'little'))
+
+
+def sum_sorted(items):
+    # adds up the counts of equal keys in 'items' sorted by key
+    previous, total = None, 0
+    for key, count in items:
+        if key != previous:
+            if previous is not None:
+                yield previous, total
+            previous, total = key, 0
+        total += count
+    if previous is not None:
+        yield previous, total
+
+
+class ChunkCounter:
+    """
+    Counts the n-grams of the lines of one worker and writes them to sorted runs when they exceed 'max_bytes'.
+    """
+
+    def __init__(self, vocab_ids, bits, order, max_bytes, run_dir, prefix):
+        self.ids = vocab_ids
+        self.bits = bits
+        self.order = order
+        self.max_bytes = max_bytes
+        self.run_dir = run_dir
+        self.prefix = prefix
+        self.counts = [{} for _ in range(order)]
+        self.runs = [[] for _ in range(order)]
+        self.lines = 0
+
+    def add_lines(self, lines):
+        for line in lines:
+            count_line(line, self.ids, self.order, self.bits, self.counts)
+            self.lines += 1
+            if self.lines % CHECK_EVERY == 0 and \
+                    sum(len(table) for table in self.counts) * BYTES_PER_ENTRY > self.max_bytes:
+                self.spill()
+
+    def spill(self):
+        for n, table in enumerate(self.counts):
+            if table:
+                filename = os.path.join(self.run_dir, '{0}.{1}.{2}'.format(self.prefix, n + 1, len(self.runs[n])))
+                write_run(filename, sorted(table.items()), key_bytes(n + 1, self.bits))
+                self.runs[n].append(filename)
+        self.counts = [{} for _ in range(self.order)]
+
+    def finish(self):
+        # spills the remaining counts, returns the run files of each order and the number of lines
+        self.spill()
+        return self.runs, self.lines
+
+
+_config = None
+
+
+def init_worker(config):
+    # Pool initializer: (vocabulary ids, bits, order, memory per worker in bytes, run directory)
+    global _config
+    _config = config
+
+
+def count_range(task):
+    # Worker: counts the n-grams of a byte range of the corpus
+    filename, start, end, prefix = task
+    counter = ChunkCounter(*_config, prefix)
+    counter.add_lines(read_range(filename, start, end))
+    return counter.finish()
+
+
+def count_batch(task):
+    # Worker: counts the n-grams of a batch of lines
+    lines, prefix = task
+    counter = ChunkCounter(*_config, prefix)
+    counter.add_lines(lines)
+    return counter.finish()
+
+
+def byte_ranges(filename, number):
+    # splits 'filename' into at most 'number' consecutive (start, end) byte ranges ending after a newline
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        for ind in range(1, number):
+            pos = max(size * ind // number, boundaries[-1])
+            if pos >= size:
+                break
+            f.seek(pos)
+            f.readline()
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_range(filename, start, end):
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            piece = f.read(min(BUFFER_SIZE, end - pos))
+            if not piece.endswith(b'\n') and pos + len(piece) < end:
+                piece += f.readline()
+            pos += len(piece)
+            yield from io.StringIO(piece.decode(ENCODING), newline=None)
+
+
+def line_batches(filename, size):
+    with open_text(filename) as f:
+        batch = []
+        for line in f:
+            batch.append(line)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def merge_runs(runs, key_size, run_dir, prefix):
+    """
+    Merges 'runs' until at most MAX_OPEN_RUNS are left, deleting the merged ones.
+
+    :return: the remaining run files
+    """
+    passes = 0
+    while len(runs) > MAX_OPEN_RUNS:
+        merged = []
+        for ind in range(0, len(runs), MAX_OPEN_RUNS):
+            group = runs[ind:ind + MAX_OPEN_RUNS]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            filename = os.path.join(run_dir, '{0}.merge.{1}.{2}'.format(prefix, passes, ind))
+            write_run(filename, sum_sorted(heapq.merge(*[read_run(run, key_size) for run in group])), key_size)
+            for run in group:
+                os.remove(run)
+            merged.append(filename)
+        runs = merged
+        passes += 1
+    return runs
+
+
+def merge_order(task):
+    """
+    Worker: merges the runs of one order into a counts file in the output format.
+
+    :param task: a tuple (order, run files, words, bits, output file, max_r)
+    :return: a tuple (order, output file, number of distinct n-grams, total count, count of counts n_1 .. n_max_r)
+    """
+    order, runs, words, bits, out_file, max_r = task
+    key_size = key_bytes(order, bits)
+    runs = merge_runs(runs, key_size, os.path.dirname(out_file), 'order' + str(order))
+    distinct, total = 0, 0
+    count_of_counts = [0] * max_r
+    with open(out_file, 'w', encoding=ENCODING, buffering=BUFFER_SIZE) as out:
+        for key, count in sum_sorted(heapq.merge(*[read_run(run, key_size) for run in runs])):
+            out.write(key_words(key, order, bits, words) + '\t' + str(count) + '\n')
+            distinct += 1
+            total += count
+            if count <= max_r:
+                count_of_counts[count - 1] += 1
+    for run in runs:
+        os.remove(run)
+    return order, out_file, distinct, total, count_of_counts
+
+
+def kneser_ney_discounts(count_of_counts):
+    """
+    Modified Kneser-Ney discounts D1, D2, D3+ (Chen & Goodman) from the count of counts n_1 .. n_4.
+
+    :return: a list of three floats, or None if a count of counts needed is 0
+    """
+    if len(count_of_counts) < 4 or not all(count_of_counts[:4]):
+        return None
+    n1, n2, n3, n4 = count_of_counts[:4]
+    y = n1 / (n1 + 2 * n2)
+    return [1 - 2 * y * n2 / n1, 2 - 3 * y * n3 / n2, 3 - 4 * y * n4 / n3]
+
+
+def count_ngrams(corpus, out_file, order=3, vocab_file=None, workers=1, memory_mb=1000, tmp_dir=None, max_r=4):
+    """
+    Counts the n-grams of 'corpus' and writes them to 'out_file'.
+
+    :return: a list of (order, distinct n-grams, total count, count of counts) per order
+    """
+    words = read_vocabulary(vocab_file) if vocab_file else corpus_vocabulary(corpus)
+    vocab = Vocabulary(words)
+    print('{0}: {1} words in the vocabulary, {2} bits per word'.format(sys.argv[0], len(vocab), vocab.bits),
+          file=sys.stderr)
+    run_dir = tempfile.mkdtemp(prefix='ngram-counts-', dir=tmp_dir)
+    try:
+        config = (vocab.ids, vocab.bits, order, memory_mb * 1024 * 1024 // workers, run_dir)
+        runs = [[] for _ in range(order)]
+        lines = 0
+        splittable = corpus != '-' and not corpus.endswith('.gz')
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+            if splittable:
+                ranges = byte_ranges(corpus, workers * RANGES_PER_WORKER)
+                results = pool.imap_unordered(count_range, [(corpus, start, end, 'range' + str(ind))
+                                                            for ind, (start, end) in enumerate(ranges)])
+            else:
+                results = pool.imap_unordered(count_batch, ((batch, 'batch' + str(ind)) for ind, batch in
+                                                            enumerate(line_batches(corpus, LINE_BATCH_SIZE))))
+            for task_runs, task_lines in results:
+                for n in range(order):
+                    runs[n].extend(task_runs[n])
+                lines += task_lines
+            print('{0}: {1} sentences counted, {2} runs written'.format(
+                sys.argv[0], lines, sum(len(order_runs) for order_runs in runs)), file=sys.stderr)
+
+            # the orders are merged in parallel, each into its own file
+            tasks = [(n + 1, runs[n], vocab.words, vocab.bits, os.path.join(run_dir, 'counts.' + str(n + 1)), max_r)
+                     for n in range(order)]
+            merged = sorted(pool.imap_unordered(merge_order, tasks))
+
+        with open_text(out_file, 'w') as out:
+            for _, order_file, _, _, _ in merged:
+                with open(order_file, encoding=ENCODING, buffering=BUFFER_SIZE) as f:
+                    shutil.copyfileobj(f, out, BUFFER_SIZE)
+        return [(n, distinct, total, count_of_counts) for n, _, distinct, total, count_of_counts in merged]
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Counts the n-grams of a text corpus in bounded memory',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('corpus', type=str, help='Text corpus, one sentence per line (.gz or - for stdin)')
+    parser.add_argument('counts', type=str, help='Output counts file (.gz compressed or - for stdout)')
+    parser.add_argument('-o', '--order', type=int, default=3, help='Maximum n-gram order')
+    parser.add_argument('-v', '--vocab', type=str,
+                        help='Vocabulary (first column), other words are counted as <unk>. Default: all words of '
+                             'the corpus, read in an extra pass')
+    parser.add_argument('--workers', type=int, default=1, help='Number of counting processes')
+    parser.add_argument('--memory', type=int, default=1000,
+                        help='Memory in MB for the counts of all workers, more are kept in temporary files')
+    parser.add_argument('--tmp_dir', type=str, help='Directory for the temporary run files, default: system tmp')
+    parser.add_argument('--count_of_counts', type=str, help='Write the count of counts of each order to this file')
+    parser.add_argument('--max_r', type=int, default=4, help='Largest count r in --count_of_counts')
+
+    args = parser.parse_args()
+    if args.corpus == '-' and not args.vocab:
+        parser.error('--vocab is required when reading the corpus from stdin')
+    if args.order < 1 or args.max_r < 1 or args.workers < 1:
+        parser.error('--order, --max_r and --workers must be positive')
+    return args
+
+
+def main():
+    args = parse_args()
+    stats = count_ngrams(args.corpus, args.counts, args.order, args.vocab, args.workers, args.memory, args.tmp_dir,
+                         args.max_r)
+    for order, distinct, total, count_of_counts in stats:
+        discounts = kneser_ney_discounts(count_of_counts)
+        print('{0}: {1}-grams: {2} distinct, {3} total, n_1..n_{4}: {5}, KN discounts: {6}'.format(
+            sys.argv[0], order, distinct, total, args.max_r, ' '.join(map(str, count_of_counts)),
+            ' '.join('%.4f' % d for d in discounts) if discounts else '-'), file=sys.stderr)
+    if args.count_of_counts:
+        with open(args.count_of_counts, 'w', encoding=ENCODING) as f:
+            for order, _, _, count_of_counts in stats:
+                for r, n_r in enumerate(count_of_counts, 1):
+                    f.write('{0} {1} {2}\n'.format(order, r, n_r))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
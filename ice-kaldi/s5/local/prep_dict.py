@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Writes the Kaldi dictionary files of an aligned pronunciation dictionary ('<word><TAB><phone> <phone> ...' per
+line), reading it once (called by local/prep_dict_data.sh and local/create_extra_questions.sh):
+
+    local/prep_dict.py prepare <aligned-pronunciation-dictionary> data/local/dict
+    local/prep_dict.py questions data/local/dict
+
+'prepare' writes, with the same content as the former sort/cut/tr/join pipelines:
+
+    lexicon_orig.txt        the unique lines of the dictionary, sorted like 'LC_ALL=C sort -u'
+    lexicon_ext.txt,
+    lexicon.txt             lexicon_orig.txt and the OOV entry '<unk> oov'
+    nonsilence_phones.txt   the phones of the dictionary, sorted
+    silence_phones.txt      sil, oov
+    optional_silence.txt    sil
+    extra_questions.txt     a question '<phone> <phone>ː' for each phone whose long variant (ː) is a phone too
+
+'questions' writes only extra_questions.txt, from the nonsilence_phones.txt of a dictionary directory.
+
+The dictionary is read as bytes in one piece, so sorting its lines is the byte order of the C locale and the
+phones are collected from the whole file at once rather than line by line.
+
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+LONG = 'ː'.encode('utf-8')
+SILENCE_PHONES = [b'sil', b'oov']
+OPTIONAL_SILENCE = b'sil'
+OOV_ENTRY = b'<unk> oov'
+PRONUNCIATION_START = re.compile(rb'^[^\t\n]*\t', re.MULTILINE)
+
+
+def read_lexicon(filename):
+    """
+    :return: a tuple (sorted unique lines of the dictionary, set of its phones)
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data.endswith(b'\n'):
+        data = data[:-1]
+    lines = sorted(set(data.split(b'\n'))) if data else []
+    # the pronunciation is what follows the first tab, the whole line if there is none (like cut -f2-)
+    pronunciations = PRONUNCIATION_START.sub(b'', data)
+    phones = set(pronunciations.replace(b'\n', b' ').split(b' ')) if data else set()
+    return lines, phones
+
+
+def extra_questions(phones):
+    """
+    :return: the extra questions '<phone> <phone>ː' for the phones having a long variant, sorted by the long phone
+    """
+    short = set(phone for phone in phones if LONG not in phone)
+    questions = []
+    for phone in sorted(phones):
+        if phone.endswith(LONG) and phone[:-len(LONG)] in short:
+            questions.append(phone[:-len(LONG)] + b' ' + phone)
+    return questions
+
+
+def lines_text(lines):
+    return b'\n'.join(lines) + b'\n' if lines else b''
+
+
+def write_text(filename, text):
+    with open(filename, 'wb') as f:
+        f.write(text)
+
+
+def read_phones(filename):
+    with open(filename, 'rb') as f:
+        return set(line.rstrip(b'\n') for line in f)
+
+
+def prepare(prondict, dict_dir):
+    os.makedirs(dict_dir, exist_ok=True)
+    lexicon, phones = read_lexicon(prondict)
+    # the lexicon is serialized once for its three copies
+    text = lines_text(lexicon)
+    write_text(os.path.join(dict_dir, 'lexicon_orig.txt'), text)
+    text += OOV_ENTRY + b'\n'
+    write_text(os.path.join(dict_dir, 'lexicon_ext.txt'), text)
+    write_text(os.path.join(dict_dir, 'lexicon.txt'), text)
+    write_text(os.path.join(dict_dir, 'nonsilence_phones.txt'), lines_text(sorted(phones)))
+    write_text(os.path.join(dict_dir, 'silence_phones.txt'), lines_text(SILENCE_PHONES))
+    write_text(os.path.join(dict_dir, 'optional_silence.txt'), lines_text([OPTIONAL_SILENCE]))
+    write_text(os.path.join(dict_dir, 'extra_questions.txt'), lines_text(extra_questions(phones)))
+    return len(lexicon), len(phones)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Prepares the Kaldi dictionary files of a pronunciation dictionary',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    prepare_parser = subparsers.add_parser('prepare', help='Write all dictionary files')
+    prepare_parser.add_argument('prondict', type=str, help='Aligned pronunciation dictionary')
+    prepare_parser.add_argument('dict_dir', type=str, help='Output directory, e.g. data/local/dict')
+    questions_parser = subparsers.add_parser('questions', help='Write extra_questions.txt only')
+    questions_parser.add_argument('dict_dir', type=str, help='Directory with nonsilence_phones.txt')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command is None:
+        print('Usage: ' + sys.argv[0] + ' prepare|questions ...', file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    if args.command == 'prepare':
+        entries, phones = prepare(args.prondict, args.dict_dir)
+        print('{0}: {1} lexicon entries, {2} phones written to {3} in {4:.1f} sec'.format(
+            sys.argv[0], entries, phones, args.dict_dir, time.perf_counter() - start), file=sys.stderr)
+    else:
+        phones = read_phones(os.path.join(args.dict_dir, 'nonsilence_phones.txt'))
+        write_text(os.path.join(args.dict_dir, 'extra_questions.txt'), lines_text(extra_questions(phones)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,18 +17,9 @@ mkdir -p data/lang
 
 dictdir=data/local/dict
 
-# sort the pronunciation dictionary and copy into dictdir, add oov-label
-LC_ALL=C sort -u $prondict > $dictdir/lexicon_orig.txt
-cat $dictdir/lexicon_orig.txt <(echo "<unk> oov") > $dictdir/lexicon_ext.txt
-cp $dictdir/lexicon{_ext,}.txt
-
-# extract non silence phones and silence phones
-cut -f2- $dictdir/lexicon_orig.txt | tr ' ' '\n' | LC_ALL=C sort -u > $dictdir/nonsilence_phones.txt
-
-for w in sil oov; do echo $w; done > $dictdir/silence_phones.txt
-echo "sil" > $dictdir/optional_silence.txt
-
-./local/create_extra_questions.sh $dictdir
+# sort the pronunciation dictionary into dictdir, add oov-label, extract non silence and silence phones
+# and the extra questions for the long vowels, reading the dictionary once
+python3 local/prep_dict.py prepare $prondict $dictdir || exit 1
 
 ./local/prepare_lang.sh $dictdir "<unk>" data/lang data/lang
 
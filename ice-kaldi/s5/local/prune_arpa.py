@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prunes an ARPA language model, e.g. the trigram.arpa.gz of local/create_language_model.sh, to a smaller model for
+the first pass graph, without estimating it again:
+
+    local/prune_arpa.py --order 2 --threshold 1e-7 data/lang_lm/trigram.arpa.gz data/lang_bi_small/bigram.arpa.gz
+    local/arpa2G.sh data/lang_bi_small/bigram.arpa.gz data/lang_lm data/lang_bi_small
+
+The model is read line by line (also gzip compressed) into numpy arrays per order: word ids (int32), log10
+probabilities and backoff weights (float32). The n-grams of each order are sorted by a key combining the row of
+their context (the n-gram without its last word) in the order below and the id of the last word, so looking up
+n-grams, their contexts and backed-off probabilities are binary searches over whole arrays at once.
+
+Pruning, from the highest order down, never removes an n-gram that is the context of a kept n-gram:
+
+    --threshold: relative entropy pruning (Stolcke 1998, like SRILM ngram -prune). An n-gram is removed if
+        the perplexity of the model increases by less than the threshold (relative) without it, computed for
+        each n-gram against the original model.
+    --counts, --min_counts: count pruning with a counts file of local/ngram_counts.py ('w1 w2<TAB>count'),
+        n-grams of order n occurring less than the n-th --min_counts value (e.g. --min_counts 1,1,2) are removed.
+    --order: n-grams above this order are dropped.
+
+The backoff weights are then computed again so the probabilities of each context sum to one.
+
+"""
+
+import argparse
+import gzip
+import math
+import sys
+
+import numpy as np
+
+ENCODING = 'utf-8'
+BOS = '<s>'
+LN10 = math.log(10)
+
+
+def open_text(filename, mode='r'):
+    if filename == '-':
+        if mode == 'r':
+            return open(sys.stdin.fileno(), encoding=ENCODING, closefd=False)
+        return open(sys.stdout.fileno(), 'w', encoding=ENCODING, closefd=False)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', encoding=ENCODING)
+    return open(filename, mode, encoding=ENCODING)
+
+
+class ArpaModel:
+    """
+    Backoff n-gram model in arrays. For order n (index n - 1 of the lists):
+
+        ids[n - 1]      int32 (count, n), the word ids of the n-grams
+        logprob[n - 1]  float32, log10 p(w_n | w_1 .. w_n-1)
+        backoff[n - 1]  float32, log10 backoff weight of the n-gram as a context (0 for the highest order)
+        context[n - 1]  int64, row of w_1 .. w_n-1 in order n - 1 (for n > 1)
+        keys[n - 1]     int64, context row * vocabulary size + id of w_n, sorted
+
+    Unigram rows are the word ids.
+    """
+
+    def __init__(self, words, ids, logprob, backoff):
+        self.words = words
+        self.size = len(words)
+        self.ids = ids
+        self.logprob = logprob
+        self.backoff = backoff
+        self.order = len(ids)
+        self.context = [None]
+        self.keys = [np.arange(self.size, dtype=np.int64)]
+        for n in range(1, self.order):
+            self._sort_order(n)
+
+    def _sort_order(self, ind):
+        # computes the context rows and keys of order ind + 1, sorts its arrays by key
+        context = self.find(self.ids[ind][:, :-1])
+        if (context < 0).any():
+            missing = self.ids[ind][np.argmax(context < 0)]
+            raise ValueError('{0}-gram "{1}" without its context'.format(
+                ind + 1, ' '.join(self.words[word] for word in missing)))
+        keys = context * self.size + self.ids[ind][:, -1]
+        perm = np.argsort(keys, kind='stable')
+        self.ids[ind] = self.ids[ind][perm]
+        self.logprob[ind] = self.logprob[ind][perm]
+        self.backoff[ind] = self.backoff[ind][perm]
+        self.context.append(context[perm])
+        self.keys.append(keys[perm])
+
+    @classmethod
+    def read(cls, filename, max_order=None):
+        """
+        Reads an ARPA file, n-grams above 'max_order' are skipped.
+        """
+        counts = []
+        words, word_ids = [], {}
+        ids, logprob, backoff = [], [], []
+        order, row = 0, 0
+        with open_text(filename) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('\\'):
+                    if line.endswith('-grams:'):
+                        order = int(line[1:line.index('-')])
+                        row = 0
+                        if max_order and order > max_order:
+                            break
+                        ids.append(np.empty((counts[order - 1], order), dtype=np.int32))
+                        logprob.append(np.empty(counts[order - 1], dtype=np.float32))
+                        backoff.append(np.zeros(counts[order - 1], dtype=np.float32))
+                    elif line == '\\end\\':
+                        break
+                    continue
+                if order == 0:
+                    if line.startswith('ngram '):
+                        counts.append(int(line.split('=')[1]))
+                    continue
+                fields = line.split()
+                gram = fields[1:order + 1]
+                if order == 1:
+                    word_ids[gram[0]] = len(words)
+                    words.append(gram[0])
+                    ids[0][row, 0] = row
+                else:
+                    ids[order - 1][row] = [word_ids[word] for word in gram]
+                logprob[order - 1][row] = float(fields[0])
+                if len(fields) > order + 1:
+                    backoff[order - 1][row] = float(fields[order + 1])
+                row += 1
+        backoff[-1][:] = 0
+        return cls(words, ids, logprob, backoff)
+
+    def find(self, ids):
+        """
+        :param ids: int array (m, k) of word ids
+        :return: int64 array (m,), the rows of the n-grams in order k, -1 for n-grams not in the model
+        """
+        rows = ids[:, 0].astype(np.int64)
+        for col in range(1, ids.shape[1]):
+            keys = self.keys[col]
+            wanted = rows * self.size + ids[:, col]
+            pos = np.minimum(np.searchsorted(keys, wanted), max(len(keys) - 1, 0))
+            found = (rows >= 0) & (keys[pos] == wanted) if len(keys) else np.zeros(len(rows), dtype=bool)
+            rows = np.where(found, pos, -1)
+        return rows
+
+    def score(self, ids):
+        """
+        :param ids: int array (m, k) of word ids
+        :return: float64 array (m,), log10 p(w_k | w_1 .. w_k-1) of the model, backing off where needed
+        """
+        if ids.shape[1] == 1:
+            return self.logprob[0][ids[:, 0]].astype(np.float64)
+        rows = self.find(ids)
+        result = np.empty(len(ids))
+        found = rows >= 0
+        result[found] = self.logprob[ids.shape[1] - 1][rows[found]]
+        missing = ~found
+        if missing.any():
+            context = self.find(ids[missing, :-1])
+            weights = np.where(context >= 0, self.backoff[ids.shape[1] - 2][np.maximum(context, 0)], 0)
+            result[missing] = weights + self.score(ids[missing, 1:])
+        return result
+
+    def history_logprobs(self):
+        """
+        :return: per order, log10 of the probability of each n-gram as a sequence, p(w_1) p(w_2 | w_1) ..., with
+            p(<s>) = 1 for n-grams starting a sentence
+        """
+        unigram = self.logprob[0].astype(np.float64)
+        if BOS in self.words:
+            unigram[self.words.index(BOS)] = 0
+        joint = [unigram]
+        for ind in range(1, self.order):
+            joint.append(joint[-1][self.context[ind]] + self.logprob[ind])
+        return joint
+
+    def context_sums(self, ind, keep=None):
+        """
+        :return: for the contexts of order ind + 1 (in order ind), the probability mass of their (kept) n-grams and
+            of the same words given the shortened context, as arrays over the rows of order ind
+        """
+        keep = np.ones(len(self.context[ind]), dtype=bool) if keep is None else keep
+        context = self.context[ind][keep]
+        prob = 10.0 ** self.logprob[ind][keep].astype(np.float64)
+        lower = 10.0 ** self.score(self.ids[ind][keep, 1:])
+        size = len(self.logprob[ind - 1])
+        return np.bincount(context, prob, size), np.bincount(context, lower, size)
+
+    def subset(self, keep):
+        """
+        :param keep: a boolean array per order, the n-grams to keep (contexts of kept n-grams must be kept)
+        :return: a new ArpaModel with only the kept n-grams
+        """
+        ids = [self.ids[0]] + [self.ids[ind][keep[ind]] for ind in range(1, self.order)]
+        logprob = [self.logprob[0]] + [self.logprob[ind][keep[ind]] for ind in range(1, self.order)]
+        backoff = [self.backoff[0]] + [self.backoff[ind][keep[ind]] for ind in range(1, self.order)]
+        return ArpaModel(self.words, ids, logprob, backoff)
+
+    def renormalize(self):
+        # computes the backoff weights again, lowest order first as the higher ones back off to them
+        for ind in range(1, self.order):
+            mass, lower_mass = self.context_sums(ind)
+            has_ngrams = np.bincount(self.context[ind], minlength=len(mass)) > 0
+            valid = has_ngrams & (1 - mass > 0) & (1 - lower_mass > 0)
+            weights = np.zeros(len(mass))
+            weights[valid] = np.log10((1 - mass[valid]) / (1 - lower_mass[valid]))
+            # keep the old weight where rounding left no mass to distribute
+            weights[has_ngrams & ~valid] = self.backoff[ind - 1][has_ngrams & ~valid]
+            self.backoff[ind - 1] = weights.astype(np.float32)
+
+    def write(self, filename):
+        with open_text(filename, 'w') as out:
+            out.write('\n\\data\\\n')
+            for ind in range(self.order):
+                out.write('ngram {0}={1}\n'.format(ind + 1, len(self.logprob[ind])))
+            for ind in range(self.order):
+                out.write('\n\\{0}-grams:\n'.format(ind + 1))
+                with_backoff = ind < self.order - 1
+                for ids, logprob, backoff in zip(self.ids[ind].tolist(), self.logprob[ind].tolist(),
+                                                 self.backoff[ind].tolist()):
+                    line = '{0:.7g}\t{1}'.format(logprob, ' '.join(self.words[word] for word in ids))
+                    if with_backoff:
+                        line += '\t{0:.7g}'.format(backoff)
+                    out.write(line + '\n')
+            out.write('\n\\end\\\n')
+
+
+def entropy_deltas(model, ind, joint):
+    """
+    Relative entropy pruning (Stolcke 1998): the increase of the model's perplexity, relative, when each n-gram of
+    order ind + 1 alone is removed and its context's backoff weight is recomputed.
+
+    :param joint: the history_logprobs() of the model
+    """
+    context = model.context[ind]
+    logprob = model.logprob[ind].astype(np.float64)
+    lower = model.score(model.ids[ind][:, 1:])
+    mass, lower_mass = model.context_sums(ind)
+    # probability mass left to the backoff of the context, with and without the n-gram
+    left = (1 - mass)[context]
+    lower_left = (1 - lower_mass)[context]
+    old_backoff = model.backoff[ind - 1][context].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new_backoff = np.log10((left + 10.0 ** logprob) / (lower_left + 10.0 ** lower))
+    history = 10.0 ** joint[ind - 1][context]
+    delta = -history * (10.0 ** logprob * (lower + new_backoff - logprob) + left * (new_backoff - old_backoff)) * LN10
+    return np.expm1(np.nan_to_num(delta, nan=np.inf))
+
+
+def read_counts(model, filename):
+    """
+    :return: per order, the counts of the n-grams of the model in a counts file of local/ngram_counts.py, 0 for
+        n-grams not in the file
+    """
+    word_ids = {word: ind for ind, word in enumerate(model.words)}
+    counts = [np.zeros(len(logprob), dtype=np.int64) for logprob in model.logprob]
+    grams = [[] for _ in range(model.order)]
+    values = [[] for _ in range(model.order)]
+    with open_text(filename) as f:
+        for line in f:
+            gram, count = line.rstrip('\n').rsplit('\t', 1)
+            gram = gram.split()
+            if len(gram) <= model.order and all(word in word_ids for word in gram):
+                grams[len(gram) - 1].append([word_ids[word] for word in gram])
+                values[len(gram) - 1].append(int(count))
+    for ind in range(model.order):
+        if grams[ind]:
+            rows = model.find(np.array(grams[ind], dtype=np.int32))
+            found = rows >= 0
+            counts[ind][rows[found]] = np.array(values[ind], dtype=np.int64)[found]
+    return counts
+
+
+def prune(model, threshold=0.0, counts=None, min_counts=()):
+    """
+    :return: a boolean array per order, the n-grams to keep
+    """
+    keep = [np.ones(len(logprob), dtype=bool) for logprob in model.logprob]
+    joint = model.history_logprobs() if threshold > 0 else None
+    protected = None
+    for ind in range(model.order - 1, 0, -1):
+        if threshold > 0:
+            keep[ind] &= entropy_deltas(model, ind, joint) >= threshold
+        if counts is not None and ind < len(min_counts):
+            keep[ind] &= counts[ind] >= min_counts[ind]
+        if protected is not None:
+            keep[ind] |= protected
+        protected = np.zeros(len(model.logprob[ind - 1]), dtype=bool)
+        protected[model.context[ind][keep[ind]]] = True
+    return keep
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Prunes an ARPA language model',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('arpa', type=str, help='ARPA file (.gz compressed or - for stdin)')
+    parser.add_argument('pruned', type=str, help='Pruned ARPA file (.gz compressed or - for stdout)')
+    parser.add_argument('--order', type=int, help='Drop n-grams above this order. Default: keep all orders')
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help='Relative entropy pruning threshold (relative perplexity increase), 0 for none')
+    parser.add_argument('--counts', type=str, help='Counts file of local/ngram_counts.py for --min_counts')
+    parser.add_argument('--min_counts', type=str, default='1,1,2',
+                        help='Comma separated minimum counts of n-grams of order 1, 2, ..., the last value is used '
+                             'for higher orders')
+
+    args = parser.parse_args()
+    if args.order is not None and args.order < 1:
+        parser.error('--order must be positive')
+    try:
+        args.min_counts = [int(count) for count in args.min_counts.split(',')]
+    except ValueError:
+        parser.error('--min_counts must be comma separated integers, e.g. 1,1,2')
+    return args
+
+
+def main():
+    args = parse_args()
+    model = ArpaModel.read(args.arpa, args.order)
+    sizes = [len(logprob) for logprob in model.logprob]
+    counts = None
+    min_counts = args.min_counts + args.min_counts[-1:] * model.order
+    if args.counts:
+        counts = read_counts(model, args.counts)
+    keep = prune(model, args.threshold, counts, min_counts)
+    model = model.subset(keep)
+    model.renormalize()
+    model.write(args.pruned)
+    for ind, (size, logprob) in enumerate(zip(sizes, model.logprob)):
+        print('{0}: {1}-grams: {2} -> {3}'.format(sys.argv[0], ind + 1, size, len(logprob)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
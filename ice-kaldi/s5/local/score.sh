@@ -14,6 +14,8 @@ beam=6
 word_ins_penalty=0.0,0.5,1.0
 min_lmwt=9
 max_lmwt=20
+wer_filter=false        # filter references and hypotheses with local/wer_filter.py
+wer_filter_opts=        # options of local/wer_filter.py, e.g. "--unk keep"
 #end configuration section.
 
 echo "$0 $@"  # Print the command line for logging
@@ -29,6 +31,8 @@ if [ $# -ne 3 ]; then
   echo "    --min_lmwt <int>                # minumum LM-weight for lattice rescoring "
   echo "    --max_lmwt <int>                # maximum LM-weight for lattice rescoring "
   echo "    --reverse (true/false)          # score with time reversed features "
+  echo "    --wer_filter (true/false)       # filter ref and hyp with local/wer_filter.py (Icelandic normalization)"
+  echo "    --wer_filter_opts <opts>        # options of local/wer_filter.py "
   exit 1;
 fi
 
@@ -49,6 +53,11 @@ ref_filtering_cmd="cat"
 hyp_filtering_cmd="cat"
 [ -x local/wer_output_filter ] && hyp_filtering_cmd="local/wer_output_filter"
 [ -x local/wer_hyp_filter ] && hyp_filtering_cmd="local/wer_hyp_filter"
+if $wer_filter; then
+  # the hypotheses are filtered after decoding, all LM weights of a penalty in one process
+  ref_filtering_cmd="local/wer_filter.py $wer_filter_opts"
+  hyp_filtering_cmd="cat"
+fi
 
 
 if $decode_mbr ; then
@@ -63,6 +72,9 @@ cat $data/text | $ref_filtering_cmd > $dir/scoring_kaldi/test_filt.txt || exit 1
 
 if [ $stage -le 0 ]; then
 
+  # compiled once here, the scoring jobs below only map it
+  local/symtab.py compile $symtab || exit 1;
+
   for wip in $(echo $word_ins_penalty | sed 's/,/ /g'); do
     mkdir -p $dir/scoring_kaldi/penalty_$wip/log
 
@@ -74,7 +86,7 @@ if [ $stage -le 0 ]; then
         lattice-prune --beam=$beam ark:- ark:- \| \
         lattice-mbr-decode  --word-symbol-table=$symtab \
         ark:- ark,t:- \| \
-        utils/int2sym.pl -f 2- $symtab \| \
+        local/symtab.py int2sym -f 2- $symtab \| \
         $hyp_filtering_cmd '>' $dir/scoring_kaldi/penalty_$wip/LMWT.txt || exit 1;
 
     else
@@ -82,10 +94,15 @@ if [ $stage -le 0 ]; then
         lattice-scale --inv-acoustic-scale=LMWT "ark:gunzip -c $dir/lat.*.gz|" ark:- \| \
         lattice-add-penalty --word-ins-penalty=$wip ark:- ark:- \| \
         lattice-best-path --word-symbol-table=$symtab ark:- ark,t:- \| \
-        utils/int2sym.pl -f 2- $symtab \| \
+        local/symtab.py int2sym -f 2- $symtab \| \
         $hyp_filtering_cmd '>' $dir/scoring_kaldi/penalty_$wip/LMWT.txt || exit 1;
     fi
 
+    if $wer_filter; then
+      local/wer_filter.py $wer_filter_opts --in_place \
+        $(for lmwt in $(seq $min_lmwt $max_lmwt); do echo $dir/scoring_kaldi/penalty_$wip/$lmwt.txt; done) || exit 1;
+    fi
+
     if $reverse; then # rarely-used option, ignore this.
       for lmwt in `seq $min_lmwt $max_lmwt`; do
         mv $dir/scoring_kaldi/penalty_$wip/$lmwt.txt $dir/scoring_kaldi/penalty_$wip/$lmwt.txt.orig
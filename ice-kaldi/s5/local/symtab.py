@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Memory-mapped Kaldi symbol table (words.txt, '<word> <id>' per line), shared by the scoring scripts and the error
+analysis.
+
+The symbol table is compiled once into <dir>/.index/<words.txt>.symtab: a table of word offsets indexed by id, the ids
+sorted by word and the words themselves. Opening it maps the file instead of reading and hashing words.txt, an
+id -> word lookup is two array reads and a word -> id lookup a binary search (O(log n)). It is recompiled
+automatically when words.txt has changed (size or modification time). If the directory of words.txt is not writable
+the table is compiled in memory.
+
+Usage from the command line, 'int2sym' is a replacement for 'utils/int2sym.pl -f <fields> <symtab>':
+
+    local/symtab.py compile data/lang/words.txt
+    local/symtab.py int2sym -f 2- data/lang/words.txt < words.int > words.txt
+
+and from Python:
+
+    symbols = SymbolTable('data/lang/words.txt')
+    words = symbols.words([4, 17, 2])
+    ids = symbols.ids('hann telur að'.split())    # -1 for words not in the table
+
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+INDEX_DIR = '.index'
+
+MAGIC = b'SYMTAB01'
+HEADER = struct.Struct('<8sQQQQ')   # magic, size of words.txt, mtime of words.txt (ns), number of ids, number of words
+OFFSET = 'Q'                        # per id the offset of its word, an extra one marks the end of the last word
+WORD_ID = 'I'                       # ids sorted by their words
+
+NO_ID = -1
+
+
+def read_symbols(symtab_file):
+    """
+    :return: a dict id -> word (bytes) of a words.txt file
+    """
+    symbols = {}
+    with open(symtab_file, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) != 2 or not fields[1].isdigit():
+                raise ValueError('{0}:{1}: bad line {2!r}'.format(symtab_file, line_no, line))
+            symbols[int(fields[1])] = fields[0]
+    return symbols
+
+
+def compile_symbols(symtab_file):
+    """
+    :return: the compiled symbol table of 'symtab_file' as bytes
+    """
+    stat = os.stat(symtab_file)
+    symbols = read_symbols(symtab_file)
+    num_ids = max(symbols) + 1 if symbols else 0
+
+    # ids not in words.txt get an empty word
+    offsets = [0] * (num_ids + 1)
+    blob = []
+    offset = 0
+    for ind in range(num_ids):
+        offsets[ind] = offset
+        word = symbols.get(ind, b'')
+        blob.append(word)
+        offset += len(word)
+    offsets[num_ids] = offset
+
+    by_word = sorted(symbols, key=symbols.get)
+    return b''.join([HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns, num_ids, len(by_word)),
+                     struct.pack('<{0}{1}'.format(num_ids + 1, OFFSET), *offsets),
+                     struct.pack('<{0}{1}'.format(len(by_word), WORD_ID), *by_word)] + blob)
+
+
+def compiled_file(symtab_file):
+    directory, name = os.path.split(os.path.abspath(symtab_file))
+    return os.path.join(directory, INDEX_DIR, name + '.symtab')
+
+
+def is_current(symtab_file, index_file):
+    if not os.path.isfile(index_file):
+        return False
+    stat = os.stat(symtab_file)
+    with open(index_file, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return False
+    magic, size, mtime, _, _ = HEADER.unpack(header)
+    return magic == MAGIC and size == stat.st_size and mtime == stat.st_mtime_ns
+
+
+def compile_file(symtab_file):
+    """
+    Compiles 'symtab_file' if the compiled table is missing or out of date.
+
+    :return: the compiled file, or the compiled table as bytes if it can not be written
+    """
+    index_file = compiled_file(symtab_file)
+    if is_current(symtab_file, index_file):
+        return index_file
+    data = compile_symbols(symtab_file)
+    # the scoring jobs may compile concurrently, each writes its own temporary file
+    tmp_file = index_file + '.tmp.' + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        with open(tmp_file, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_file, index_file)
+    except OSError:
+        return data
+    return index_file
+
+
+class SymbolTable:
+    """
+    Kaldi symbol table. symbols[id] and symbols.word(id) give the word of an id (str), symbols.id(word) the id of a word
+    and 'word in symbols' tests for a word. words() and ids() convert whole sequences.
+    """
+
+    def __init__(self, symtab_file):
+        self.symtab_file = symtab_file
+        compiled = compile_file(symtab_file)
+        self._fd = None
+        if isinstance(compiled, bytes):
+            self._map = compiled
+        else:
+            self._fd = open(compiled, 'rb')
+            self._map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._map)
+        _, _, _, self.num_ids, self.num_words = HEADER.unpack_from(self.data, 0)
+
+        start = HEADER.size
+        end = start + (self.num_ids + 1) * struct.calcsize(OFFSET)
+        self.offsets = self.data[start:end].cast(OFFSET)
+        start, end = end, end + self.num_words * struct.calcsize(WORD_ID)
+        self.by_word = self.data[start:end].cast(WORD_ID)
+        self.blob = self.data[end:]
+
+    def __len__(self):
+        return self.num_words
+
+    def word_bytes(self, word_id):
+        """
+        :return: the word of 'word_id' as bytes, b'' if the id is not in the table
+        """
+        if not 0 <= word_id < self.num_ids:
+            return b''
+        return bytes(self.blob[self.offsets[word_id]:self.offsets[word_id + 1]])
+
+    def word(self, word_id):
+        word = self.word_bytes(word_id)
+        if not word:
+            raise KeyError(word_id)
+        return word.decode('utf-8')
+
+    __getitem__ = word
+
+    def id(self, word, default=NO_ID):
+        """
+        :return: the id of 'word' (str or bytes), 'default' if it is not in the table
+        """
+        word = word.encode('utf-8') if isinstance(word, str) else word
+        low, high = 0, self.num_words
+        while low < high:
+            mid = (low + high) // 2
+            if self.word_bytes(self.by_word[mid]) < word:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.num_words and self.word_bytes(self.by_word[low]) == word:
+            return self.by_word[low]
+        return default
+
+    def __contains__(self, word):
+        return self.id(word) != NO_ID
+
+    def words(self, word_ids):
+        return [self.word(word_id) for word_id in word_ids]
+
+    def ids(self, words):
+        # words not in the table get NO_ID, which is never the id of a hypothesis word
+        return tuple(self.id(word) for word in words)
+
+    def close(self):
+        for view in (self.offsets, self.by_word, self.blob, self.data):
+            view.release()
+        if self._fd is not None:
+            self._map.close()
+            self._fd.close()
+
+
+def parse_fields(spec):
+    """
+    Field specification of int2sym.pl: 'N', 'N-M', 'N-' or '-M', fields numbered from 1.
+
+    :return: a tuple (start, end) of list indices, end is None for the last field
+    """
+    if spec.isdigit():
+        return int(spec) - 1, int(spec)
+    start, sep, end = spec.partition('-')
+    if not sep or not all(part.isdigit() for part in (start, end) if part):
+        raise ValueError('bad field specification: ' + spec)
+    return (int(start) - 1 if start else 0), (int(end) if end else None)
+
+
+def int2sym(symbols, fields, lines, out):
+    """
+    Replaces the ids in 'fields' of each line of 'lines' (bytes) by their words, like utils/int2sym.pl.
+    """
+    start, end = fields
+    cache = {}
+    for line in lines:
+        tokens = line.split()
+        for pos in range(start, len(tokens) if end is None else min(end, len(tokens))):
+            token = tokens[pos]
+            word = cache.get(token)
+            if word is None:
+                word = symbols.word_bytes(int(token)) if token.isdigit() else b''
+                if not word:
+                    raise KeyError('undefined symbol {0} (in position {1})'.format(token.decode('utf-8'), pos + 1))
+                cache[token] = word
+            tokens[pos] = word
+        out.write(b' '.join(tokens) + b'\n')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compiles and applies memory-mapped Kaldi symbol tables',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    compile_parser = subparsers.add_parser('compile', help='Compile a symbol table if it is not up to date')
+    compile_parser.add_argument('symtab', type=str, help='Symbol table, e.g. data/lang/words.txt')
+    int2sym_parser = subparsers.add_parser('int2sym', help='Convert ids to words, from stdin (or files) to stdout')
+    int2sym_parser.add_argument('-f', type=str, default='1-', help='Fields to convert, e.g. 2- (int2sym.pl syntax)')
+    int2sym_parser.add_argument('symtab', type=str, help='Symbol table, e.g. data/lang/words.txt')
+    int2sym_parser.add_argument('input', type=str, nargs='*', help='Input files, default: stdin')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command is None:
+        print('Usage: ' + sys.argv[0] + ' compile|int2sym ...', file=sys.stderr)
+        return 1
+
+    if args.command == 'compile':
+        compiled = compile_file(args.symtab)
+        if isinstance(compiled, bytes):
+            # not an error, int2sym then compiles the table in memory
+            print(sys.argv[0] + ': warning: could not write the compiled table of ' + args.symtab +
+                  ', it is compiled in memory by each job', file=sys.stderr)
+        return 0
+
+    try:
+        fields = parse_fields(args.f)
+    except ValueError as e:
+        print(sys.argv[0] + ': ' + str(e), file=sys.stderr)
+        return 1
+    symbols = SymbolTable(args.symtab)
+    try:
+        for filename in args.input or ['-']:
+            if filename == '-':
+                int2sym(symbols, fields, sys.stdin.buffer, sys.stdout.buffer)
+            else:
+                with open(filename, 'rb') as f:
+                    int2sym(symbols, fields, f, sys.stdout.buffer)
+    except KeyError as e:
+        print(sys.argv[0] + ': ' + e.args[0], file=sys.stderr)
+        return 1
+    finally:
+        symbols.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Checks a Kaldi data directory, and with --fix repairs it, in one pass over each file, instead of
+'utils/validate_data_dir.sh || utils/fix_data_dir.sh':
+
+    local/validate_data_dir.py --no-feats data/training_data
+    local/validate_data_dir.py --fix --no-feats data/training_data
+
+Each data file is read once to check that it is sorted by key (like 'LC_ALL=C sort -k1,1') without repeated keys;
+only files that are not are sorted, in memory runs of at most --memory MB merged from temporary files, keeping the
+first line of a repeated key. The files keyed by utterance (utt2spk, text, segments, feats.scp, utt2dur and wav.scp
+if there are no segments) are then read side by side in key order (a merge join), so the utterances missing in one
+of them are found without holding any file in memory. Only the sets of recording and speaker ids are kept.
+
+The utterances kept are those fix_data_dir.sh keeps:
+
+    * present in utt2spk, text, feats.scp and segments (or wav.scp), as far as these files exist
+    * with a valid segment of a recording in wav.scp
+    * of a speaker present in spk2gender and cmvn.scp, as far as these files exist
+
+wav.scp (with segments), reco2file_and_channel and reco2dur are filtered to the recordings of the kept segments,
+spk2gender and cmvn.scp to the speakers of the kept utterances, and spk2utt is generated from utt2spk. With --fix
+the original files are moved to <data-dir>/.backup/ first.
+
+A summary of all problems is printed to stderr. Exits with 1 if the data directory is not valid (after --fix: if
+problems remain that filtering can't repair, e.g. utt2spk not sorted by speaker when sorted by utterance).
+
+"""
+
+import argparse
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+
+UTT_FILES = ['utt2spk', 'text', 'segments', 'feats.scp', 'wav.scp', 'utt2dur']
+RECO_FILES = ['wav.scp', 'reco2file_and_channel', 'reco2dur']
+SPK_FILES = ['spk2gender', 'cmvn.scp']
+BACKUP_DIR = '.backup'
+MAX_EXAMPLES = 3
+MAX_OPEN_RUNS = 64
+
+
+def line_key(line):
+    # the first whitespace separated field of a line (bytes)
+    fields = line.split(None, 1)
+    return fields[0] if fields else b''
+
+
+def read_lines(filename):
+    with open(filename, 'rb') as f:
+        for line in f:
+            yield line.rstrip(b'\n')
+
+
+class Diagnostics:
+    """
+    Problems found in a data directory, counted by kind, with the first examples of each.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.examples = {}
+        self.unfixable = set()
+
+    def add(self, problem, example='', fixable=True):
+        self.counts[problem] = self.counts.get(problem, 0) + 1
+        examples = self.examples.setdefault(problem, [])
+        if example and len(examples) < MAX_EXAMPLES:
+            examples.append(example)
+        if not fixable:
+            self.unfixable.add(problem)
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def report(self):
+        lines = []
+        for problem, count in self.counts.items():
+            line = '{0}: {1}'.format(problem, count)
+            if self.examples[problem]:
+                line += ' (e.g. ' + ', '.join(self.examples[problem]) + ')'
+            if problem in self.unfixable:
+                line += ' [not fixable]'
+            lines.append(line)
+        return lines
+
+
+def _write_lines(filename, lines):
+    with open(filename, 'wb') as f:
+        for line in lines:
+            f.write(line + b'\n')
+
+
+def external_sort(lines, out_file, memory_mb, key=line_key):
+    """
+    Sorts 'lines' by 'key' into 'out_file' in runs of at most 'memory_mb' MB, equal keys in their original order.
+    """
+    max_bytes = memory_mb * 1024 * 1024
+    runs, chunk, size = [], [], 0
+
+    def spill():
+        chunk.sort(key=key)
+        filename = '{0}.run{1}'.format(out_file, len(runs))
+        _write_lines(filename, chunk)
+        runs.append(filename)
+
+    for line in lines:
+        chunk.append(line)
+        size += len(line) + 64
+        if size > max_bytes:
+            spill()
+            chunk, size = [], 0
+    chunk.sort(key=key)
+    if not runs:
+        _write_lines(out_file, chunk)
+        return
+    runs.append(chunk)
+    # heapq.merge is stable: of equal keys, those of earlier runs (earlier lines) come first
+    merges = 0
+    while len(runs) > MAX_OPEN_RUNS:
+        merges += 1
+        merged = '{0}.merge{1}'.format(out_file, merges)
+        _write_lines(merged, heapq.merge(*[read_lines(run) for run in runs[:MAX_OPEN_RUNS]], key=key))
+        for run in runs[:MAX_OPEN_RUNS]:
+            os.remove(run)
+        runs = [merged] + runs[MAX_OPEN_RUNS:]
+    _write_lines(out_file, heapq.merge(*[read_lines(run) if isinstance(run, str) else run for run in runs],
+                                       key=key))
+    for run in runs:
+        if isinstance(run, str):
+            os.remove(run)
+
+
+def sorted_file(data_dir, name, tmp_dir, memory_mb, diagnostics):
+    """
+    Checks that a data file is sorted by key, without repeated keys and empty lines; sorts it otherwise.
+
+    :return: the name of the sorted file (the data file itself if it is sorted), None if the file is empty
+    """
+    filename = os.path.join(data_dir, name)
+    in_order = True
+    previous = None
+    lines = 0
+    for line in read_lines(filename):
+        lines += 1
+        key = line_key(line)
+        if not key:
+            diagnostics.add(name + ': empty line', 'line ' + str(lines))
+            in_order = False
+        elif previous is not None and key <= previous:
+            # repeated keys are reported when they are removed
+            if key < previous and in_order:
+                diagnostics.add(name + ': not sorted', 'line ' + str(lines))
+            in_order = False
+        previous = key if key else previous
+    if lines == 0:
+        diagnostics.add(name + ': empty file', fixable=False)
+        return None
+    if in_order:
+        return filename
+
+    sorted_name = os.path.join(tmp_dir, name + '.sorted')
+    tmp_sorted = sorted_name + '.all'
+    external_sort((line for line in read_lines(filename) if line_key(line)), tmp_sorted, memory_mb)
+    previous = None
+    with open(sorted_name, 'wb') as out:
+        for line in read_lines(tmp_sorted):
+            key = line_key(line)
+            if key != previous:
+                out.write(line + b'\n')
+            else:
+                diagnostics.add(name + ': repeated key, the first line is kept', key.decode('utf-8', 'replace'))
+            previous = key
+    os.remove(tmp_sorted)
+    return sorted_name
+
+
+def keyed(filename, tag=None):
+    # (key, line) of a sorted file, with a tag (key, tag, line) for merging several files
+    for line in read_lines(filename):
+        yield (line_key(line), line) if tag is None else (line_key(line), tag, line)
+
+
+def merge_join(files):
+    """
+    :param files: a dict name -> sorted file
+    :return: a generator of (key, dict name -> line) over all keys of the files, in sorted order
+    """
+    names = list(files)
+    streams = [keyed(files[name], ind) for ind, name in enumerate(names)]
+    current, lines = None, {}
+    for key, ind, line in heapq.merge(*streams):
+        if key != current:
+            if current is not None:
+                yield current, lines
+            current, lines = key, {}
+        lines[names[ind]] = line
+    if current is not None:
+        yield current, lines
+
+
+def valid_segment(line, recordings):
+    # '<utt-id> <recording-id> <start> <end>'
+    fields = line.split()
+    if len(fields) != 4:
+        return 'segments: not 4 fields'
+    try:
+        start, end = float(fields[2]), float(fields[3])
+    except ValueError:
+        return 'segments: start or end not a number'
+    if not 0 <= start < end:
+        return 'segments: start not before end'
+    if recordings is not None and fields[1] not in recordings:
+        return 'segments: recording not in wav.scp'
+    return None
+
+
+class DataDirChecker:
+
+    def __init__(self, data_dir, tmp_dir, memory_mb=1000, no_feats=False, no_text=False, no_wav=False):
+        self.data_dir = data_dir
+        self.tmp_dir = tmp_dir
+        self.memory_mb = memory_mb
+        self.required = ['utt2spk'] + ([] if no_text else ['text']) + ([] if no_feats else ['feats.scp'])
+        self.no_wav = no_wav
+        self.diagnostics = Diagnostics()
+        self.sorted = {}
+        self.outputs = {}
+        self.utterances = 0
+        self.kept = 0
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.data_dir, name))
+
+    def sort(self, name):
+        if name not in self.sorted:
+            self.sorted[name] = sorted_file(self.data_dir, name, self.tmp_dir, self.memory_mb, self.diagnostics)
+        return self.sorted[name]
+
+    def output(self, name):
+        # the fixed file, written to the temporary directory
+        self.outputs[name] = os.path.join(self.tmp_dir, name + '.fixed')
+        return open(self.outputs[name], 'wb')
+
+    def keys(self, name):
+        # the set of keys of a data file, for recordings and speakers
+        if not self.exists(name) or self.sort(name) is None:
+            return None
+        return set(line_key(line) for line in read_lines(self.sort(name)))
+
+    def check(self):
+        """
+        Runs all checks and writes the fixed files to the temporary directory.
+
+        :return: the Diagnostics
+        """
+        for name in self.required:
+            if not self.exists(name):
+                self.diagnostics.add(name + ': missing', fixable=False)
+        segmented = self.exists('segments')
+        if not self.no_wav and not self.exists('wav.scp'):
+            self.diagnostics.add('wav.scp: missing', fixable=False)
+        if not self.exists('utt2spk'):
+            return self.diagnostics
+
+        recordings = self.keys('wav.scp') if segmented else None
+        speakers = None
+        for name in SPK_FILES:
+            keys = self.keys(name)
+            if keys is not None:
+                speakers = keys if speakers is None else speakers & keys
+        used_recordings = self.check_utterances(segmented, recordings, speakers)
+        if segmented:
+            self.filter_recordings(used_recordings)
+        self.check_speakers()
+        return self.diagnostics
+
+    def check_utterances(self, segmented, recordings, speakers):
+        """
+        Merge join of the files keyed by utterance, writes the lines of the kept utterances and the kept
+        utt2spk swapped to '<speaker> <utterance>' for spk2utt.
+
+        :return: the set of recordings of the kept segments
+        """
+        names = [name for name in UTT_FILES if self.exists(name) and not (name == 'wav.scp' and segmented)]
+        files = {name: self.sort(name) for name in names}
+        files = {name: filename for name, filename in files.items() if filename is not None}
+        # all of these are needed for an utterance, utt2dur is only filtered
+        needed = [name for name in files if name != 'utt2dur']
+        outputs = {name: self.output(name) for name in files}
+        used_recordings = set()
+        spk_utt_file = os.path.join(self.tmp_dir, 'spk_utt')
+        try:
+            with open(spk_utt_file, 'wb') as spk_utt:
+                for key, lines in merge_join(files):
+                    self.utterances += 1
+                    utt = key.decode('utf-8', 'replace')
+                    problem = None
+                    missing = [name for name in needed if name not in lines]
+                    if missing:
+                        problem = 'utterance not in ' + missing[0]
+                    elif len(lines['utt2spk'].split()) != 2:
+                        problem = 'utt2spk: not 2 fields'
+                    elif speakers is not None and lines['utt2spk'].split()[1] not in speakers:
+                        problem = 'speaker not in ' + ' and '.join(name for name in SPK_FILES if self.exists(name))
+                    elif 'segments' in lines:
+                        problem = valid_segment(lines['segments'], recordings)
+                    if problem is None and 'text' in lines:
+                        try:
+                            lines['text'].decode('utf-8')
+                        except UnicodeDecodeError:
+                            problem = 'text: not UTF-8'
+                    if problem is not None:
+                        self.diagnostics.add(problem, utt)
+                        continue
+                    if 'utt2dur' in files and 'utt2dur' not in lines:
+                        self.diagnostics.add('utterance not in utt2dur (utils/data/get_utt2dur.sh)', utt,
+                                             fixable=False)
+                    self.kept += 1
+                    for name, line in lines.items():
+                        outputs[name].write(line + b'\n')
+                    speaker = lines['utt2spk'].split()[1]
+                    spk_utt.write(speaker + b' ' + key + b'\n')
+                    if 'segments' in lines:
+                        used_recordings.add(lines['segments'].split()[1])
+        finally:
+            for out in outputs.values():
+                out.close()
+        if self.kept == 0:
+            self.diagnostics.add('no utterances left', fixable=False)
+        return used_recordings
+
+    def filter_recordings(self, used_recordings):
+        for name in RECO_FILES:
+            if not self.exists(name) or self.sort(name) is None:
+                continue
+            with self.output(name) as out:
+                for key, line in keyed(self.sort(name)):
+                    if key in used_recordings:
+                        out.write(line + b'\n')
+                    else:
+                        self.diagnostics.add(name + ': recording without segments', key.decode('utf-8', 'replace'))
+
+    def check_speakers(self):
+        """
+        Generates spk2utt from the kept utterances (sorted by speaker) and compares it with the existing one, filters
+        the files keyed by speaker.
+        """
+        spk_utt_file = os.path.join(self.tmp_dir, 'spk_utt')
+        by_speaker = os.path.join(self.tmp_dir, 'spk_utt.sorted')
+        external_sort(read_lines(spk_utt_file), by_speaker, self.memory_mb, key=lambda line: line.split())
+        speakers = set()
+        previous_utt = None
+        compare = self.exists('spk2utt') and self.sort('spk2utt') is not None
+        if not self.exists('spk2utt'):
+            self.diagnostics.add('spk2utt: missing')
+        existing = keyed(self.sort('spk2utt')) if compare else iter(())
+        existing_line = next(existing, None)
+        with self.output('spk2utt') as out:
+            for speaker, utts in self._speaker_groups(by_speaker):
+                for utt in utts:
+                    if previous_utt is not None and utt < previous_utt:
+                        self.diagnostics.add('utt2spk not sorted by speaker when sorted by utterance (make the '
+                                             'speaker id a prefix of the utterance id)', utt.decode('utf-8'),
+                                             fixable=False)
+                    previous_utt = utt
+                line = speaker + b' ' + b' '.join(utts)
+                while existing_line is not None and existing_line[0] < speaker:
+                    self.diagnostics.add('spk2utt differs from utt2spk', existing_line[0].decode('utf-8', 'replace'))
+                    existing_line = next(existing, None)
+                if compare and (existing_line is None or existing_line[1].split() != line.split()):
+                    self.diagnostics.add('spk2utt differs from utt2spk', speaker.decode('utf-8', 'replace'))
+                if existing_line is not None and existing_line[0] == speaker:
+                    existing_line = next(existing, None)
+                out.write(line + b'\n')
+                speakers.add(speaker)
+        for key, _ in ([existing_line] if existing_line else []) + list(existing):
+            self.diagnostics.add('spk2utt differs from utt2spk', key.decode('utf-8', 'replace'))
+        os.remove(by_speaker)
+        for name in SPK_FILES:
+            if not self.exists(name) or self.sort(name) is None:
+                continue
+            with self.output(name) as out:
+                for key, line in keyed(self.sort(name)):
+                    if key in speakers:
+                        out.write(line + b'\n')
+                    else:
+                        self.diagnostics.add(name + ': speaker without utterances', key.decode('utf-8', 'replace'))
+
+    @staticmethod
+    def _speaker_groups(filename):
+        current, utts = None, []
+        for line in read_lines(filename):
+            speaker, utt = line.split()
+            if speaker != current:
+                if current is not None:
+                    yield current, utts
+                current, utts = speaker, []
+            utts.append(utt)
+        if current is not None:
+            yield current, utts
+
+    def apply(self):
+        # moves the checked files to .backup and the fixed ones into place
+        backup_dir = os.path.join(self.data_dir, BACKUP_DIR)
+        os.makedirs(backup_dir, exist_ok=True)
+        for name, fixed in self.outputs.items():
+            target = os.path.join(self.data_dir, name)
+            if os.path.exists(target):
+                shutil.copy2(target, os.path.join(backup_dir, name))
+            shutil.move(fixed, target)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Checks and fixes a Kaldi data directory in one pass',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('data_dir', type=str, help='Kaldi data directory')
+    parser.add_argument('--fix', action='store_true',
+                        help='Filter and sort the data files like utils/fix_data_dir.sh, originals in .backup/')
+    parser.add_argument('--no-feats', dest='no_feats', action='store_true', help='feats.scp is not required')
+    parser.add_argument('--no-text', dest='no_text', action='store_true', help='text is not required')
+    parser.add_argument('--no-wav', dest='no_wav', action='store_true', help='wav.scp is not required')
+    parser.add_argument('--memory', type=int, default=1000, help='Memory in MB for sorting a data file')
+    parser.add_argument('--tmp_dir', type=str, help='Directory for temporary files, default: system tmp')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    tmp_dir = tempfile.mkdtemp(prefix='validate-data-dir-', dir=args.tmp_dir)
+    try:
+        checker = DataDirChecker(args.data_dir, tmp_dir, args.memory, args.no_feats, args.no_text, args.no_wav)
+        diagnostics = checker.check()
+        for line in diagnostics.report():
+            print(sys.argv[0] + ': ' + line, file=sys.stderr)
+        print('{0}: {1}: {2} of {3} utterances valid'.format(sys.argv[0], args.data_dir, checker.kept,
+                                                             checker.utterances), file=sys.stderr)
+        if not args.fix:
+            return 1 if diagnostics else 0
+        if diagnostics:
+            checker.apply()
+            print('{0}: fixed {1}, originals in {2}'.format(
+                sys.argv[0], ' '.join(sorted(checker.outputs)), os.path.join(args.data_dir, BACKUP_DIR)),
+                file=sys.stderr)
+        return 1 if diagnostics.unfixable else 0
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
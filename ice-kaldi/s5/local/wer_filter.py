@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018 Reykjavik University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Icelandic text filter for scoring, with the contract of local/wer_output_filter, wer_ref_filter and wer_hyp_filter:
+'<utt-id> <word> <word> ...' lines from stdin, the same lines with the words filtered to stdout:
+
+    local/wer_filter.py < data/test/text > test_filt.txt
+
+or the hypotheses of all LM weights of a penalty in one process, filtering the files in place (used by
+local/score.sh --wer_filter true):
+
+    local/wer_filter.py --in_place exp/.../scoring_kaldi/penalty_0.0/{9,10,11}.txt
+
+The words are
+    * split at every hyphen between letters (the letters of ice-norm/text-cleaning/char_constants.py):
+      'Norður-Ameríku' -> 'Norður Ameríku', 'Suður-Afríku-ferð' -> 'Suður Afríku ferð', 'félags- og' -> 'félags og'
+      while '91-97' is kept; tokens of dashes only are removed
+    * lowercased
+    * checked against a symbol table (--symtab words.txt), words not in it become <unk>
+    * <unk> is removed (--unk remove) or kept (--unk keep). Note that with --symtab and --unk remove, words not in
+      the symbol table are not scored at all.
+
+The hypotheses of neighbouring LM weights are mostly the same, the filtered text is kept per distinct input text
+so each is filtered once.
+
+"""
+
+import argparse
+import importlib
+import os
+import re
+import sys
+
+import symtab
+
+ICE_NORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir, 'ice-norm',
+                            'text-cleaning')
+UNK = '<unk>'
+UNK_MODES = ['remove', 'keep']
+DASHES = '-–'
+
+
+def import_ice_norm(name):
+    ice_norm_dir = os.path.normpath(ICE_NORM_DIR)
+    if ice_norm_dir not in sys.path:
+        sys.path.append(ice_norm_dir)
+    return importlib.import_module(name)
+
+
+class WerFilter:
+
+    def __init__(self, split_hyphens=True, lowercase=True, unk='remove', symbols=None):
+        """
+        :param symbols: a symtab.SymbolTable, words not in it are replaced by <unk>
+        """
+        self.split_hyphens = split_hyphens
+        self.lowercase = lowercase
+        self.remove_unk = unk == 'remove'
+        self.symbols = symbols
+        letters = import_ice_norm('char_constants').LETTERS
+        # lookarounds, so chained compounds are split at every hyphen
+        self.hyphen_pattern = re.compile('(?<=[' + letters + '])-(?=\\s*[' + letters + '])')
+        self.cache = {}
+
+    def filter_text(self, text):
+        """
+        :return: the filtered words of 'text' (without utterance id), joined by single spaces
+        """
+        filtered = self.cache.get(text)
+        if filtered is not None:
+            return filtered
+        result = text
+        if self.split_hyphens:
+            result = self.hyphen_pattern.sub(' ', result)
+        if self.lowercase:
+            result = result.lower()
+        words = []
+        for word in result.split():
+            if self.split_hyphens and not word.strip(DASHES):
+                continue
+            if self.symbols is not None and word != UNK and word not in self.symbols:
+                word = UNK
+            if word == UNK and self.remove_unk:
+                continue
+            words.append(word)
+        filtered = ' '.join(words)
+        self.cache[text] = filtered
+        return filtered
+
+    def filter_line(self, line):
+        fields = line.split(None, 1)
+        if not fields:
+            return ''
+        utt_id = fields[0]
+        filtered = self.filter_text(fields[1].strip() if len(fields) > 1 else '')
+        return utt_id + ' ' + filtered if filtered else utt_id
+
+    def run(self, lines):
+        # generator of the filtered lines, empty lines are skipped
+        for line in lines:
+            filtered = self.filter_line(line)
+            if filtered:
+                yield filtered
+
+
+def filter_in_place(wer_filter, filename):
+    with open(filename, encoding='utf-8') as f:
+        lines = list(wer_filter.run(f))
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as out:
+        out.write(''.join(line + '\n' for line in lines))
+    os.replace(tmp_file, filename)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Filters reference or hypothesis text for WER scoring',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('files', type=str, nargs='*', help='Files to filter with --in_place')
+    parser.add_argument('--in_place', action='store_true', help='Filter the files in place instead of stdin')
+    parser.add_argument('--no_split_hyphens', action='store_true', help='Do not split words at hyphens')
+    parser.add_argument('--no_lowercase', action='store_true', help='Do not lowercase')
+    parser.add_argument('--unk', choices=UNK_MODES, default='remove', help='Remove or keep ' + UNK)
+    parser.add_argument('--symtab', type=str, help='Symbol table (words.txt), words not in it become ' + UNK)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.files and not args.in_place:
+        print(sys.argv[0] + ': files are only filtered with --in_place, otherwise stdin', file=sys.stderr)
+        return 1
+
+    symbols = None
+    if args.symtab:
+        symbols = symtab.SymbolTable(args.symtab)
+    wer_filter = WerFilter(not args.no_split_hyphens, not args.no_lowercase, args.unk, symbols)
+
+    if args.in_place:
+        for filename in args.files:
+            filter_in_place(wer_filter, filename)
+    else:
+        for line in wer_filter.run(sys.stdin):
+            sys.stdout.write(line + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
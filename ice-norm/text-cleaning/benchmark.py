@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compares the throughput (lines per second) of the legacy normalizing functions with their replacements and checks
+that both produce the same output on every line. The replacements are also checked against a small set of golden
+input/output pairs (GOLDEN). The tokenizers of tokenizer.py are compared with nltk.word_tokenize() if NLTK is
+installed (the compat tokenizer should produce the same tokens, the fast one is expected to differ), together with
+the startup time of the tokenizers (time to import and tokenize one line in a new interpreter).
+
+Input: a corpus in the Leipzig Wortschatz format (one sentence per line, optionally '<id>\t<sentence>'). Without
+an input file a small synthetic corpus containing acronyms, abbreviations and symbols from the mapping tables is
+generated. Run from this directory, the mapping tables are read from '../mapping_tables/'.
+
+    python3 benchmark.py -i is_news_2016_1M-sentences.txt -n 100000
+
+"""
+
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import map_replacement
+import tokenizer
+
+SYNTHETIC_WORDS = ['og', 'að', 'í', 'á', 'er', 'sem', 'um', 'fyrir', 'segir', 'ríkisstjórnin', 'þingmenn', 'Reykjavík',
+                   'kosningar', 'árið', 'milljónir', 'króna', 'eftir', 'frá', 'leiknum', 'fréttir']
+# words and symbols for the preprocessing steps
+SYNTHETIC_SPECIAL = ['Norður-Ameríku', 'félags- og', '„já“', '(innskot)', 'ritstjorn@dv.is', '91-97', '-', '12:46',
+                     '«', '*', 'Suður-Kóreu', 'e-mail']
+
+# (function name, input, expected output of the current implementation)
+GOLDEN = [
+    ('delete_non_conform_symbols', 'Hann sagði: „Já“ (í gær).', 'Hann sagði: Já í gær.'),
+    ('delete_non_conform_symbols', 'Verð: 1.000 kr. *með vsk', 'Verð: 1.000 kr. með vsk'),
+    ('remove_dashes', 'Norður-Ameríka og Suður-Kórea', 'Norður Ameríka og Suður Kórea'),
+    ('remove_dashes', 'félags- og tryggingamálaráðuneytinu', 'félags  og tryggingamálaráðuneytinu'),
+    ('remove_dashes', 'árin 91-97 tröll til sölu - Stóðhestsefni', 'árin 91-97 tröll til sölu - Stóðhestsefni'),
+    # the legacy version also replaced 'b-c' at the end, which is not a match of the dash pattern
+    ('remove_dashes', 'a-b-c og b-c', 'a b-c og b c'),
+    ('replace_e_mail', 'sendið á ritstjorn@dv.is í dag', 'sendið á  í dag'),
+    ('clean_web_page_labels', 'Innlent - 8. maí 2008, 12:46 Geysir Green mátti kaupa Jarðborun Forsíða..',
+     '- 8. maí 2008, 12:46 Geysir Green mátti kaupa Jarðborun'),
+]
+
+
+def read_corpus(filename, max_lines):
+    lines = []
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            # Leipzig sentence files: <id>\t<sentence>
+            lines.append(line.rstrip('\n').split('\t')[-1])
+            if len(lines) == max_lines:
+                break
+    return lines
+
+
+def synthetic_corpus(n, seed=1):
+    repl = map_replacement.ReplacementMaps()
+    keys = list(repl.get_acronym_map()) + list(repl.get_abbreviation_map()) + list(repl.get_symbol_map())
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        words = [rand.choice(SYNTHETIC_WORDS) for _ in range(rand.randint(5, 25))]
+        # about every third line contains a mapped key
+        if rand.random() < 0.3:
+            words.insert(rand.randint(0, len(words)), rand.choice(keys))
+        if rand.random() < 0.3:
+            words.insert(rand.randint(0, len(words)), rand.choice(SYNTHETIC_SPECIAL))
+        lines.append(' '.join(words) + ' .')
+    return lines
+
+
+def legacy_replace_from_maps(line):
+    # the maps as used before, read from disk for each line
+    return map_replacement.replace_from_maps(line, map_replacement.ReplacementMaps())
+
+
+def time_function(func, lines):
+    start = time.perf_counter()
+    output = [func(line) for line in lines]
+    return output, time.perf_counter() - start
+
+
+def compare(name, legacy, replacement, lines, show_diffs=True):
+    """
+    :return: a report row [name, legacy lines/sec, new lines/sec, speedup, number of differing lines]
+    """
+    legacy_out, legacy_time = time_function(legacy, lines)
+    new_out, new_time = time_function(replacement, lines)
+    diffs = [(line, old, new) for line, old, new in zip(lines, legacy_out, new_out) if old != new]
+    for line, old, new in diffs[:5] if show_diffs else []:
+        print('DIFF ' + name + ': ' + line + '\n\tlegacy: ' + old + '\n\tnew:    ' + new)
+    return [name, '%.0f' % (len(lines) / legacy_time), '%.0f' % (len(lines) / new_time),
+            '%.1fx' % (legacy_time / new_time), str(len(diffs))]
+
+
+def check_golden(preprocessor):
+    failed = 0
+    for name, inp, expected in GOLDEN:
+        output = getattr(preprocessor, name)(inp)
+        if output != expected:
+            print('GOLDEN ' + name + ': ' + inp + '\n\texpected: ' + expected + '\n\tgot:      ' + output)
+            failed += 1
+    print(str(len(GOLDEN) - failed) + '/' + str(len(GOLDEN)) + ' golden outputs ok\n')
+    return failed
+
+
+def preprocessing_rows(lines):
+    """
+    Per function comparison of the preprocessing module functions with Preprocessor. Each function gets the output
+    of the previous step as input, like in preprocessing.process().
+    """
+    import preprocessing
+    preprocessor = preprocessing.Preprocessor()
+    failed = check_golden(preprocessor)
+
+    rows = []
+    for name in ['delete_non_conform_symbols', 'remove_dashes', 'replace_e_mail', 'clean_web_page_labels']:
+        rows.append(compare(name, getattr(preprocessing, name), getattr(preprocessor, name), lines))
+        lines = [getattr(preprocessing, name)(line) for line in lines]
+    return rows, failed
+
+
+def tokenizer_rows(lines):
+    """
+    :return: report rows for the compat and fast tokenizers, and the names of rows allowed to have differences
+    """
+    def joined(tokenize):
+        return lambda line: ' '.join(tokenize(line))
+
+    try:
+        import nltk
+        nltk.word_tokenize('Já.')
+    except (ImportError, LookupError) as e:
+        print('NLTK not available (' + str(e).strip().split('\n')[0] + '), timing the tokenizers only\n')
+        rows = []
+        for name in ['compat', 'fast']:
+            _, elapsed = time_function(joined(tokenizer.get_tokenizer(name)), lines)
+            rows.append(['tokenize ' + name, '-', '%.0f' % (len(lines) / elapsed), '-', '-'])
+        return rows, set()
+
+    reference = joined(nltk.word_tokenize)
+    rows = [compare('tokenize compat', reference, joined(tokenizer.tokenize_compat), lines),
+            compare('tokenize fast', reference, joined(tokenizer.tokenize_fast), lines, show_diffs=False)]
+    return rows, {'tokenize fast'}
+
+
+def startup_time(code, runs=5):
+    # median time in ms to run 'code' in a new interpreter, None if it fails
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            return None
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def print_startup_times():
+    print('Startup (import and tokenize one line):')
+    for name, code in [('nltk.word_tokenize', 'import nltk; nltk.word_tokenize("Hann kom. Hún fór.")'),
+                       ('tokenizer compat', 'import tokenizer; tokenizer.tokenize_compat("Hann kom. Hún fór.")'),
+                       ('tokenizer fast', 'import tokenizer; tokenizer.tokenize_fast("Hann kom. Hún fór.")')]:
+        ms = startup_time(code)
+        print('\t' + name + ': ' + ('not available' if ms is None else '%.0f ms' % ms))
+    print()
+
+
+def write_report(rows):
+    rows = [['STEP', 'LEGACY-LINES/S', 'NEW-LINES/S', 'SPEEDUP', 'DIFFS']] + rows
+    widths = [max(map(len, col)) for col in zip(*rows)]
+    for row in rows:
+        print("  ".join((val.ljust(width) for val, width in zip(row, widths))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark of the normalizing steps, legacy vs. current',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', type=str, help='Corpus file, e.g. from Leipzig Wortschatz. Default: synthetic corpus')
+    parser.add_argument('-n', type=int, default=20000, help='Number of lines to use')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    lines = read_corpus(args.i, args.n) if args.i else synthetic_corpus(args.n)
+    print('Benchmarking on ' + str(len(lines)) + ' lines\n')
+
+    print_startup_times()
+    rows, may_differ = tokenizer_rows(lines)
+    preprocessing_result, failed = preprocessing_rows(lines)
+    rows += preprocessing_result
+    rows.append(compare('map_replacement', legacy_replace_from_maps, map_replacement.replace_from_maps, lines))
+    write_report(rows)
+    if failed or any(row[-1] not in ('0', '-') for row in rows if row[0] not in may_differ):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+Throughput benchmark of the normalization, to see whether a change makes it faster or slower. Measures
+
+    * lines per second of each normalizing stage (see stages.py), in this process
+    * lines per second end to end, running main.py on the corpus file in a new process
+    * peak memory (maximum resident set size) of the main.py process
+    * startup time: importing the stages and normalizing one line in a new interpreter
+    * output equivalence: the main.py output compared line by line with a golden file
+
+and saves the results as JSON, together with the git commit, to compare them across commits. Without an input file
+a synthetic corpus is generated (corpus_generator.py), the same for the same -n and --seed, so its golden file can be
+kept. Run from this directory, the mapping tables are read from '../mapping_tables/':
+
+    python3 benchmark_suite.py -n 50000 --golden golden_50000.txt --write_golden      # once, on a trusted commit
+    python3 benchmark_suite.py -n 50000 --golden golden_50000.txt -o before.json
+    ... change preprocessing.py ...
+    python3 benchmark_suite.py -n 50000 --golden golden_50000.txt -o after.json --compare before.json
+
+Exits with 1 if the output differs from the golden file.
+
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmark
+import corpus_generator
+import preprocessing
+import stages
+
+ENCODING = 'UTF-8'
+STARTUP_CODE = 'import stages; stages.Pipeline().process("Hann kom í gær, t.d. kl. 12:46.")'
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_lines(filename, max_lines):
+    with open(filename, encoding=ENCODING) as f:
+        return [line.rstrip('\n') for line in itertools.islice(f, max_lines)]
+
+
+def stage_throughput(lines, tokenizer_mode='compat'):
+    """
+    Runs all stages on 'lines' in this process.
+
+    :return: a dict stage name -> {seconds, lines_per_sec, lines, changed, dropped}
+    """
+    preprocessing.configure(tokenizer_mode)
+    pipeline = stages.Pipeline()
+    for _ in pipeline.run(lines):
+        pass
+    results = {}
+    for name, stats in pipeline.stats.items():
+        results[name] = {'seconds': round(stats.seconds, 4),
+                         'lines_per_sec': round(stats.lines / stats.seconds) if stats.seconds else None,
+                         'lines': stats.lines, 'changed': stats.changed, 'dropped': stats.dropped}
+    return results
+
+
+def end_to_end(corpus_file, out_file, main_args):
+    """
+    Runs main.py on 'corpus_file' in a new process.
+
+    :return: a dict with seconds, lines_per_sec and the peak memory in MB of the process
+    """
+    with open(corpus_file, 'rb') as f:
+        lines = sum(1 for _ in f)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, 'main.py', corpus_file, out_file, '--progress', '0'] + main_args,
+                          stderr=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    # maximum over all finished child processes, the main.py run is by far the largest one so far
+    peak = max(before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {'seconds': round(seconds, 3), 'lines_per_sec': round(lines / seconds),
+            'peak_memory_mb': round(peak / 1024, 1)}
+
+
+def compare_golden(out_file, golden_file):
+    """
+    :return: a dict with the number of differing lines (including missing ones) and the first differences
+    """
+    diffs = []
+    count = 0
+    with open(out_file, encoding=ENCODING) as out, open(golden_file, encoding=ENCODING) as golden:
+        for ind, (line, expected) in enumerate(itertools.zip_longest(out, golden), 1):
+            if line != expected:
+                count += 1
+                if len(diffs) < 5:
+                    diffs.append({'line': ind, 'expected': (expected or '').rstrip('\n'),
+                                  'got': (line or '').rstrip('\n')})
+    return {'file': golden_file, 'diff_lines': count, 'first_diffs': diffs}
+
+
+def file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def print_results(results, previous=None):
+    def ratio(new, old):
+        return '%.2fx' % (new / old) if new and old else '-'
+
+    rows = [['MEASURE', 'VALUE', 'PREVIOUS', 'RATIO']]
+    old_stages = previous['stages'] if previous else {}
+    for name, stage in results['stages'].items():
+        old = old_stages.get(name, {}).get('lines_per_sec')
+        rows.append(['stage ' + name + ' lines/s', str(stage['lines_per_sec']), str(old or '-'),
+                     ratio(stage['lines_per_sec'], old)])
+    for key, label in [('lines_per_sec', 'end to end lines/s'), ('peak_memory_mb', 'peak memory MB')]:
+        old = previous['end_to_end'][key] if previous else None
+        rows.append([label, str(results['end_to_end'][key]), str(old or '-'), ratio(results['end_to_end'][key], old)])
+    old = previous['startup_ms'] if previous else None
+    rows.append(['startup ms', str(results['startup_ms']), str(old or '-'), ratio(results['startup_ms'], old)])
+    widths = [max(map(len, col)) for col in zip(*rows)]
+    for row in rows:
+        print('  '.join(val.ljust(width) for val, width in zip(row, widths)))
+
+    golden = results.get('golden')
+    if golden:
+        print('\nGolden file ' + golden['file'] + ': ' + str(golden['diff_lines']) + ' differing lines')
+        for diff in golden['first_diffs']:
+            print('\tline ' + str(diff['line']) + '\n\t\texpected: ' + diff['expected'] + '\n\t\tgot:      ' +
+                  diff['got'])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Throughput benchmark of the normalizing stages and main.py',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', type=str, help='Corpus file, one sentence per line. Default: synthetic corpus')
+    parser.add_argument('-n', type=int, default=50000, help='Number of lines to use')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic corpus')
+    parser.add_argument('--tokenizer', choices=['compat', 'fast'], default='compat')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes for the end to end run')
+    parser.add_argument('--golden', type=str, help='Expected output of main.py for the corpus')
+    parser.add_argument('--write_golden', action='store_true', help='Write the output to the --golden file')
+    parser.add_argument('-o', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--compare', type=str, help='JSON results of a previous run to compare with')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix='ice-norm-bench-')
+    try:
+        corpus_file = os.path.join(work_dir, 'corpus.txt')
+        if args.i:
+            lines = read_lines(args.i, args.n)
+        else:
+            lines = list(corpus_generator.CorpusGenerator(args.seed).lines(args.n))
+        with open(corpus_file, 'w', encoding=ENCODING) as f:
+            f.write('\n'.join(lines) + '\n')
+        print('Benchmarking on ' + str(len(lines)) + ' lines\n', file=sys.stderr)
+
+        out_file = os.path.join(work_dir, 'normalized.txt')
+        main_args = ['--tokenizer', args.tokenizer, '--workers', str(args.workers)]
+        results = {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'corpus': args.i or 'synthetic (seed ' + str(args.seed) + ')',
+            'lines': len(lines),
+            'tokenizer': args.tokenizer,
+            'workers': args.workers,
+            'end_to_end': end_to_end(corpus_file, out_file, main_args),
+            'stages': stage_throughput(lines, args.tokenizer),
+            'startup_ms': round(benchmark.startup_time(STARTUP_CODE) or 0),
+        }
+        results['output_sha256'] = file_digest(out_file)
+
+        if args.golden and args.write_golden:
+            shutil.copyfile(out_file, args.golden)
+            print('Golden file written to ' + args.golden, file=sys.stderr)
+        elif args.golden:
+            results['golden'] = compare_golden(out_file, args.golden)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding=ENCODING) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    if args.o:
+        with open(args.o, 'w', encoding=ENCODING) as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if results.get('golden') and results['golden']['diff_lines']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generates a synthetic corpus of Icelandic news-like sentences, one per line (with --ids in the Leipzig Wortschatz
+format '<id>\t<sentence>'), for benchmarking the normalization (see benchmark_suite.py) without a real corpus.
+
+The vocabulary is taken from the mapping tables (abbreviations, acronyms and symbols together with the words of their
+expansions) and completed with random words over char_constants.LETTERS. Besides plain sentences the corpus contains
+the kinds of lines the normalizing stages are written for: web page labels ('Þú ert hér: ...', 'Innlent - ...
+Forsíða..'), e-mail addresses, urls, words joined by dashes, numbers, times, quotes and brackets. The same seed
+always gives the same corpus.
+
+    python3 corpus_generator.py -n 100000 -o synthetic.txt
+
+"""
+
+import argparse
+import random
+import re
+
+import char_constants
+import map_replacement
+
+
+def expand_ranges(char_class):
+    # 'a-dð' -> 'abcdð'
+    return re.sub('(.)-(.)', lambda m: ''.join(chr(code) for code in range(ord(m.group(1)), ord(m.group(2)) + 1)),
+                  char_class)
+
+
+LOWER = sorted(set(char for char in expand_ranges(char_constants.LETTERS) if char.islower()))
+VOWELS = [char for char in LOWER if char in 'aáeéiíoóuúyýæö']
+CONSONANTS = [char for char in LOWER if char not in VOWELS and char not in 'cqwxz']
+
+COMMON_WORDS = ['og', 'að', 'í', 'á', 'er', 'sem', 'um', 'fyrir', 'með', 'til', 'var', 'ekki', 'við', 'það', 'hann',
+                'hún', 'en', 'sagði', 'segir', 'eftir', 'frá', 'hafa', 'árið', 'króna', 'milljónir', 'ríkisstjórnin']
+NAMES = ['Reykjavík', 'Akureyri', 'Ísafirði', 'Jón', 'Guðrún', 'Sigurður', 'Alþingi', 'Landspítalanum']
+DASHED = ['Norður-Ameríku', 'Suður-Kóreu', 'félags- og', 'Austur-Evrópu', 'e-mail', '91-97', 'Vestur-Íslendinga']
+DOMAINS = ['mbl.is', 'visir.is', 'ruv.is', 'dv.is', 'bb.is', 'example.com']
+SECTIONS = ['Innlent', 'Erlent', 'Íþróttir', 'Viðskipti']
+MONTHS = ['janúar', 'febrúar', 'mars', 'apríl', 'maí', 'júní', 'júlí', 'ágúst', 'september', 'október',
+          'nóvember', 'desember']
+
+
+class CorpusGenerator:
+
+    def __init__(self, seed=1, vocabulary_size=2000):
+        self.rand = random.Random(seed)
+        repl = map_replacement.ReplacementMaps()
+        self.mapped_keys = (list(repl.get_abbreviation_map()) + [key + '.' for key in repl.get_abbreviation_map()] +
+                            list(repl.get_acronym_map()) + list(repl.get_symbol_map()))
+        expansion_words = set()
+        for replacement_map in (repl.get_abbreviation_map(), repl.get_acronym_map(), repl.get_symbol_map()):
+            for value in replacement_map.values():
+                expansion_words.update(word for word in value.split() if len(word) > 1)
+        self.words = COMMON_WORDS + sorted(expansion_words)
+        while len(self.words) < vocabulary_size:
+            self.words.append(self.random_word())
+
+    def random_word(self):
+        # one to four syllables of the form (C)V(C)
+        syllables = []
+        for _ in range(self.rand.randint(1, 4)):
+            syllable = self.rand.choice(VOWELS)
+            if self.rand.random() < 0.8:
+                syllable = self.rand.choice(CONSONANTS) + syllable
+            if self.rand.random() < 0.5:
+                syllable += self.rand.choice(CONSONANTS)
+            syllables.append(syllable)
+        return ''.join(syllables)
+
+    def word(self):
+        # Zipf-like: frequent words are drawn more often
+        ind = int(len(self.words) * self.rand.random() ** 3)
+        return self.words[ind]
+
+    def sentence_words(self, min_len=4, max_len=25):
+        words = [self.word() for _ in range(self.rand.randint(min_len, max_len))]
+        if self.rand.random() < 0.3:
+            words.insert(self.rand.randint(0, len(words)), self.rand.choice(NAMES))
+        words[0] = words[0][0].upper() + words[0][1:]
+        return words
+
+    def special(self):
+        # one of the tokens the preprocessing and mapping stages act on
+        choice = self.rand.randint(0, 8)
+        if choice == 0:
+            return self.rand.choice(self.mapped_keys)
+        if choice == 1:
+            return self.rand.choice(DASHED)
+        if choice == 2:
+            return self.random_word() + '@' + self.rand.choice(DOMAINS)
+        if choice == 3:
+            return 'www.' + self.rand.choice(DOMAINS)
+        if choice == 4:
+            return str(self.rand.randint(1, 31)) + '. ' + self.rand.choice(MONTHS)
+        if choice == 5:
+            return '{0}:{1:02d}'.format(self.rand.randint(0, 23), self.rand.randint(0, 59))
+        if choice == 6:
+            return '„' + self.word() + ' ' + self.word() + '“'
+        if choice == 7:
+            return '(' + self.word() + ')'
+        amount = '{0:,}'.format(self.rand.randint(1000, 10 ** 7)).replace(',', '.')
+        return amount + ' ' + self.rand.choice(['kr.', '%'])
+
+    def sentence(self):
+        words = self.sentence_words()
+        for _ in range(self.rand.randint(0, 3)):
+            words.insert(self.rand.randint(1, len(words)), self.special())
+        if self.rand.random() < 0.2:
+            words.insert(self.rand.randint(1, len(words)), '-')
+        if self.rand.random() < 0.3:
+            words[self.rand.randint(1, len(words) - 1)] += ','
+        return ' '.join(words) + self.rand.choice(['.', '.', '.', '?', '!'])
+
+    def web_label_line(self):
+        if self.rand.random() < 0.5:
+            return (' '.join(self.sentence_words(2, 5)) + ' Þú ert hér: ' + self.rand.choice(DOMAINS) +
+                    '  Forsíða  Grein án commenta ' + self.sentence())
+        return (self.rand.choice(SECTIONS) + ' - ' + str(self.rand.randint(1, 28)) + '. ' +
+                self.rand.choice(MONTHS) + ' 2008, 12:46 ' + ' '.join(self.sentence_words(3, 8)) +
+                self.rand.choice([' Forsíða..', ' Meira Forsíða..']))
+
+    def line(self):
+        if self.rand.random() < 0.05:
+            return self.web_label_line()
+        return self.sentence()
+
+    def lines(self, n, ids=False):
+        for ind in range(1, n + 1):
+            yield (str(ind) + '\t' if ids else '') + self.line()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generates a synthetic Icelandic news corpus for benchmarking',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', type=int, default=100000, help='Number of lines')
+    parser.add_argument('-o', type=str, required=True, help='Output file')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--ids', action='store_true', help='Leipzig format: <id>\\t<sentence>')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.o, 'w', encoding='utf-8') as f:
+        for line in CorpusGenerator(args.seed).lines(args.n, args.ids):
+            f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+"""
+Removes repeated sentences from the normalized corpus, applied to the output stream of main.py (--dedup).
+
+    exact: a line is dropped if the same normalized line was seen before. Seen lines are stored as 64-bit hashes
+        (blake2b), the probability of two different lines sharing a hash is negligible for corpora of billions of
+        lines.
+    near: additionally, a line is dropped if most of its word 3-grams occur in one previous line, e.g. the same
+        news sentence with a different date or number. Lines sharing a band of their MinHash signatures are
+        candidates (see minhash.py), with the default 8 bands of 8 rows the similarity threshold is about 0.77.
+        The first line of each band is kept as its representative, a candidate is only dropped if the share of
+        equal signature rows with a representative reaches --dedup_min_similarity. Lines of less than
+        --dedup_min_words words are only checked for exact duplicates.
+
+The hashes are kept in a set in memory up to a memory budget, then sorted and written to a temporary file (a run).
+Runs are memory-mapped and searched by bisection, so memory usage stays within the budget however large the corpus
+is. MAX_RUNS runs of the same size are merged into one, so each hash is merged once per size level instead of at
+each spill. The signatures of the representatives are appended to a temporary file.
+
+With --workers, the signatures are computed by the workers (Fingerprinter), the main process only looks them up.
+
+"""
+
+import array
+import bisect
+import heapq
+import itertools
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import minhash
+
+BYTES_PER_ENTRY = 72                # approximate size of a 64-bit int in a Python set
+BYTES_PER_ITEM = 120                # approximate size of a 64-bit key and value in a Python dict
+MAX_RUNS = 8                        # runs of the same size level that are merged into one
+CHUNK_SIZE = 65536                  # values per write to a run file
+SIGNATURE_BLOCK = 1024 * 1024       # bytes of signatures kept in memory before they are written to the file
+MODES = ['none', 'exact', 'near']
+
+
+class Run:
+    """
+    Sorted keys in a memory-mapped file, and optionally their values in a second file. 'level' is the number of
+    merges the keys have been through.
+    """
+
+    def __init__(self, keys_file, values_file=None, level=0):
+        self.level = level
+        self.maps = []
+        self.keys = self._map(keys_file)
+        self.values = self._map(values_file) if values_file is not None else None
+
+    def _map(self, filename):
+        f = open(filename, 'rb')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        values = memoryview(mapped).cast('Q')
+        self.maps.append((f, mapped, values))
+        return values
+
+    def find(self, key):
+        """
+        :return: the index of 'key', -1 if it is not in the run
+        """
+        ind = bisect.bisect_left(self.keys, key)
+        if ind < len(self.keys) and self.keys[ind] == key:
+            return ind
+        return -1
+
+    def close(self):
+        for f, mapped, values in self.maps:
+            values.release()
+            mapped.close()
+            f.close()
+            os.remove(f.name)
+        self.maps = []
+
+
+class ValueWriter:
+    # Writes 64-bit values to a file in chunks
+
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.chunk = array.array('Q')
+
+    def append(self, value):
+        self.chunk.append(value)
+        if len(self.chunk) == CHUNK_SIZE:
+            self.chunk.tofile(self.file)
+            self.chunk = array.array('Q')
+
+    def close(self):
+        self.chunk.tofile(self.file)
+        self.file.close()
+
+
+class HashSet:
+    """
+    Set of 64-bit integers that spills to sorted files on disk when its in-memory part exceeds 'memory_mb'.
+    """
+
+    bytes_per_entry = BYTES_PER_ENTRY
+
+    def __init__(self, memory_mb=256, tmp_dir=None):
+        self.max_entries = max(1, memory_mb * 1024 * 1024 // self.bytes_per_entry)
+        self.tmp_dir = tmp_dir
+        self.spill_dir = None
+        self.memory = self._new_memory()
+        self.runs = []                  # oldest first, so the levels are decreasing
+        self.spilled = 0
+
+    @staticmethod
+    def _new_memory():
+        return set()
+
+    def __contains__(self, value):
+        if value in self.memory:
+            return True
+        return any(run.find(value) >= 0 for run in self.runs)
+
+    def add(self, value):
+        self.memory.add(value)
+        if len(self.memory) >= self.max_entries:
+            self._spill()
+
+    def __len__(self):
+        return len(self.memory) + sum(len(run.keys) for run in self.runs)
+
+    def _run_file(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='ice-norm-dedup-', dir=self.tmp_dir)
+        self.spilled += 1
+        return os.path.join(self.spill_dir, 'run.' + str(self.spilled))
+
+    def _sorted_items(self):
+        return sorted(self.memory)
+
+    @staticmethod
+    def _run_items(run):
+        return run.keys
+
+    def _write_run(self, sorted_items, level):
+        filename = self._run_file()
+        writer = ValueWriter(filename)
+        for value in _unique(sorted_items):
+            writer.append(value)
+        writer.close()
+        return Run(filename, level=level)
+
+    def _spill(self):
+        self.runs.append(self._write_run(self._sorted_items(), 0))
+        self.memory = self._new_memory()
+        # tiered merging: merging MAX_RUNS runs of the same level into one of the next level keeps the number of
+        # runs logarithmic in the number of spills, and each value is rewritten once per level
+        while len(self.runs) >= MAX_RUNS and len(set(run.level for run in self.runs[-MAX_RUNS:])) == 1:
+            old_runs = self.runs[-MAX_RUNS:]
+            del self.runs[-MAX_RUNS:]
+            merged = heapq.merge(*[self._run_items(run) for run in old_runs])
+            self.runs.append(self._write_run(merged, old_runs[0].level + 1))
+            for run in old_runs:
+                run.close()
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.memory = self._new_memory()
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+
+class HashMap(HashSet):
+    """
+    Map of 64-bit integer keys to 64-bit integer values, spilled like HashSet. Each key must only be added once,
+    runs are not checked for a previous value.
+    """
+
+    bytes_per_entry = BYTES_PER_ITEM
+
+    @staticmethod
+    def _new_memory():
+        return {}
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        for run in self.runs:
+            ind = run.find(key)
+            if ind >= 0:
+                return run.values[ind]
+        return default
+
+    def add(self, key, value):
+        self.memory[key] = value
+        if len(self.memory) >= self.max_entries:
+            self._spill()
+
+    def _sorted_items(self):
+        return sorted(self.memory.items())
+
+    @staticmethod
+    def _run_items(run):
+        return zip(run.keys, run.values)
+
+    def _write_run(self, sorted_items, level):
+        keys_file = self._run_file()
+        values_file = keys_file + '.values'
+        keys = ValueWriter(keys_file)
+        values = ValueWriter(values_file)
+        for key, value in _unique(sorted_items, key=lambda item: item[0]):
+            keys.append(key)
+            values.append(value)
+        keys.close()
+        values.close()
+        return Run(keys_file, values_file, level)
+
+
+class SignatureStore:
+    """
+    MinHash signatures by number, appended to a temporary file. The last SIGNATURE_BLOCK bytes are kept in memory.
+    """
+
+    def __init__(self, num_perm, tmp_dir=None):
+        self.format = struct.Struct('<{0}I'.format(num_perm))
+        self.file = None
+        self.tmp_dir = tmp_dir
+        self.block = bytearray()
+        self.written = 0                # number of signatures in the file
+        self.count = 0
+
+    def add(self, signature):
+        """
+        :return: the number of the signature, for get()
+        """
+        self.block += self.format.pack(*signature)
+        self.count += 1
+        if len(self.block) >= SIGNATURE_BLOCK:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(prefix='ice-norm-dedup-', dir=self.tmp_dir)
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(self.block)
+            self.written = self.count
+            self.block = bytearray()
+        return self.count - 1
+
+    def get(self, number):
+        if number >= self.written:
+            return self.format.unpack_from(self.block, (number - self.written) * self.format.size)
+        self.file.seek(number * self.format.size)
+        return self.format.unpack(self.file.read(self.format.size))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.block = bytearray()
+
+
+def _unique(sorted_items, key=None):
+    previous = None
+    for item in sorted_items:
+        value = item if key is None else key(item)
+        if value != previous:
+            yield item
+            previous = value
+
+
+class Fingerprinter:
+    """
+    MinHash band keys and signature of a line for the near-duplicate check. The worker processes of main.py pack
+    them into fixed size records, so the main process only unpacks and looks them up.
+    """
+
+    def __init__(self, bands=8, rows=8, min_words=5):
+        self.bands = bands
+        self.rows = rows
+        self.min_words = min_words
+        self.minhash = minhash.MinHash(bands * rows)
+        # a flag (0 for lines without fingerprint), the band keys and the signature
+        self.record = struct.Struct('<B{0}Q{1}I'.format(bands, bands * rows))
+        self.empty = bytes(self.record.size)
+
+    def __reduce__(self):
+        # the hash cache of MinHash can't be pickled, the workers create their own
+        return Fingerprinter, (self.bands, self.rows, self.min_words)
+
+    def fingerprint(self, line):
+        """
+        :return: a tuple (band keys, signature), None if the line has less than 'min_words' words
+        """
+        words = line.split()
+        if len(words) < self.min_words:
+            return None
+        signature = self.minhash.signature(minhash.shingles(words))
+        return minhash.band_keys(signature, self.bands, self.rows), signature
+
+    def pack(self, line):
+        fingerprint = self.fingerprint(line)
+        if fingerprint is None:
+            return self.empty
+        keys, signature = fingerprint
+        return self.record.pack(1, *keys, *signature)
+
+    def read_records(self, f):
+        # generator of the records of a binary file written with pack()
+        return iter(lambda: f.read(self.record.size), b'')
+
+    def unpack(self, record):
+        values = self.record.unpack(record)
+        if not values[0]:
+            return None
+        return values[1:self.bands + 1], values[self.bands + 1:]
+
+
+class Deduplicator:
+    """
+    Filter of duplicate lines, see module docstring. Counts the lines checked and the exact and near duplicates.
+    """
+
+    def __init__(self, mode='exact', memory_mb=256, tmp_dir=None, bands=8, rows=8, min_words=5, min_similarity=0.75):
+        if mode not in MODES[1:]:
+            raise ValueError('Unknown dedup mode "' + mode + '", choose one of ' + ', '.join(MODES[1:]))
+        self.mode = mode
+        # the memory budget is shared by the line hashes and the LSH band keys
+        self.lines = HashSet(memory_mb if mode == 'exact' else max(1, memory_mb // 4), tmp_dir)
+        self.bands = None
+        self.fingerprinter = None
+        if mode == 'near':
+            self.fingerprinter = Fingerprinter(bands, rows, min_words)
+            self.bands = HashMap(max(1, memory_mb - memory_mb // 4), tmp_dir)
+            self.signatures = SignatureStore(bands * rows, tmp_dir)
+            self.min_similarity = min_similarity
+        self.seen = 0
+        self.exact = 0
+        self.near = 0
+        self.seconds = 0.0
+
+    def is_duplicate(self, line, record=None):
+        """
+        :param record: the Fingerprinter record of 'line' if it was computed by a worker, or None
+        """
+        self.seen += 1
+        key = minhash.hash64(line)
+        if key in self.lines:
+            self.exact += 1
+            return True
+        self.lines.add(key)
+        if self.bands is None:
+            return False
+
+        fingerprint = self.fingerprinter.fingerprint(line) if record is None else self.fingerprinter.unpack(record)
+        if fingerprint is None:
+            return False
+        keys, signature = fingerprint
+        new_keys = []
+        compared = set()
+        for band_key in keys:
+            number = self.bands.get(band_key)
+            if number is None:
+                new_keys.append(band_key)
+            elif number not in compared:
+                compared.add(number)
+                if minhash.similarity(signature, self.signatures.get(number)) >= self.min_similarity:
+                    self.near += 1
+                    return True
+        # the line represents the bands it is the first of
+        if new_keys:
+            number = self.signatures.add(signature)
+            for band_key in new_keys:
+                self.bands.add(band_key, number)
+        return False
+
+    def filter(self, lines, records=None):
+        """
+        Generator of the lines of 'lines' that are not duplicates.
+
+        :param records: the Fingerprinter records of 'lines' in the same order, or None
+        """
+        records = records if records is not None else itertools.repeat(None)
+        for line, record in zip(lines, records):
+            start = time.perf_counter()
+            duplicate = self.is_duplicate(line, record)
+            self.seconds += time.perf_counter() - start
+            if not duplicate:
+                yield line
+
+    def report(self):
+        dropped = self.exact + self.near
+        rate = 100.0 * dropped / self.seen if self.seen else 0.0
+        return ('Dedup ({0}): {1} lines, {2} exact and {3} near duplicates dropped, dedup rate {4:.2f}%, '
+                '{5:.1f} sec'.format(self.mode, self.seen, self.exact, self.near, rate, self.seconds))
+
+    def close(self):
+        self.lines.close()
+        if self.bands is not None:
+            self.bands.close()
+            self.signatures.close()
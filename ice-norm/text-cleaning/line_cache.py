@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bounded LRU cache of normalized lines, keyed by a 64-bit hash of the raw line (main.py --cache_memory).
+
+News corpora repeat many lines verbatim (bylines, section headers, 'Innlent - ...'), a repeated line is looked up
+instead of going through all normalizing stages again. Only the hash of the raw line is stored, not the line itself.
+The cache holds as many entries as fit into the memory cap, the least recently used entry is evicted first.
+
+With several worker processes each worker has its own cache, warmed with the most frequent lines of a sample of the
+input (see frequent_lines()), normalized once in the main process.
+
+"""
+
+import sys
+
+from collections import Counter, OrderedDict
+
+import minhash
+
+ENTRY_OVERHEAD = 120                # approximate bytes per entry besides the value: key int, dict and list node
+
+
+def line_key(line):
+    return minhash.hash64(line)
+
+
+class LineCache:
+
+    def __init__(self, memory_mb=64):
+        self.max_bytes = memory_mb * 1024 * 1024
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(value):
+        return ENTRY_OVERHEAD + (sys.getsizeof(value) if value is not None else 0)
+
+    def get(self, key):
+        """
+        :return: a tuple (found, value), value is None for a line that was dropped by the normalizer
+        """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        if key in self.entries:
+            return
+        self.entries[key] = value
+        self.bytes += self._size(value)
+        while self.bytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self._size(evicted)
+
+    def warm(self, entries):
+        # adds (key, value) pairs, most important last, without counting them as misses
+        for key, value in entries:
+            self.put(key, value)
+
+    def reset_counts(self):
+        self.hits = 0
+        self.misses = 0
+
+
+def frequent_lines(lines, max_lines, min_count=2):
+    """
+    :param lines: a sample of raw input lines
+    :return: the stripped lines occurring at least 'min_count' times, at most 'max_lines', most frequent first
+    """
+    counts = Counter(line.strip() for line in lines)
+    return [line for line, count in counts.most_common(max_lines) if count >= min_count and line]
+
+
+def format_report(hits, misses):
+    lookups = hits + misses
+    rate = 100.0 * hits / lookups if lookups else 0.0
+    return 'Line cache: {0} lookups, {1} hits, hit rate {2:.2f}%'.format(lookups, hits, rate)
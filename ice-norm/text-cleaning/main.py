@@ -4,37 +4,597 @@
 Entrypoint for the normalizing process. The default option is to perform all available normalizing processes,
 but a selective normalizing should also be possible as work on the module proceeds.
 
+The corpus is processed as a stream, line by line (read -> preprocess -> map replacement -> write), so memory usage
+does not grow with the size of the corpus. Input and output files ending in '.gz' or '.xz' are (de)compressed on the
+fly, '-' reads from stdin or writes to stdout:
+
+    python3 main.py is_news_2016_1M-sentences.txt.gz normalized.txt.gz
+    xzcat corpus.xz | python3 main.py - - > normalized.txt
+
+With --workers N the corpus is normalized by N processes. An uncompressed input file is split into byte ranges at
+line boundaries, each range is normalized into a temporary shard file and the shards are concatenated in the order
+of the ranges, so the output is the same as from a single process. With --unordered shards are written as soon as
+they are finished. Compressed input and stdin are distributed in batches of lines instead.
+
+--tokenizer fast uses a regular expression tokenizer instead of the default, NLTK compatible one (see tokenizer.py).
+
+--normalizing_steps selects and orders the normalizing stages (see stages.py), e.g. only tokenizing and lower casing:
+
+    python3 main.py --normalizing_steps tokenize,lowercase corpus.txt tokenized.txt
+
+Time spent, lines changed and lines dropped per stage are reported to stderr at the end.
+
+--dedup exact drops repeated normalized lines, --dedup near also lines that are almost the same as a previous line
+(see dedup.py). Duplicates are removed from the merged output, so also across the shards of --workers. With --dedup
+near the workers compute the MinHash signatures of their output lines.
+
+--cache_memory MB caches the normalized lines of recurring input lines (see line_cache.py). With --workers the cache
+of each worker is warmed with the most frequent lines of a sample of --cache_sample input lines.
+
+--word_freq and --vocab write the word frequencies and the vocabulary of the normalized corpus (see word_counts.py),
+counted by the workers, or in the main process after --dedup:
+
+    python3 main.py --workers 8 --word_freq leipzig_freq.txt --vocab vocab.txt corpus.txt normalized.txt
+
+--oov writes the words of the normalized corpus that are not in the --lexicon, most frequent first, the input for
+G2P transcription (see oov.py). Like the word counts, they are collected by the workers.
+
+With --manifest the input is a manifest listing the input shards, one file per line. The output of each shard is
+cached in --shard_cache under the content hash of the shard and a fingerprint of the normalizer configuration, only
+new or changed shards are normalized (all of them after a change of the mapping tables, char_constants or the stages),
+and the output is the concatenation of the cached shard outputs (see shard_cache.py):
+
+    python3 main.py --manifest --shard_cache /data/norm_cache --workers 8 shards.txt normalized.txt
+
 """
 
 import argparse
+import gzip
+import io
+import itertools
+import lzma
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import Counter
+
+import dedup
+import line_cache
+import oov
 import preprocessing
-import map_replacement
+import shard_cache
+import stages
+import word_counts
+
+BUFFER_SIZE = 1024 * 1024
+ENCODING = 'UTF-8'
+RANGES_PER_WORKER = 4               # more ranges than workers, so fast workers don't wait for slow ones
+LINE_BATCH_SIZE = 10000             # lines per task if the input can't be split into byte ranges
+SAMPLE_PARTS = 16                   # the cache warming sample is taken from this many places of the input
+FINGERPRINT_SUFFIX = '.fp'          # dedup fingerprints of the lines of a shard, see dedup.Fingerprinter
+
+
+def open_input(filename):
+    if filename == '-':
+        return open(sys.stdin.fileno(), encoding=ENCODING, buffering=BUFFER_SIZE, closefd=False)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding=ENCODING)
+    if filename.endswith('.xz'):
+        return lzma.open(filename, 'rt', encoding=ENCODING)
+    return open(filename, encoding=ENCODING, buffering=BUFFER_SIZE)
+
+
+def open_output(filename):
+    if filename == '-':
+        return open(sys.stdout.fileno(), 'w', encoding=ENCODING, buffering=BUFFER_SIZE, closefd=False)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'wt', encoding=ENCODING)
+    if filename.endswith('.xz'):
+        return lzma.open(filename, 'wt', encoding=ENCODING)
+    return open(filename, 'w', encoding=ENCODING, buffering=BUFFER_SIZE)
+
+
+_pipeline = None
+_count_words = False
+_lexicon = None
+_fingerprinter = None
+
+
+def configure(tokenizer_mode='compat', step_names=None, cache_memory=0, warm_entries=(), count_words=False,
+              lexicon=None, fingerprinter=None):
+    """
+    Sets up the normalizing stages of this process, also the initializer of the worker processes.
+
+    :param cache_memory: memory cap of the line cache in MB, 0 for no cache
+    :param warm_entries: (line key, normalized line) pairs to put into the cache
+    :param count_words: if True, workers count the tokens of their output lines
+    :param lexicon: an oov.Lexicon the workers check the tokens of their output lines against, or None
+    :param fingerprinter: a dedup.Fingerprinter for the near-duplicate check of the output lines, or None
+    """
+    global _pipeline, _count_words, _lexicon, _fingerprinter
+    _count_words = count_words
+    _lexicon = lexicon
+    _fingerprinter = fingerprinter
+    preprocessing.configure(tokenizer_mode)
+    cache = None
+    if cache_memory > 0:
+        cache = line_cache.LineCache(cache_memory)
+        cache.warm(warm_entries)
+    _pipeline = stages.Pipeline(step_names, cache)
+
+
+def get_pipeline():
+    if _pipeline is None:
+        configure()
+    return _pipeline
+
+
+def cache_counts():
+    # (hits, misses) of the line cache of this process since the last reset
+    cache = get_pipeline().cache
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def normalize_lines(lines):
+    """
+    Normalizes each line of 'lines', lines that are empty after a normalizing stage are dropped.
+
+    :param lines: an iterable of input lines
+    :return: a generator of normalized lines
+    """
+    return get_pipeline().run(lines)
+
+
+def count_tokens_wanted():
+    # True if the workers of this process count the tokens of their output lines
+    return _count_words or _lexicon is not None
+
+
+def token_results(tokens):
+    # what a worker returns of the token counts of its output lines: (token counts or None, OOV counts or None)
+    if tokens is None:
+        return None, None
+    return (tokens if _count_words else None), (_lexicon.oov_counts(tokens) if _lexicon is not None else None)
+
+
+def add_token_results(results, counter, oov_sink):
+    # adds the token_results() of a worker to the word counter and the OOV sink of the main process
+    tokens, oov_counts = results
+    if tokens is not None:
+        counter.update(tokens)
+    if oov_counts is not None:
+        oov_sink.add(*oov_counts)
+
+
+def write_output(lines, out, deduplicator=None, counter=None, oov_sink=None, records=None):
+    """
+    Writes the normalized 'lines' to 'out', without duplicates if 'deduplicator' is given.
+
+    :param counter: a word_counts.WordCounter to count the tokens of the written lines, or None
+    :param oov_sink: an oov.OovSink to check the tokens of the written lines against the lexicon, or None
+    :param records: the dedup fingerprint records of 'lines' computed by a worker, or None
+    """
+    if deduplicator is not None:
+        lines = deduplicator.filter(lines, records)
+    sinks = [sink for sink in (counter, oov_sink) if sink is not None]
+    tokens = Counter() if sinks else None
+    for line in lines:
+        out.write(line + '\n')
+        if tokens is not None:
+            tokens.update(line.split())
+            if len(tokens) >= word_counts.MAX_LOCAL_WORDS:
+                for sink in sinks:
+                    sink.update(tokens)
+                tokens.clear()
+    if tokens:
+        for sink in sinks:
+            sink.update(tokens)
+
+
+def report_progress(lines, every):
+    # passes 'lines' through, printing the number of lines read and the rate to stderr every 'every' lines
+    start = time.perf_counter()
+    count = 0
+    for line in lines:
+        count += 1
+        if count % every == 0:
+            elapsed = time.perf_counter() - start
+            print('{0} lines read, {1:.0f} lines/sec'.format(count, count / elapsed), file=sys.stderr)
+        yield line
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        print('Done: {0} lines read in {1:.1f} sec'.format(count, elapsed), file=sys.stderr)
+
+
+def byte_ranges(filename, number):
+    """
+    Splits 'filename' into at most 'number' consecutive byte ranges, each ending after a newline (or at the end of
+    the file).
+
+    :return: a list of (start, end) tuples
+    """
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        for ind in range(1, number):
+            pos = max(size * ind // number, boundaries[-1])
+            if pos >= size:
+                break
+            f.seek(pos)
+            f.readline()
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_range(filename, start, end):
+    # lines of the byte range, decoded like reading the file in text mode would (universal newlines)
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            piece = f.read(min(BUFFER_SIZE, end - pos))
+            if not piece.endswith(b'\n') and pos + len(piece) < end:
+                piece += f.readline()
+            pos += len(piece)
+            yield from io.StringIO(piece.decode(ENCODING), newline=None)
+
+
+def normalize_range(task):
+    """
+    Worker: normalizes the lines of a byte range into a shard file.
+
+    :param task: a tuple (input filename, start, end, shard filename)
+    :return: a tuple (shard filename, number of input lines, stage stats and cache counts of the range,
+        token_results() of the output lines). With a fingerprinter, the fingerprints of the output lines are written
+        to the shard filename + FINGERPRINT_SUFFIX.
+    """
+    filename, start, end, shard = task
+    get_pipeline().reset()
+    counter = [0]
+
+    def counted(lines):
+        for line in lines:
+            counter[0] += 1
+            yield line
+
+    tokens = Counter() if count_tokens_wanted() else None
+    fingerprints = None
+    if _fingerprinter is not None:
+        fingerprints = open(shard + FINGERPRINT_SUFFIX, 'wb', buffering=BUFFER_SIZE)
+    try:
+        with open(shard, 'w', encoding=ENCODING, buffering=BUFFER_SIZE) as out:
+            for line in normalize_lines(counted(read_range(filename, start, end))):
+                out.write(line + '\n')
+                if tokens is not None:
+                    tokens.update(line.split())
+                if fingerprints is not None:
+                    fingerprints.write(_fingerprinter.pack(line))
+    finally:
+        if fingerprints is not None:
+            fingerprints.close()
+    return shard, counter[0], get_pipeline().stats, cache_counts(), token_results(tokens)
+
+
+def normalize_batch(lines):
+    # Worker: normalizes a batch of lines in memory, returns the lines, stage stats, cache counts,
+    # token_results() and dedup fingerprint records (or None) of the batch
+    get_pipeline().reset()
+    normalized = list(normalize_lines(lines))
+    tokens = word_counts.count_tokens(normalized) if count_tokens_wanted() else None
+    records = [_fingerprinter.pack(line) for line in normalized] if _fingerprinter is not None else None
+    return normalized, get_pipeline().stats, cache_counts(), token_results(tokens), records
+
+
+def line_batches(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sample_lines(input_file, size):
+    """
+    :return: up to 'size' lines from SAMPLE_PARTS places of an uncompressed input file, the first 'size' lines of
+        a compressed one, none from stdin
+    """
+    if input_file == '-':
+        return []
+    if input_file.endswith(('.gz', '.xz')):
+        with open_input(input_file) as inp:
+            return list(itertools.islice(inp, size))
+    lines = []
+    for first, last in byte_ranges(input_file, SAMPLE_PARTS):
+        lines.extend(itertools.islice(read_range(input_file, first, last), size // SAMPLE_PARTS))
+    return lines
+
+
+def warm_entries(input_file, sample_size):
+    # (line key, normalized line) of the most frequent lines of a sample of the input, normalized in this process
+    frequent = line_cache.frequent_lines(sample_lines(input_file, sample_size), sample_size)
+    pipeline = get_pipeline()
+    # least frequent first, so the most frequent lines are the last to be evicted
+    return [(line_cache.line_key(line), pipeline.process(line)) for line in reversed(frequent)]
+
+
+def normalize_parallel(input_file, out, workers, ordered=True, tmp_dir=None, tokenizer_mode='compat',
+                       step_names=None, deduplicator=None, cache_memory=0, cache_sample=100000, counter=None,
+                       oov_sink=None):
+    """
+    Normalizes 'input_file' with 'workers' processes and writes the result to 'out'.
+
+    :param ordered: if False, results are written in the order they are finished
+    :param deduplicator: a dedup.Deduplicator the merged lines are filtered with, or None
+    :param cache_memory: memory cap of the line cache of each worker in MB, 0 for no cache
+    :param counter: a word_counts.WordCounter for the tokens of the output lines, or None
+    :param oov_sink: an oov.OovSink for the output tokens not in the lexicon, or None
+    :return: a tuple (stage stats, cache counts (hits, misses)) of all workers
+    """
+    splittable = input_file != '-' and not input_file.endswith(('.gz', '.xz'))
+    start = time.perf_counter()
+    total_stats = {name: stages.StageStats() for name in (step_names or stages.STAGE_NAMES)}
+    total_counts = [0, 0]
+    warm = warm_entries(input_file, cache_sample) if cache_memory > 0 else []
+    # the workers can't count the tokens if duplicates are removed after them
+    count_in_workers = deduplicator is None
+    parent_counter = None if count_in_workers else counter
+    parent_oov_sink = None if count_in_workers else oov_sink
+    worker_lexicon = oov_sink.lexicon if oov_sink is not None and count_in_workers else None
+    fingerprinter = deduplicator.fingerprinter if deduplicator is not None else None
+
+    with multiprocessing.Pool(workers, initializer=configure,
+                              initargs=(tokenizer_mode, step_names, cache_memory, warm,
+                                        counter is not None and count_in_workers, worker_lexicon,
+                                        fingerprinter)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        if splittable:
+            shard_dir = tempfile.mkdtemp(prefix='ice-norm-', dir=tmp_dir)
+            try:
+                ranges = byte_ranges(input_file, workers * RANGES_PER_WORKER)
+                tasks = [(input_file, first, last, os.path.join(shard_dir, 'shard.' + str(ind)))
+                         for ind, (first, last) in enumerate(ranges)]
+                done = 0
+                lines_done = 0
+                for shard, count, stats, counts, tokens in imap(normalize_range, tasks):
+                    stages.merge_stats(total_stats, stats)
+                    total_counts = [total + new for total, new in zip(total_counts, counts)]
+                    add_token_results(tokens, counter, oov_sink)
+                    with open(shard, encoding=ENCODING, buffering=BUFFER_SIZE) as f:
+                        if deduplicator is None:
+                            shutil.copyfileobj(f, out, BUFFER_SIZE)
+                        elif fingerprinter is None:
+                            write_output((line.rstrip('\n') for line in f), out, deduplicator, parent_counter,
+                                         parent_oov_sink)
+                        else:
+                            with open(shard + FINGERPRINT_SUFFIX, 'rb', buffering=BUFFER_SIZE) as fp:
+                                write_output((line.rstrip('\n') for line in f), out, deduplicator, parent_counter,
+                                             parent_oov_sink, fingerprinter.read_records(fp))
+                            os.remove(shard + FINGERPRINT_SUFFIX)
+                    os.remove(shard)
+                    done += 1
+                    lines_done += count
+                    elapsed = time.perf_counter() - start
+                    print('{0}/{1} ranges done, {2} lines, {3:.0f} lines/sec'.format(
+                        done, len(tasks), lines_done, lines_done / elapsed), file=sys.stderr)
+            finally:
+                shutil.rmtree(shard_dir, ignore_errors=True)
+        else:
+            with open_input(input_file) as inp:
+                batches = imap(normalize_batch, line_batches(inp, LINE_BATCH_SIZE))
+                for lines, stats, counts, tokens, records in batches:
+                    stages.merge_stats(total_stats, stats)
+                    total_counts = [total + new for total, new in zip(total_counts, counts)]
+                    add_token_results(tokens, counter, oov_sink)
+                    write_output(lines, out, deduplicator, parent_counter, parent_oov_sink, records)
+    return total_stats, total_counts
+
+
+def normalize_shard(task):
+    """
+    Worker: normalizes an input shard (also .gz/.xz) into a file.
+
+    :param task: a tuple (shard filename, output filename)
+    :return: a tuple (shard filename, output filename, stage stats and cache counts of the shard)
+    """
+    shard, out_file = task
+    get_pipeline().reset()
+    with open_input(shard) as inp, open(out_file, 'w', encoding=ENCODING, buffering=BUFFER_SIZE) as out:
+        for line in normalize_lines(inp):
+            out.write(line + '\n')
+    return shard, out_file, get_pipeline().stats, cache_counts()
+
+
+def normalize_manifest(manifest, out, cache_dir, workers=1, tokenizer_mode='compat', step_names=None,
+                       deduplicator=None, counter=None, cache_memory=0, prune=False, oov_sink=None):
+    """
+    Normalizes the shards of 'manifest' that are not in the shard cache and writes the concatenation of all shard
+    outputs to 'out'.
+
+    :param prune: if True, cached outputs not belonging to the current manifest are deleted
+    :return: a tuple (stage stats, line cache counts) of the normalized shards
+    """
+    step_names = step_names or stages.STAGE_NAMES
+    shards = shard_cache.read_manifest(manifest)
+    cache = shard_cache.ShardCache(cache_dir, shard_cache.config_fingerprint(step_names, tokenizer_mode))
+    keys = [cache.key(shard) for shard in shards]
+    cache.save_index()
+
+    tasks = {}
+    for shard, key in zip(shards, keys):
+        if key not in cache and key not in tasks:
+            tasks[key] = (shard, cache.tmp_path(key))
+    print('{0} shards, {1} cached, {2} to normalize'.format(len(shards), len(shards) - len(tasks), len(tasks)),
+          file=sys.stderr)
+
+    total_stats = {name: stages.StageStats() for name in step_names}
+    total_counts = [0, 0]
+    key_of_tmp = {tmp_file: key for key, (_, tmp_file) in tasks.items()}
+    pool = None
+    try:
+        if workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(workers, len(tasks)), initializer=configure,
+                                        initargs=(tokenizer_mode, step_names, cache_memory))
+            results = pool.imap_unordered(normalize_shard, tasks.values())
+        else:
+            results = map(normalize_shard, tasks.values())
+        for done, (shard, tmp_file, stats, counts) in enumerate(results, 1):
+            cache.store(key_of_tmp[tmp_file], tmp_file)
+            stages.merge_stats(total_stats, stats)
+            total_counts = [total + new for total, new in zip(total_counts, counts)]
+            print('{0}/{1} shards normalized: {2}'.format(done, len(tasks), shard), file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for _, tmp_file in tasks.values():
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    for key in keys:
+        with open(cache.path(key), encoding=ENCODING, buffering=BUFFER_SIZE) as f:
+            if deduplicator is None and counter is None and oov_sink is None:
+                shutil.copyfileobj(f, out, BUFFER_SIZE)
+            else:
+                write_output((line.rstrip('\n') for line in f), out, deduplicator, counter, oov_sink)
+    if prune:
+        print('{0} cached outputs deleted'.format(cache.prune(keys)), file=sys.stderr)
+    return total_stats, total_counts
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Normalizes Icelandic text for ASR', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('i', type=argparse.FileType('r', encoding='UTF-8'), help='Input data set')
-    parser.add_argument('o', type=argparse.FileType('w', encoding='UTF-8'), help='Output file')
-    parser.add_argument('--normalizing_steps', default=[])
+    parser.add_argument('i', type=str, help='Input data set (.gz/.xz compressed or - for stdin), with --manifest '
+                                            'a file listing the input shards')
+    parser.add_argument('o', type=str, help='Output file (.gz/.xz compressed or - for stdout)')
+    parser.add_argument('--normalizing_steps', type=str, default='',
+                        help='Comma separated normalizing stages to run, in this order. Default: all stages: ' +
+                             ','.join(stages.STAGE_NAMES))
+    parser.add_argument('--progress', type=int, default=100000,
+                        help='Report progress to stderr every N input lines, 0 for no progress report')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes normalizing the input')
+    parser.add_argument('--unordered', action='store_true',
+                        help='With --workers, write the output of each worker as soon as it is done, '
+                             'the order of lines is not kept')
+    parser.add_argument('--tmp_dir', type=str, help='Directory for temporary shard files, default: system tmp')
+    parser.add_argument('--tokenizer', choices=['compat', 'fast'], default='compat',
+                        help='compat: same tokens as nltk.word_tokenize, fast: regular expression tokenizer')
+    parser.add_argument('--dedup', choices=dedup.MODES, default='none',
+                        help='Drop exact duplicates of normalized lines, or also near-duplicates')
+    parser.add_argument('--dedup_memory', type=int, default=256,
+                        help='Memory in MB for the hashes of seen lines, more are kept in temporary files')
+    parser.add_argument('--dedup_min_words', type=int, default=5,
+                        help='Shorter lines are only checked for exact duplicates')
+    parser.add_argument('--dedup_min_similarity', type=float, default=0.75,
+                        help='With --dedup near, minimum share of equal MinHash rows with a previous line to drop a '
+                             'line')
+    parser.add_argument('--cache_memory', type=int, default=0,
+                        help='Memory in MB (per worker) for caching the normalized lines of recurring input lines, '
+                             '0 for no cache')
+    parser.add_argument('--cache_sample', type=int, default=100000,
+                        help='With --workers and --cache_memory, number of input lines sampled for warming the '
+                             'caches of the workers')
+    parser.add_argument('--word_freq', type=str,
+                        help='Write the word frequencies of the output to this file (format of leipzig_freq.txt)')
+    parser.add_argument('--vocab', type=str, help='Write the sorted vocabulary of the output to this file')
+    parser.add_argument('--vocab_min_count', type=int, default=1,
+                        help='Minimum frequency of a word in --word_freq and --vocab')
+    parser.add_argument('--count_memory', type=int, default=512,
+                        help='Memory in MB for word counts, more are kept in temporary files. Shared by --word_freq/'
+                             '--vocab and --oov if both are given')
+    parser.add_argument('--lexicon', type=str,
+                        help='Pronunciation lexicon (lexicon.txt or words.txt, the first column is used) for --oov')
+    parser.add_argument('--oov', type=str,
+                        help='Write the words of the output not in --lexicon to this file, most frequent first '
+                             '(words_to_transcribe.txt for G2P)')
+    parser.add_argument('--oov_min_count', type=int, default=2, help='Minimum frequency of a word in --oov')
+    parser.add_argument('--oov_max_words', type=int, default=0,
+                        help='Write at most this many words to --oov, 0 for all')
+    parser.add_argument('--manifest', action='store_true',
+                        help='The input is a manifest of input shards, normalize only shards not in --shard_cache')
+    parser.add_argument('--shard_cache', type=str, default='shard_cache',
+                        help='With --manifest, directory of the cached shard outputs')
+    parser.add_argument('--prune_cache', action='store_true',
+                        help='With --manifest, delete cached outputs of shards not in the manifest')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    try:
+        args.normalizing_steps = stages.parse_stage_names(args.normalizing_steps)
+    except ValueError as e:
+        parser.error(str(e))
+    if bool(args.oov) != bool(args.lexicon):
+        parser.error('--oov and --lexicon must be given together')
+    return args
 
 
 def main():
 
     args = parse_args()
-    text = args.i.readlines()
-
-    processed_lines = []
-    for line in text:
-        preprocessed_line = preprocessing.process(line.strip())
+    configure(args.tokenizer, args.normalizing_steps, args.cache_memory)
+    deduplicator = None
+    if args.dedup != 'none':
+        deduplicator = dedup.Deduplicator(args.dedup, args.dedup_memory, args.tmp_dir,
+                                          min_words=args.dedup_min_words, min_similarity=args.dedup_min_similarity)
+    count_word_freq = bool(args.word_freq or args.vocab)
+    # the word counts and the OOV counts share --count_memory
+    count_memory = max(1, args.count_memory // 2) if count_word_freq and args.oov else args.count_memory
+    counter = None
+    if count_word_freq:
+        counter = word_counts.WordCounter(count_memory, args.tmp_dir)
+    oov_sink = None
+    if args.oov:
+        oov_sink = oov.OovSink(oov.Lexicon.from_file(args.lexicon), count_memory, args.tmp_dir)
 
-        if len(preprocessed_line) != 0:
-            processed_line = map_replacement.replace_from_maps(preprocessed_line)
-            processed_lines.append(processed_line)
+    try:
+        if args.manifest:
+            with open_output(args.o) as out:
+                stats, counts = normalize_manifest(args.i, out, args.shard_cache, args.workers, args.tokenizer,
+                                                   args.normalizing_steps, deduplicator, counter, args.cache_memory,
+                                                   args.prune_cache, oov_sink)
+        elif args.workers > 1:
+            with open_output(args.o) as out:
+                stats, counts = normalize_parallel(args.i, out, args.workers, not args.unordered, args.tmp_dir,
+                                                   args.tokenizer, args.normalizing_steps, deduplicator,
+                                                   args.cache_memory, args.cache_sample, counter, oov_sink)
+        else:
+            with open_input(args.i) as inp, open_output(args.o) as out:
+                lines = inp
+                if args.progress > 0:
+                    lines = report_progress(lines, args.progress)
+                write_output(normalize_lines(lines), out, deduplicator, counter, oov_sink)
+            stats = get_pipeline().stats
+            counts = cache_counts()
 
-    for line in processed_lines:
-        args.o.write(line + '\n')
+        print('\n'.join(stages.format_report(stats)), file=sys.stderr)
+        if args.cache_memory > 0:
+            print(line_cache.format_report(*counts), file=sys.stderr)
+        if deduplicator is not None:
+            print(deduplicator.report(), file=sys.stderr)
+        if counter is not None:
+            if args.word_freq:
+                counter.write_frequencies(args.word_freq, args.vocab_min_count)
+            if args.vocab:
+                counter.write_vocabulary(args.vocab, args.vocab_min_count)
+            print(counter.report(), file=sys.stderr)
+        if oov_sink is not None:
+            written = oov_sink.write(args.oov, args.oov_min_count, args.oov_max_words)
+            print(oov_sink.report(args.oov_min_count) + ', ' + str(written) + ' written to ' + args.oov,
+                  file=sys.stderr)
+    finally:
+        if deduplicator is not None:
+            deduplicator.close()
+        if counter is not None:
+            counter.close()
+        if oov_sink is not None:
+            oov_sink.close()
 
     # for line in processed_lines:
     #   if re.search('[^' + char_constants.LETTERS + ',. ]+', line):
@@ -45,4 +605,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
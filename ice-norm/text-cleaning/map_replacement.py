@@ -4,6 +4,11 @@
 """
 Uses replacement mapping files to replace symbols and strings in input using the replacement strings.
 
+ReplacementMaps applies the maps one key after the other and is kept as the reference implementation.
+CompiledReplacementMaps reads the maps once and compiles them into one regular expression per map, a line is scanned
+once per map and only lines containing a key are processed further, with the same result as ReplacementMaps.
+replace_from_maps() uses a CompiledReplacementMaps instance shared by all calls in a process.
+
 """
 
 import re
@@ -64,7 +69,7 @@ class ReplacementMaps:
     def replace_abbreviations(self, line):
         res = line
         for key in self.get_abbreviation_map():
-            res = re.sub(' ' + key + '\.? ', ' ' + self.abbr_map[key] + ' ', res)
+            res = re.sub(' ' + key + r'\.? ', ' ' + self.abbr_map[key] + ' ', res)
 
         return res
 
@@ -77,14 +82,112 @@ class ReplacementMaps:
         return res
 
 
-def replace_from_maps(line):
-    repl = ReplacementMaps()
+class CompiledReplacementMaps(ReplacementMaps):
+
+    def __init__(self):
+        super().__init__()
+        acronym_map = self.get_acronym_map()
+        abbr_map = self.get_abbreviation_map()
+        symbol_map = self.get_symbol_map()
+
+        # Acronyms: replaced token by token in one scan. A run of the same acronym ('FH FH FH') is only replaced at
+        # every second token, like str.replace() with the surrounding spaces does. Only valid if no replacement
+        # contains an acronym that would be replaced in a later step of the sequential replacement.
+        self.acronym_pattern = None
+        if acronym_map and self._tokens_independent(acronym_map):
+            alternatives = sorted(acronym_map, key=len, reverse=True)
+            self.acronym_pattern = re.compile('(?<= )(?:' + '|'.join(map(re.escape, alternatives)) + ')(?= )')
+
+        # Abbreviations: the keys are regular expressions and replacements may overlap, so the sequential
+        # substitutions are kept, but only run on lines where one of the keys matches at all
+        self.abbr_patterns = [(re.compile(' ' + key + r'\.? '), ' ' + abbr_map[key] + ' ') for key in abbr_map]
+        self.abbr_filter = None
+        if abbr_map:
+            self.abbr_filter = re.compile(' (?:' + '|'.join(abbr_map) + r')\.? ')
+
+        # Symbols: the same, with a substring filter
+        self.symbol_list = [(key, ' ' + symbol_map[key] + ' ') for key in symbol_map]
+        self.symbol_filter = None
+        if symbol_map:
+            self.symbol_filter = re.compile('|'.join(map(re.escape, symbol_map)))
+
+    @staticmethod
+    def _tokens_independent(replacement_map):
+        for key, value in replacement_map.items():
+            if not key or key.split() != [key]:
+                return False
+            if any(token in replacement_map for token in value.split(' ')):
+                return False
+        return True
+
+    def replace_acronyms(self, line):
+        if self.acronym_pattern is None:
+            return super().replace_acronyms(line)
+
+        # end and key of the previous replaced match, to skip the second token of a run of the same acronym
+        previous = [-1, None]
+
+        def replace(match):
+            key = match.group()
+            if match.start() == previous[0] + 1 and key == previous[1]:
+                previous[1] = None
+                return key
+            previous[0] = match.end()
+            previous[1] = key
+            return self.acronym_map[key]
+
+        return self.acronym_pattern.sub(replace, line)
+
+    def replace_abbreviations(self, line):
+        if self.abbr_filter is None or not self.abbr_filter.search(line):
+            return line
+        res = line
+        for pattern, repl in self.abbr_patterns:
+            res = pattern.sub(repl, res)
+
+        return res
+
+    def replace_symbols(self, line):
+        res = line
+        if self.symbol_filter is not None and self.symbol_filter.search(line):
+            for key, repl in self.symbol_list:
+                res = res.replace(key, repl)
+                res = res.replace('  ', ' ')
+        else:
+            # the sequential version collapses double spaces once per key
+            for _ in self.symbol_list:
+                if '  ' not in res:
+                    break
+                res = res.replace('  ', ' ')
+
+        return res
+
+
+PUNCTUATION = re.compile(r'[.,:?!]')
+
+_replacement_maps = None
+
+
+def get_replacement_maps():
+    # maps are read and compiled on first use, once per process
+    global _replacement_maps
+    if _replacement_maps is None:
+        _replacement_maps = CompiledReplacementMaps()
+    return _replacement_maps
+
+
+def replace_from_maps(line, repl=None):
+    """
+    :param repl: the ReplacementMaps to use, default is the shared CompiledReplacementMaps
+    """
+    if repl is None:
+        repl = get_replacement_maps()
 
     res = repl.replace_acronyms(line)
     res = repl.replace_abbreviations(res)
     res = repl.replace_symbols(res)
     # delete puncutation
-    res = re.sub(r'[.,:?!]', '', res)
+    res = PUNCTUATION.sub('', res)
     arr = res.split()
     res = ' '.join(arr)
     res = res.lower()
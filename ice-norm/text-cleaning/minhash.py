@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+MinHash signatures of sentences for finding near-duplicates with locality sensitive hashing (LSH).
+
+A sentence is described by the set of its word n-grams (shingles). The share of equal values in the MinHash
+signatures of two sentences estimates the similarity (Jaccard) of their shingle sets. The signature is split into
+bands of rows, two sentences sharing the values of one band are candidates for near-duplicates. With b bands of r
+rows, sentences with similarity s share a band with probability 1 - (1 - s^r)^b, the threshold is approximately
+(1/b)^(1/r).
+
+MinHash is also used by error-analysis/error_clusters.py to cluster utterances with similar errors.
+
+"""
+
+import hashlib
+import random
+
+from functools import lru_cache
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+SEED = 1
+
+
+def hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def shingles(words, n=3):
+    """
+    :param words: list of the words of a sentence
+    :return: the set of word n-grams, or the sentence itself if it is shorter than n words
+    """
+    if len(words) < n:
+        return {' '.join(words)}
+    return {' '.join(words[ind:ind + n]) for ind in range(len(words) - n + 1)}
+
+
+class MinHash:
+    # Universal hash functions h(x) = (a * x + b) mod p, one per row of the signature
+
+    def __init__(self, num_perm, seed=SEED, cache_size=100000):
+        rand = random.Random(seed)
+        self.params = [(rand.randint(1, MERSENNE_PRIME - 1), rand.randint(0, MERSENNE_PRIME - 1))
+                       for _ in range(num_perm)]
+        # frequent n-grams ('í gær', 'kemur fram í') repeat across sentences, cache their hash values
+        self.shingle_hashes = lru_cache(maxsize=cache_size)(self._shingle_hashes)
+
+    def _shingle_hashes(self, shingle):
+        x = hash64(shingle)
+        return tuple(((a * x + b) % MERSENNE_PRIME) & MAX_HASH for a, b in self.params)
+
+    def signature(self, shingle_set):
+        return [min(column) for column in zip(*[self.shingle_hashes(sh) for sh in shingle_set])]
+
+
+def similarity(signature, other):
+    # share of equal rows, an estimate of the Jaccard similarity of the shingle sets
+    return sum(1 for first, second in zip(signature, other) if first == second) / len(signature)
+
+
+def band_keys(signature, bands, rows):
+    """
+    :return: one 64-bit key per band of 'signature', the band number is part of the key
+    """
+    return [hash64(str(band) + ':' + ','.join(map(str, signature[band * rows:(band + 1) * rows])))
+            for band in range(bands)]
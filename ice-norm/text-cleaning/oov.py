@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+Words of the normalized corpus that are not in the pronunciation lexicon (main.py --lexicon, --oov), ranked by
+frequency, as input for local/g2p/transcribe_g2p.sh:
+
+    python3 main.py --workers 8 --lexicon data/local/dict/lexicon.txt --oov words_to_transcribe.txt \
+        corpus.txt normalized.txt
+    local/g2p/transcribe_g2p.sh data/local/g2p words_to_transcribe.txt > transcribed_words.txt
+
+The lexicon (lexicon.txt 'word phones' or words.txt 'word id', the first column is used) is loaded once into a sorted
+array of 64-bit word hashes, 8 bytes per word, which is passed to the workers. Each worker checks the word types of
+its lines against it, the counts of the out-of-vocabulary words are merged in the main process. Only tokens made of
+letters (char_constants.LETTERS) are candidates for transcription, numbers and symbols are left out.
+
+"""
+
+import array
+import bisect
+import re
+
+from collections import Counter
+
+import char_constants
+import minhash
+import word_counts
+
+ENCODING = 'UTF-8'
+WORD = re.compile('[' + char_constants.LETTERS + ']+')
+SPECIAL_SYMBOLS = {'<eps>', '<s>', '</s>', '<unk>', '<UNK>', '!SIL', '#0'}
+
+
+class Lexicon:
+    """
+    Set of the words of a lexicon, stored as sorted 64-bit hashes.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    @classmethod
+    def from_file(cls, filename):
+        hashes = set()
+        with open(filename, encoding=ENCODING) as f:
+            for line in f:
+                fields = line.split(None, 1)
+                if fields and fields[0] not in SPECIAL_SYMBOLS:
+                    hashes.add(minhash.hash64(fields[0]))
+        return cls(array.array('Q', sorted(hashes)))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, word):
+        key = minhash.hash64(word)
+        ind = bisect.bisect_left(self.hashes, key)
+        return ind < len(self.hashes) and self.hashes[ind] == key
+
+    def oov_counts(self, tokens):
+        """
+        :param tokens: a Counter token -> count, e.g. of the lines of one worker task
+        :return: a tuple (Counter of the words not in the lexicon, number of tokens)
+        """
+        oov = Counter({token: count for token, count in tokens.items()
+                       if WORD.fullmatch(token) and token not in self})
+        return oov, sum(tokens.values())
+
+
+class OovSink:
+    """
+    Collects the out-of-vocabulary counts of all workers and writes the ranked words.
+    """
+
+    def __init__(self, lexicon, memory_mb=256, tmp_dir=None):
+        self.lexicon = lexicon
+        self.counts = word_counts.WordCounter(memory_mb, tmp_dir)
+        self.tokens = 0
+
+    def add(self, oov, tokens):
+        # 'oov' and 'tokens' as returned by Lexicon.oov_counts()
+        self.counts.update(oov)
+        self.tokens += tokens
+
+    def update(self, tokens):
+        # counts of all tokens, checked against the lexicon in this process
+        self.add(*self.lexicon.oov_counts(tokens))
+
+    def write(self, filename, min_count=1, max_words=0):
+        """
+        Writes the words with at least 'min_count' occurrences, most frequent first, one per line.
+
+        :param max_words: write at most this many words, 0 for all
+        :return: the number of words written
+        """
+        written = 0
+        with open(filename, 'w', encoding=ENCODING) as f:
+            for word, count in self.counts.by_frequency():
+                if count < min_count or (max_words and written == max_words):
+                    break
+                f.write(word + '\n')
+                written += 1
+        return written
+
+    def report(self, min_count=1):
+        types = 0
+        frequent_types = 0
+        oov_tokens = 0
+        for _, count in self.counts.items():
+            types += 1
+            oov_tokens += count
+            if count >= min_count:
+                frequent_types += 1
+        rate = 100.0 * oov_tokens / self.tokens if self.tokens else 0.0
+        return ('OOV: {0} words not in the lexicon of {1} words, {2} occurring at least {3} times, {4} of {5} tokens '
+                '({6:.2f}%)'.format(types, len(self.lexicon), frequent_types, min_count, oov_tokens, self.tokens,
+                                    rate))
+
+    def close(self):
+        self.counts.close()
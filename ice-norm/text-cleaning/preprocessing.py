@@ -14,12 +14,16 @@
 
     Format of the input corpus (Leipzig Wortschatz): One sentence per line, ending with a full stop.
 
+    The module functions are the reference implementation, using nltk.word_tokenize(). Preprocessor does the same
+    with all regular expressions compiled once, dash splitting in one substitution and the tokenizers from
+    tokenizer.py, process() uses a Preprocessor shared by all calls in a process (see configure()).
+
 """
 
 import re
-import nltk
 
 import char_constants
+import tokenizer
 #from normalization import char_constants
 
 
@@ -95,6 +99,7 @@ def clean_web_page_labels(line):
     if re.search(WEBPAGE_LOC, line):
         if re.search('(Gestabók)|(Viðburðir)', line):
             return ''
+        import nltk
         tokens = nltk.word_tokenize(line)
         anchor_ind = tokens.index(':')
         text = ' '.join(tokens[anchor_ind + 4:])
@@ -106,7 +111,7 @@ def clean_web_page_labels(line):
     return res.strip()
 
 
-def process(line):
+def process_reference(line):
     """
     Perform some cleaning procedures: remove all symbols irrelevant for syntax and pronunciation;
     remove e-mail addresses; remove some web-page specific labels (to avoid bias in word frequency).
@@ -118,6 +123,99 @@ def process(line):
     processed_line = remove_dashes(processed_line)
     processed_line = replace_e_mail(processed_line)
     processed_line = clean_web_page_labels(processed_line)
+    import nltk
     tokens = nltk.word_tokenize(processed_line)
     result = ' '.join(tokens)
     return result
+
+
+class Preprocessor:
+
+    def __init__(self, tokenizer_mode='compat'):
+        self.tokenize = tokenizer.get_tokenizer(tokenizer_mode)
+        # a compiled character class is faster than str.translate() with a deletion table
+        self.non_valid = re.compile(char_constants.NON_VALID_CHARS)
+        self.dash_pattern = re.compile('(' + LETTERS + ')-(\\s*' + LETTERS + ')')
+        self.e_mail_pattern = re.compile('[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\\.[a-zA-Z0-9-.]{2,4}')
+        self.web_label_pattern = re.compile('(Gestabók)|(Viðburðir)')
+        self.label_patterns = [re.compile('(^innlent)?.+(meira forsíða\\.\\.$)', re.IGNORECASE),
+                               re.compile('(^innlent)?.+(forsíða\\.\\.$)', re.IGNORECASE)]
+
+    def delete_non_conform_symbols(self, line):
+        return self.non_valid.sub('', line)
+
+    def remove_dashes(self, line):
+        # like remove_dashes(), but only the matched dashes are replaced, not every other occurrence of the match
+        if '-' not in line:
+            return line
+        return self.dash_pattern.sub('\\1 \\2', line)
+
+    def replace_e_mail(self, line):
+        if '@' not in line:
+            return line
+        match = self.e_mail_pattern.search(line)
+        if match:
+            return line.replace(match.group(), '')
+
+        return line
+
+    @staticmethod
+    def replace_pattern(pattern, text):
+        m = pattern.match(text)
+        res = text
+        if m:
+            for g in m.groups():
+                if g:
+                    res = res.replace(g, '')
+
+        return res.strip()
+
+    def clean_web_page_labels(self, line):
+        if WEBPAGE_LOC in line:
+            if self.web_label_pattern.search(line):
+                return ''
+            tokens = self.tokenize(line)
+            anchor_ind = tokens.index(':')
+            text = ' '.join(tokens[anchor_ind + 4:])
+            text = text.replace('án commenta', '')
+            return text
+
+        if not line.rstrip('\n').endswith('..'):
+            # the label patterns only match lines ending with 'forsíða..'
+            return line.strip()
+        res = line
+        for pattern in self.label_patterns:
+            res = self.replace_pattern(pattern, res)
+        return res.strip()
+
+    def process(self, line):
+        processed_line = self.delete_non_conform_symbols(line)
+        processed_line = self.remove_dashes(processed_line)
+        processed_line = self.replace_e_mail(processed_line)
+        processed_line = self.clean_web_page_labels(processed_line)
+        tokens = self.tokenize(processed_line)
+        return ' '.join(tokens)
+
+
+_preprocessor = None
+
+
+def configure(tokenizer_mode='compat'):
+    # sets up the Preprocessor used by process(), 'compat' or 'fast' tokenizer, see tokenizer.py
+    global _preprocessor
+    _preprocessor = Preprocessor(tokenizer_mode)
+
+
+def get_preprocessor():
+    if _preprocessor is None:
+        configure()
+    return _preprocessor
+
+
+def process(line):
+    """
+    Same as process_reference(), see Preprocessor
+
+    :return: a cleaned version of the input, where also punctuation is separated by spaces
+    """
+    return get_preprocessor().process(line)
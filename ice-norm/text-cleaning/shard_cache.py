@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache of normalized corpus shards for incremental re-normalization (main.py --manifest).
+
+The input corpus is given as a manifest, a file listing the input shards (one path per line, relative paths are
+relative to the manifest, '#' starts a comment). The normalized output of each shard is stored in the cache
+directory under a key combining
+
+    * the SHA-256 of the shard content
+    * the fingerprint of the normalizer configuration: the mapping tables, char_constants.py, the source of the
+      normalizing modules, the stage list and the tokenizer
+
+so only new or changed shards are normalized again when a news dump is added, and all shards when e.g. a line is
+added to abbr.txt. The final corpus is the concatenation of the cached outputs in the order of the manifest.
+
+To avoid reading unchanged shards again, the content hash of each shard is kept in <cache_dir>/index.json together
+with the size and modification time of the file it was computed from.
+
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import char_constants
+import map_replacement
+import preprocessing
+import stages
+import tokenizer
+
+INDEX_FILE = 'index.json'
+BLOCK_SIZE = 1024 * 1024
+STALE_TMP_SECONDS = 24 * 3600     # temporary outputs older than this are left over from killed runs
+
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_fingerprint(step_names, tokenizer_mode):
+    """
+    :return: a hex digest of everything besides the input that the normalized output depends on
+    """
+    digest = hashlib.sha256()
+    files = [os.path.join(map_replacement.mp_file_path, name)
+             for name in (map_replacement.acro_file, map_replacement.abbr_file, map_replacement.symbol_file)]
+    files += [module.__file__ for module in (char_constants, map_replacement, preprocessing, stages, tokenizer)]
+    for filename in files:
+        digest.update(os.path.basename(filename).encode('utf-8') + b'\0')
+        digest.update(file_hash(filename).encode('utf-8') + b'\0')
+    digest.update(','.join(step_names).encode('utf-8') + b'\0')
+    digest.update(tokenizer_mode.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_manifest(manifest):
+    # paths of the shards listed in 'manifest', relative paths are relative to the manifest's directory
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    shards = []
+    with open(manifest, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                shards.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return shards
+
+
+class ShardCache:
+
+    def __init__(self, cache_dir, fingerprint):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_file = os.path.join(cache_dir, INDEX_FILE)
+        self.index = {}
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def content_hash(self, shard):
+        # SHA-256 of the shard, read from the index if the file has not changed since it was computed
+        stat = os.stat(shard)
+        entry = self.index.get(os.path.abspath(shard))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        sha = file_hash(shard)
+        self.index[os.path.abspath(shard)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha}
+        return sha
+
+    def key(self, shard):
+        return hashlib.sha256((self.content_hash(shard) + self.fingerprint).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.txt')
+
+    def tmp_path(self, key):
+        # normalize into this file and store() it when finished, so an interrupted run leaves no broken entry
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        return self.path(key) + '.tmp.' + str(os.getpid())
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def store(self, key, tmp_file):
+        os.replace(tmp_file, self.path(key))
+
+    def save_index(self):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def prune(self, keep_keys):
+        """
+        Deletes all cached outputs except those of 'keep_keys', e.g. of the shards of the current manifest.
+        Temporary files of other runs are left alone unless they are older than STALE_TMP_SECONDS, they may still be
+        stored by a run in progress.
+
+        :return: the number of deleted files
+        """
+        keep = set(key + '.txt' for key in keep_keys)
+        stale = time.time() - STALE_TMP_SECONDS
+        deleted = 0
+        for sub_dir in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, sub_dir)
+            if not os.path.isdir(path):
+                continue
+            for name in os.listdir(path):
+                filename = os.path.join(path, name)
+                if name.endswith('.txt'):
+                    if name in keep:
+                        continue
+                elif '.txt.tmp.' not in name or os.path.getmtime(filename) > stale:
+                    continue
+                try:
+                    os.remove(filename)
+                    deleted += 1
+                except FileNotFoundError:
+                    # stored or removed by another run meanwhile
+                    pass
+        return deleted
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+The normalizing steps as a registry of named stages, each stage takes a line and returns the normalized line.
+A Pipeline runs a selection of the stages in a given order and counts for each stage the time spent, the number of
+lines changed and the number of lines dropped (lines that are empty after the stage, they are not passed on).
+
+All stages in the default order (STAGE_NAMES) give the same result as preprocessing.process() followed by
+map_replacement.replace_from_maps():
+
+    delete_symbols   remove symbols not relevant for syntax or pronunciation (char_constants.NON_VALID_CHARS)
+    split_dashes     'Norður-Ameríka' -> 'Norður Ameríka'
+    delete_email     remove e-mail addresses
+    web_labels       remove web page labels like 'Þú ert hér: ... Forsíða'
+    tokenize         separate punctuation from words (see tokenizer.py)
+    acronyms         replace acronyms from ../mapping_tables/acros.txt
+    abbreviations    replace abbreviations from ../mapping_tables/abbr.txt
+    symbols          replace symbols from ../mapping_tables/symbol_mapping.txt
+    punctuation      delete punctuation and extra spaces
+    lowercase        lower case the line
+    dv_signature     delete the signature of texts from dv.is
+
+"""
+
+import time
+
+import line_cache
+import map_replacement
+import preprocessing
+
+STAGE_NAMES = ['delete_symbols', 'split_dashes', 'delete_email', 'web_labels', 'tokenize', 'acronyms',
+               'abbreviations', 'symbols', 'punctuation', 'lowercase', 'dv_signature']
+
+
+def _delete_punctuation(line):
+    return ' '.join(map_replacement.PUNCTUATION.sub('', line).split())
+
+
+def _delete_dv_signature(line):
+    # special case for texts from dv.is
+    return line.replace('ritstjórn dv ritstjorn @ dv', '')
+
+
+def create_stages():
+    """
+    :return: a dict stage name -> function, using the Preprocessor and ReplacementMaps of this process
+    """
+    pre = preprocessing.get_preprocessor()
+    repl = map_replacement.get_replacement_maps()
+    return {
+        'delete_symbols': pre.delete_non_conform_symbols,
+        'split_dashes': pre.remove_dashes,
+        'delete_email': pre.replace_e_mail,
+        'web_labels': pre.clean_web_page_labels,
+        'tokenize': lambda line: ' '.join(pre.tokenize(line)),
+        'acronyms': repl.replace_acronyms,
+        'abbreviations': repl.replace_abbreviations,
+        'symbols': repl.replace_symbols,
+        'punctuation': _delete_punctuation,
+        'lowercase': str.lower,
+        'dv_signature': _delete_dv_signature,
+    }
+
+
+def parse_stage_names(names):
+    """
+    :param names: comma separated stage names, e.g. 'delete_symbols,tokenize,lowercase', empty for all stages
+    :return: a list of stage names
+    """
+    if not names:
+        return list(STAGE_NAMES)
+    selected = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in STAGE_NAMES]
+    if unknown:
+        raise ValueError('Unknown normalizing step(s) ' + ', '.join(unknown) + ', choose from ' +
+                         ', '.join(STAGE_NAMES))
+    return selected
+
+
+class StageStats:
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.lines = 0
+        self.changed = 0
+        self.dropped = 0
+
+    def add(self, other):
+        self.seconds += other.seconds
+        self.lines += other.lines
+        self.changed += other.changed
+        self.dropped += other.dropped
+
+
+class Pipeline:
+
+    def __init__(self, names=None, cache=None):
+        """
+        :param cache: a line_cache.LineCache for lines seen before, only lines not found in it are counted in stats
+        """
+        self.names = list(names) if names else list(STAGE_NAMES)
+        functions = create_stages()
+        self.stages = [(name, functions[name]) for name in self.names]
+        self.cache = cache
+        self.reset()
+
+    def reset(self):
+        self.stats = {name: StageStats() for name in self.names}
+        if self.cache is not None:
+            self.cache.reset_counts()
+
+    def process(self, line):
+        """
+        :return: the normalized line, or None if a stage dropped it
+        """
+        for name, function in self.stages:
+            stats = self.stats[name]
+            start = time.perf_counter()
+            result = function(line)
+            stats.seconds += time.perf_counter() - start
+            stats.lines += 1
+            if result != line:
+                stats.changed += 1
+            if not result:
+                stats.dropped += 1
+                return None
+            line = result
+        return line
+
+    def run(self, lines):
+        # generator of the normalized lines, dropped lines are left out, empty input lines are skipped
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if self.cache is None:
+                result = self.process(line)
+            else:
+                key = line_cache.line_key(line)
+                found, result = self.cache.get(key)
+                if not found:
+                    result = self.process(line)
+                    self.cache.put(key, result)
+            if result is not None:
+                yield result
+
+
+def merge_stats(total, stats):
+    # adds the stats of one pipeline (e.g. of a worker process) to 'total'
+    for name, stage_stats in stats.items():
+        total.setdefault(name, StageStats()).add(stage_stats)
+    return total
+
+
+def format_report(stats):
+    """
+    :param stats: a dict stage name -> StageStats, in pipeline order
+    :return: the lines of a table with time, share of the total time, lines in, changed and dropped per stage
+    """
+    total_seconds = sum(stage_stats.seconds for stage_stats in stats.values()) or 1.0
+    rows = [['STAGE', 'SECONDS', 'TIME%', 'LINES', 'CHANGED', 'DROPPED']]
+    for name, stage_stats in stats.items():
+        rows.append([name, '%.2f' % stage_stats.seconds, '%.1f' % (100 * stage_stats.seconds / total_seconds),
+                     str(stage_stats.lines), str(stage_stats.changed), str(stage_stats.dropped)])
+    widths = [max(map(len, col)) for col in zip(*rows)]
+    return ['  '.join(val.ljust(width) for val, width in zip(row, widths)) for row in rows]
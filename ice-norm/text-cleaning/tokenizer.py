@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tokenizers for the normalization, replacing nltk.word_tokenize().
+
+    tokenize_compat(text): NLTK compatible. Splits the text into sentences like NLTK's Punkt sentence tokenizer
+        does for the Icelandic texts we use (the English Punkt model knows none of the words, so only its generic
+        rules apply, see punkt_sentences()), and each sentence with the rules of NLTK's word tokenizer (an improved
+        Penn Treebank tokenizer, NLTK >= 3.9).
+    tokenize_fast(text): one regular expression over the alphabet of char_constants.LETTERS. Words, numbers
+        (1.000, 12:46, 3,5) and dotted abbreviations (t.d, o.s.frv) are kept together, all other symbols are
+        split off. Differs from tokenize_compat() mostly in where periods are split off, which are deleted in
+        the later normalizing steps anyway.
+
+get_tokenizer(mode) returns one of them by name, 'compat' or 'fast'.
+
+"""
+
+import re
+
+import char_constants
+
+L = char_constants.LETTERS
+
+# ------------------------------------------------------------------------------------------------------------------
+# Word tokenizer rules (nltk.tokenize.destructive.NLTKWordTokenizer)
+
+# (pattern, replacement, substrings of which one has to be in the text for the pattern to match). Checking for the
+# substrings first is much faster than running all substitutions on every sentence.
+STARTING_QUOTES = [
+    (re.compile(r'([«“‘„]|[`]+)'), r' \1 ', ('«', '“', '‘', '„', '`')),
+    (re.compile(r'^\"'), r'``', ('"',)),
+    (re.compile(r'(``)'), r' \1 ', ('``',)),
+    (re.compile(r'([ \(\[{<])(\"|\'{2})'), r'\1 `` ', ('"', "''")),
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r'\1 ', ("'",)),
+]
+
+ENDING_QUOTES = [
+    (re.compile(r'([»”’])'), r' \1 ', ('»', '”', '’')),
+    (re.compile(r"''"), " '' ", ("''",)),
+    (re.compile(r'"'), " '' ", ('"',)),
+    (re.compile(r'\s+'), ' ', ('',)),     # always applied
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r'\1 \2 ', ("'",)),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r'\1 \2 ', ("'",)),
+]
+
+PUNCTUATION = [
+    (re.compile(r'([^\.])(\.)([\]\)}>"\'' '»”’ ' r']*)\s*$'), r'\1 \2 \3 ', ('.',)),
+    (re.compile(r'([:,])([^\d])'), r' \1 \2', (':', ',')),
+    (re.compile(r'([:,])$'), r' \1 ', (':', ',')),
+    (re.compile(r'\.{2,}'), r' \g<0> ', ('..',)),
+    (re.compile(r'[;@#$%&]'), r' \g<0> ', (';', '@', '#', '$', '%', '&')),
+    (re.compile(r'[\u2012-\u2015]'), r' \g<0> ', ('\u2012', '\u2013', '\u2014', '\u2015')),
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r'\1 \2\3 ', ('.',)),
+    (re.compile(r'[?!]'), r' \g<0> ', ('?', '!')),
+    (re.compile(r"([^'])' "), r"\1 ' ", ("' ",)),
+    (re.compile(r'[*]'), r' \g<0> ', ('*',)),
+]
+
+PARENS_BRACKETS = (re.compile(r'[\]\[\(\)\{\}\<\>]'), r' \g<0> ', ('[', ']', '(', ')', '{', '}', '<', '>'))
+DOUBLE_DASHES = (re.compile(r'--'), r' -- ', ('--',))
+
+# substrings are checked in the lower case text
+CONTRACTIONS = [(re.compile(regex), r' \1 \2 ', substrings) for regex, substrings in [
+    (r"(?i)\b(can)(?#X)(not)\b", ('cannot',)), (r"(?i)\b(d)(?#X)('ye)\b", ("d'ye",)),
+    (r"(?i)\b(gim)(?#X)(me)\b", ('gimme',)), (r"(?i)\b(gon)(?#X)(na)\b", ('gonna',)),
+    (r"(?i)\b(got)(?#X)(ta)\b", ('gotta',)), (r"(?i)\b(lem)(?#X)(me)\b", ('lemme',)),
+    (r"(?i)\b(more)(?#X)('n)\b", ("more'n",)), (r"(?i)\b(wan)(?#X)(na)(?=\s)", ('wanna',)),
+    (r"(?i) ('t)(?#X)(is)\b", ("'tis",)), (r"(?i) ('t)(?#X)(was)\b", ("'twas",))]]
+
+
+def _apply(rules, text, check_text=None):
+    # check_text: the text to look for the substrings in, if not 'text' itself
+    for regexp, substitution, substrings in rules:
+        if any(substring in (check_text or text) for substring in substrings):
+            text = regexp.sub(substitution, text)
+    return text
+
+
+def treebank_words(text):
+    text = _apply(STARTING_QUOTES, text)
+    text = _apply(PUNCTUATION, text)
+    text = _apply([PARENS_BRACKETS, DOUBLE_DASHES], text)
+
+    text = ' ' + text + ' '
+    text = _apply(ENDING_QUOTES, text)
+    # the contractions only add spaces, the lower case text doesn't have to be updated
+    text = _apply(CONTRACTIONS, text, text.lower())
+
+    return text.split()
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Sentence splitting (nltk.tokenize.punkt with the English model, for words the model has no statistics of)
+
+SENT_END_CHARS = '.?!'
+NON_WORD_CHARS = r'(?:[)\";}\]\*:@\'\({\[‘’“”\xab\xbb!?])'
+MULTI_CHAR_PUNCT = r'(?:\-{2,}|\.{2,}|(?:\.\s){2,}\.)'
+PERIOD_CONTEXT = re.compile(r'[\.\?!](?=(?P<after_tok>' + NON_WORD_CHARS + r'|\s+(?P<next_tok>\S+)))')
+PUNKT_WORD = re.compile(r'''(
+    ''' + MULTI_CHAR_PUNCT + r'''
+    |
+    (?=[^\(\"\`{\[:;&\#\*@\)}\]\-,])\S+?
+    (?=
+        \s|$|''' + NON_WORD_CHARS + '|' + MULTI_CHAR_PUNCT + r'''|
+        ,(?=$|\s|''' + NON_WORD_CHARS + '|' + MULTI_CHAR_PUNCT + r''')
+    )
+    |
+    \S
+)''', re.VERBOSE)
+BOUNDARY_REALIGNMENT = re.compile(r'["\')\]}‘’“”\xab\xbb]+?(?:\s+|(?=--)|$)', re.MULTILINE)
+ELLIPSIS = re.compile(r'\.\.+$')
+INITIAL = re.compile(r'[^\W\d]\.$')
+NUMBER = re.compile(r'^-?[\.,]?\d[\d,\.-]*\.?$')
+WHITESPACE = re.compile(r'\s')
+
+# abbreviations of the English Punkt model that occur in Icelandic texts
+ABBREVIATIONS = {'dr', 'mr', 'mrs', 'ms', 'prof', 'jr', 'sr', 'st', 'inc', 'ltd', 'co', 'corp', 'vs', 'etc', 'e.g',
+                 'i.e', 'u.s', 'a.m', 'p.m', 'jan', 'feb', 'aug', 'sept', 'oct', 'nov', 'dec'}
+
+
+def _ortho_heuristic(token):
+    # True: token starts a sentence, False: it doesn't, 'unknown'. Without orthographic statistics for a word only
+    # a lower case first letter decides.
+    if token in (';', ':', ',', '.', '!', '?'):
+        return False
+    if token[0].islower():
+        return False
+    return 'unknown'
+
+
+def _punkt_words(text):
+    return [token for line in text.split('\n') if line.strip() for token in PUNKT_WORD.findall(line)]
+
+
+def _contains_sentbreak(context):
+    # True if a token of 'context' ending a sentence is followed by another token
+    tokens = _punkt_words(context)
+    for ind, token in enumerate(tokens[:-1]):
+        if token in SENT_END_CHARS:
+            return True
+        if not token.endswith('.') or ELLIPSIS.match(token):
+            continue
+        word = token[:-1].lower()
+        if word in ABBREVIATIONS or word.split('-')[-1] in ABBREVIATIONS:
+            continue
+        # a sentence break, unless an initial or ordinal number is followed by a lower case word
+        if INITIAL.match(token) or NUMBER.sub('##number##', token.lower()) == '##number##':
+            next_token = tokens[ind + 1]
+            is_starter = _ortho_heuristic(next_token)
+            if is_starter is False:
+                continue
+            if is_starter == 'unknown' and INITIAL.match(token) and next_token[0].isupper():
+                continue
+        return True
+    return False
+
+
+def _end_contexts(text):
+    # (match, context) of each potential sentence end, the context being the word before the match, the match and
+    # the following token. Of matches with overlapping words (e.g. 'acting!!!') only the last one is kept.
+    previous_match = None
+    previous_start = previous_end = 0
+    for match in PERIOD_CONTEXT.finditer(text):
+        before = text[previous_end:match.start()]
+        spaces = [m.start() for m in WHITESPACE.finditer(before)]
+        start = spaces[-1] + previous_end + 1 if spaces and spaces[-1] else previous_start
+        if previous_match and previous_end <= start:
+            yield previous_match, (text[previous_start:previous_end] + previous_match.group() +
+                                   previous_match.group('after_tok'))
+        previous_match = match
+        previous_start, previous_end = start, match.start()
+    if previous_match:
+        yield previous_match, (text[previous_start:previous_end] + previous_match.group() +
+                               previous_match.group('after_tok'))
+
+
+def punkt_sentences(text):
+    """
+    Splits 'text' into sentences at '.', '?' and '!' followed by another token, except after known abbreviations,
+    initials and ordinal numbers followed by a lower case word.
+    """
+    slices = []
+    last_break = 0
+    for match, context in _end_contexts(text):
+        if _contains_sentbreak(context):
+            slices.append((last_break, match.end()))
+            last_break = match.start('next_tok') if match.group('next_tok') else match.end()
+    slices.append((last_break, len(text.rstrip())))
+
+    # closing quotes and brackets at the start of a sentence belong to the previous one
+    sentences = []
+    realign = 0
+    for ind, (start, end) in enumerate(slices):
+        start += realign
+        realign = 0
+        if ind + 1 < len(slices):
+            next_start, next_end = slices[ind + 1]
+            m = BOUNDARY_REALIGNMENT.match(text[next_start:next_end])
+            if m:
+                sentences.append(text[start:next_start + len(m.group(0).rstrip())])
+                realign = m.end()
+                continue
+        if text[start:end]:
+            sentences.append(text[start:end])
+    return sentences
+
+
+def tokenize_compat(text):
+    return [token for sentence in punkt_sentences(text) for token in treebank_words(sentence)]
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Fast tokenizer
+
+FAST_TOKEN = re.compile(r'''
+    \d+(?:[.,:]\d+)+                        # numbers with separators: 1.000, 12:46, 3,5
+    |[''' + L + r'''\d]+(?:\.[''' + L + r'''\d]+)+   # dotted abbreviations: t.d, o.s.frv
+    |[''' + L + r'''\d]+(?:-[''' + L + r'''\d]+)*    # words and numbers, also with hyphens: 91-97
+    |\.{2,}|-{2,}                           # ellipsis, double dash
+    |\S                                     # any other symbol
+    ''', re.VERBOSE)
+
+
+def tokenize_fast(text):
+    return FAST_TOKEN.findall(text)
+
+
+TOKENIZERS = {'compat': tokenize_compat, 'fast': tokenize_fast}
+
+
+def get_tokenizer(mode='compat'):
+    if mode not in TOKENIZERS:
+        raise ValueError('Unknown tokenizer "' + mode + '", choose one of ' + ', '.join(TOKENIZERS))
+    return TOKENIZERS[mode]
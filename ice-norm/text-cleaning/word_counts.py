@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+Word frequencies of the normalized corpus (main.py --word_freq, --vocab).
+
+Each worker counts the tokens of its lines, the counts are merged in the main process by a WordCounter. When the
+counter holds more words than fit into its memory budget, the counts are written to a temporary file sorted by word
+(a run) and the counter is emptied. At the end the runs are merged, adding up the counts of each word.
+
+Output files:
+
+    word frequency file: 'word freq' per line, most frequent first, the format read by
+        error-analysis/errors_by_frequency.init_frequency_map() (leipzig_freq.txt)
+    vocabulary file: one word per line, sorted, like lm_vocab.txt in local/create_language_model.sh
+
+"""
+
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+
+from collections import Counter
+
+ENCODING = 'UTF-8'
+BYTES_PER_ENTRY = 120               # approximate size of a Counter entry besides the word itself
+MAX_RUNS = 32
+MAX_LOCAL_WORDS = 100000            # words counted locally (per line batch) before they are added to a WordCounter
+
+
+def count_tokens(lines, counter=None):
+    # counts the space separated tokens of 'lines', returns the Counter
+    counter = Counter() if counter is None else counter
+    for line in lines:
+        counter.update(line.split())
+    return counter
+
+
+def _write_run(filename, items):
+    with open(filename, 'w', encoding=ENCODING) as f:
+        for word, count in items:
+            f.write(word + '\t' + str(count) + '\n')
+
+
+def _read_run(filename):
+    with open(filename, encoding=ENCODING) as f:
+        for line in f:
+            word, count = line.rstrip('\n').split('\t')
+            yield word, int(count)
+
+
+def _sum_sorted(items):
+    # adds up the counts of equal words in 'items' sorted by word
+    previous, total = None, 0
+    for word, count in items:
+        if word != previous:
+            if previous is not None:
+                yield previous, total
+            previous, total = word, 0
+        total += count
+    if previous is not None:
+        yield previous, total
+
+
+class WordCounter:
+
+    def __init__(self, memory_mb=512, tmp_dir=None):
+        self.max_bytes = memory_mb * 1024 * 1024
+        self.tmp_dir = tmp_dir
+        self.spill_dir = None
+        self.counts = Counter()
+        self.bytes = 0
+        self.runs = []
+        self.tokens = 0
+        self.files = 0
+
+    def _run_file(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='ice-norm-counts-', dir=self.tmp_dir)
+        self.files += 1
+        return os.path.join(self.spill_dir, 'run.' + str(self.files))
+
+    def update(self, counts):
+        """
+        :param counts: a Counter (or dict) word -> count, e.g. from count_tokens() in a worker
+        """
+        for word, count in counts.items():
+            if word not in self.counts:
+                self.bytes += BYTES_PER_ENTRY + sys.getsizeof(word)
+            self.counts[word] += count
+            self.tokens += count
+        if self.bytes > self.max_bytes:
+            self._spill()
+
+    def _spill(self):
+        filename = self._run_file()
+        _write_run(filename, sorted(self.counts.items()))
+        self.runs.append(filename)
+        self.counts = Counter()
+        self.bytes = 0
+        if len(self.runs) > MAX_RUNS:
+            merged = self._run_file()
+            _write_run(merged, _sum_sorted(heapq.merge(*[_read_run(run) for run in self.runs])))
+            for run in self.runs:
+                os.remove(run)
+            self.runs = [merged]
+
+    def items(self):
+        # all (word, count) sorted by word
+        if not self.runs:
+            return iter(sorted(self.counts.items()))
+        return _sum_sorted(heapq.merge(sorted(self.counts.items()), *[_read_run(run) for run in self.runs]))
+
+    def by_frequency(self):
+        """
+        :return: an iterator of (word, count), most frequent first, words of equal frequency sorted
+        """
+        if not self.runs:
+            return iter(sorted(self.counts.items(), key=lambda x: (-x[1], x[0])))
+        # the merged counts may not fit into memory either: sort them in runs of the same size and merge those
+        max_items = max(1, self.max_bytes // (BYTES_PER_ENTRY + 64))
+        runs = []
+        chunk = []
+        for item in self.items():
+            chunk.append(item)
+            if len(chunk) == max_items:
+                runs.append(self._freq_run(chunk))
+                chunk = []
+        chunk.sort(key=lambda x: (-x[1], x[0]))
+        return heapq.merge(chunk, *[_read_run(run) for run in runs], key=lambda x: (-x[1], x[0]))
+
+    def _freq_run(self, chunk):
+        filename = self._run_file()
+        chunk.sort(key=lambda x: (-x[1], x[0]))
+        _write_run(filename, chunk)
+        return filename
+
+    def write_frequencies(self, filename, min_count=1):
+        with open(filename, 'w', encoding=ENCODING) as f:
+            for word, count in self.by_frequency():
+                if count >= min_count:
+                    f.write(word + ' ' + str(count) + '\n')
+
+    def write_vocabulary(self, filename, min_count=1):
+        with open(filename, 'w', encoding=ENCODING) as f:
+            for word, count in self.items():
+                if count >= min_count:
+                    f.write(word + '\n')
+
+    def report(self):
+        return 'Word counts: {0} tokens, {1} runs spilled to disk'.format(self.tokens, self.files)
+
+    def close(self):
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        self.runs = []
+        self.counts = Counter()